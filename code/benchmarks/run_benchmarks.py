@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+End-to-End Benchmarks
+
+Times every pipeline stage on synthetic NYC-shaped data (`synthetic_data.py`)
+at the chosen sizes, offline: downloads go to the local Socrata stub
+(`code/downloaders/socrata_stub.py`) and uploads to the fake Hub
+(`code/upload_to_hugging_face/fake_hf_api.py`).
+
+Stages:
+    download            NYCDataDownloader.download_csv, paged with 4 workers, from the stub
+    extract_lat_lon     speed_humps.py processor (vectorized WKT parsing) with centroids
+    profile             sampled_profiler.profile_csv on the 311 file
+    features            profile dtypes -> datasets.Features (generate_features_from_profile)
+    upload              typed Parquet shards of the 311 file, committed to the fake Hub
+    spatial_join        collisions joined with the nearest speed hump within 50 m
+    rasterize           collisions binned into 100 m cells
+    temporal_aggregate  collisions counted per day and borough
+
+Each stage runs in a fresh process, so its peak RSS is its own. Wall time,
+throughput (rows/s and MB/s of input) and peak RSS are printed and appended
+to a JSON history (`benchmark_history.json`); a stage more than
+`--regression-threshold` slower than the median of its last runs of the same
+size on the same host is reported as a regression.
+
+Usage:
+    python run_benchmarks.py                          # 10k rows, all stages
+    python run_benchmarks.py --sizes 10k 1M --stages extract_lat_lon spatial_join
+    python run_benchmarks.py --sizes 10M --data-dir /data/bench --fail-on-regression
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+for folder in ("common", "downloaders", "processors", "upload_to_hugging_face"):
+    sys.path.insert(0, os.path.join(CODE_DIR, folder))
+sys.path.insert(0, SCRIPT_DIR)
+
+from stage_metrics import peak_rss_bytes  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+DEFAULT_SIZES = ["10k"]
+DEFAULT_HISTORY = os.path.join(SCRIPT_DIR, "benchmark_history.json")
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "csai_benchmark_data")
+DOWNLOAD_MAX_ROWS = 200000     # The stub keeps every row in memory and sorts it per page
+JOIN_HUMPS = 10000             # Speed humps the collisions are joined with, as in NYC
+HISTORY_WINDOW = 5             # Previous runs the regression check compares against
+REGRESSION_THRESHOLD = 0.20
+
+
+def parse_size(text: str) -> int:
+    """Rows from ``10k``, ``1M``, ``10M`` or a plain number"""
+    multipliers = {"k": 1000, "m": 1000 ** 2}
+    text = text.strip().lower()
+    if text and text[-1] in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1]])
+    return int(text)
+
+
+def dataset_path(data_dir: str, kind: str, rows: int) -> str:
+    """Synthetic file of ``kind`` with ``rows`` rows, generated on first use"""
+    path = os.path.join(data_dir, f"{kind}_{rows}.csv")
+    if not os.path.exists(path):
+        print(f"🧪 Generating {rows:,} synthetic {kind} rows")
+        generate(kind, rows, path)
+    return path
+
+
+def _load_processor_module(name: str):
+    """A processor script by file, since downloaders/ has modules with the same names"""
+    spec = importlib.util.spec_from_file_location(f"processors.{name}",
+                                                  os.path.join(CODE_DIR, "processors", f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _profile(data_dir: str, rows: int, work_dir: str) -> dict:
+    """The 311 profile written by the profile stage, or a new one"""
+    path = os.path.join(work_dir, f"NYC_311_{rows}_profile.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    from sampled_profiler import profile_csv
+    profile = profile_csv(dataset_path(data_dir, "NYC_311", rows), workers=1)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f)
+    return profile
+
+
+# Each stage returns the rows and input bytes it handled
+
+def stage_download(data_dir: str, rows: int, work_dir: str) -> dict:
+    from nyc_base_downloader import NYCDataDownloader
+    from socrata_stub import SocrataStubServer, make_rows
+
+    rows = min(rows, DOWNLOAD_MAX_ROWS)
+    with SocrataStubServer(make_rows(rows)) as stub:
+        class StubDownloader(NYCDataDownloader):
+            BASE_URL = stub.url_for()
+            DATASET_NAME = "Socrata stub"
+
+        output_path = os.path.join(work_dir, "download.csv")
+        if not StubDownloader().download_csv(output_path, page_size=max(rows // 8, 1000), workers=4):
+            raise RuntimeError("Download from the stub failed")
+    return {"rows": rows, "bytes": os.path.getsize(output_path)}
+
+
+def stage_extract_lat_lon(data_dir: str, rows: int, work_dir: str) -> dict:
+    input_path = dataset_path(data_dir, "speed_humps", rows)
+    processor = _load_processor_module("speed_humps").SpeedHumpsProcessor(centroid=True)
+    processor.process(input_path, os.path.join(work_dir, "speed_humps_latlon.csv"))
+    return {"rows": rows, "bytes": os.path.getsize(input_path)}
+
+
+def stage_profile(data_dir: str, rows: int, work_dir: str) -> dict:
+    path = os.path.join(work_dir, f"NYC_311_{rows}_profile.json")
+    if os.path.exists(path):
+        os.remove(path)
+    _profile(data_dir, rows, work_dir)
+    return {"rows": rows, "bytes": os.path.getsize(dataset_path(data_dir, "NYC_311", rows))}
+
+
+def stage_features(data_dir: str, rows: int, work_dir: str) -> dict:
+    # upload_csv_hugging_face.py parses its arguments on import, so its
+    # generate_features_from_profile is rebuilt from the same helpers
+    from datasets import Features, Value
+    from generate_dataset_script import profile_dtypes
+
+    profile = _profile(data_dir, rows, work_dir)
+    started = time.perf_counter()
+    features = Features({name: Value(dtype) for name, dtype in profile_dtypes(profile).items()})
+    return {"rows": len(features), "bytes": 0, "seconds": time.perf_counter() - started}
+
+
+def stage_upload(data_dir: str, rows: int, work_dir: str) -> dict:
+    import pyarrow as pa
+    from fake_hf_api import FakeHfApi
+    from generate_dataset_script import profile_dtypes
+    from parquet_shards import upload_shards, write_parquet_shards
+
+    csv_path = dataset_path(data_dir, "NYC_311", rows)
+    profile = _profile(data_dir, rows, work_dir)
+    schema = pa.schema([(name, pa.type_for_alias(dtype)) for name, dtype in profile_dtypes(profile).items()])
+    hub_dir = os.path.join(work_dir, "fake_hub")
+    shutil.rmtree(hub_dir, ignore_errors=True)
+    api = FakeHfApi(hub_dir)
+    api.create_repo("benchmarks/NYC_311", repo_type="dataset", exist_ok=True)
+    shard_dir = os.path.join(work_dir, "shards")
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    try:
+        shards = write_parquet_shards(csv_path, shard_dir, schema=schema)
+    except pa.ArrowInvalid:
+        shards = write_parquet_shards(csv_path, shard_dir)
+    upload_shards(api, "benchmarks/NYC_311", shards, extra_files={"profiling_metadata.json": json.dumps(profile).encode()})
+    return {"rows": rows, "bytes": os.path.getsize(csv_path)}
+
+
+def stage_spatial_join(data_dir: str, rows: int, work_dir: str) -> dict:
+    from spatial_join import SpatialJoinProcessor
+
+    input_path = dataset_path(data_dir, "NYC_vehicle_collisions", rows)
+    humps_path = dataset_path(data_dir, "speed_humps", JOIN_HUMPS)
+    processor = SpatialJoinProcessor(distance=50)
+    processor.build_index(humps_path, "segmentid", geom_column="the_geom",
+                          index_path=os.path.join(work_dir, "speed_humps.sidx.npz"))
+    processor.process(input_path, os.path.join(work_dir, "collisions_humps.csv"))
+    return {"rows": rows, "bytes": os.path.getsize(input_path)}
+
+
+def stage_rasterize(data_dir: str, rows: int, work_dir: str) -> dict:
+    from rasterize import RasterGrid, RasterProcessor
+
+    input_path = dataset_path(data_dir, "NYC_vehicle_collisions", rows)
+    RasterProcessor(grid=RasterGrid(cell_size=100)).process(input_path, os.path.join(work_dir, "collisions.npy"))
+    return {"rows": rows, "bytes": os.path.getsize(input_path)}
+
+
+def stage_temporal_aggregate(data_dir: str, rows: int, work_dir: str) -> dict:
+    from temporal_aggregate import TemporalAggregateProcessor
+
+    input_path = dataset_path(data_dir, "NYC_vehicle_collisions", rows)
+    TemporalAggregateProcessor(time_column="crash_date", resolution="day", group_by=["borough"],
+                               values=["number_of_persons_injured"]).process(
+        input_path, os.path.join(work_dir, "collisions_daily.csv"))
+    return {"rows": rows, "bytes": os.path.getsize(input_path)}
+
+
+STAGES = {
+    "download": stage_download,
+    "extract_lat_lon": stage_extract_lat_lon,
+    "profile": stage_profile,
+    "features": stage_features,
+    "upload": stage_upload,
+    "spatial_join": stage_spatial_join,
+    "rasterize": stage_rasterize,
+    "temporal_aggregate": stage_temporal_aggregate,
+}
+
+
+def _run_stage(name: str, data_dir: str, rows: int, work_dir: str) -> dict:
+    """Worker entry point: run one stage and measure it in this process"""
+    started = time.perf_counter()
+    result = STAGES[name](data_dir, rows, work_dir)
+    seconds = result.pop("seconds", time.perf_counter() - started)
+    peak_bytes = peak_rss_bytes()
+    return {"stage": name, "size": rows, "rows": result["rows"], "seconds": round(seconds, 4),
+            "rows_per_s": round(result["rows"] / seconds, 1) if seconds else None,
+            "mb_per_s": round(result["bytes"] / 1e6 / seconds, 2) if seconds and result["bytes"] else None,
+            "peak_rss_mb": round(peak_bytes / 1e6, 1)}
+
+
+def prepare_data(data_dir: str, stages: list, rows: int) -> None:
+    """Generate the synthetic files of a size before anything is timed"""
+    kinds = {"extract_lat_lon": ["speed_humps"], "profile": ["NYC_311"], "features": ["NYC_311"],
+             "upload": ["NYC_311"], "spatial_join": ["NYC_vehicle_collisions"],
+             "rasterize": ["NYC_vehicle_collisions"], "temporal_aggregate": ["NYC_vehicle_collisions"]}
+    for stage in stages:
+        for kind in kinds.get(stage, []):
+            dataset_path(data_dir, kind, rows)
+    if "spatial_join" in stages:
+        dataset_path(data_dir, "speed_humps", JOIN_HUMPS)
+
+
+def run_benchmarks(sizes: list, stages: list, data_dir: str) -> list:
+    """Run ``stages`` at every size, each in a fresh process; return the measurements"""
+    results = []
+    context = get_context("spawn")
+    for rows in sizes:
+        prepare_data(data_dir, stages, rows)
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name in stages:
+                print(f"⏱️  {name} ({rows:,} rows)")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    try:
+                        result = pool.submit(_run_stage, name, data_dir, rows, work_dir).result()
+                    except Exception as e:
+                        print(f"❌ {name} failed: {e}")
+                        result = {"stage": name, "size": rows, "error": str(e)}
+                results.append(result)
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def load_history(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_regressions(history: list, run: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """Stages of ``run`` slower than ``threshold`` over their recent median on the same host"""
+    regressions = []
+    for result in run["results"]:
+        if "error" in result:
+            continue
+        previous = [old["seconds"] for entry in history if entry["host"] == run["host"]
+                    for old in entry["results"]
+                    if old.get("stage") == result["stage"] and old.get("size") == result["size"]
+                    and "error" not in old][-HISTORY_WINDOW:]
+        if not previous:
+            continue
+        baseline = statistics.median(previous)
+        if baseline and result["seconds"] > baseline * (1 + threshold):
+            regressions.append({**result, "baseline_seconds": baseline,
+                                "slowdown": round(result["seconds"] / baseline, 2)})
+    return regressions
+
+
+def print_results(results: list) -> None:
+    print("📊 Results")
+    print(f"   {'stage':<20}{'size':>12}{'seconds':>10}{'rows/s':>14}{'MB/s':>9}{'peak RSS MB':>13}")
+    for result in results:
+        if "error" in result:
+            print(f"   {result['stage']:<20}{result['size']:>12,}  failed: {result['error']}")
+            continue
+        mb_per_s = f"{result['mb_per_s']:,.1f}" if result["mb_per_s"] is not None else "-"
+        print(f"   {result['stage']:<20}{result['size']:>12,}{result['seconds']:>10.2f}"
+              f"{result['rows_per_s']:>14,.0f}{mb_per_s:>9}{result['peak_rss_mb']:>13,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES,
+                        help="Row counts, e.g. 10k 1M 10M (default: 10k)")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="Stages to run (default: all)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR,
+                        help=f"Folder of generated synthetic files, reused between runs (default: {DEFAULT_DATA_DIR})")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON history file")
+    parser.add_argument("--no-history", action="store_true", help="Do not append this run to the history")
+    parser.add_argument("--regression-threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help=f"Slowdown over the recent median reported as a regression (default: {REGRESSION_THRESHOLD})")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes]
+    results = run_benchmarks(sizes, args.stages, args.data_dir)
+    print_results(results)
+
+    run = {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": _git_commit(),
+           "host": platform.node(), "python": platform.python_version(), "cpus": os.cpu_count(),
+           "results": results}
+    history = load_history(args.history)
+    regressions = find_regressions(history, run, args.regression_threshold)
+    for regression in regressions:
+        print(f"⚠️  Regression: {regression['stage']} at {regression['size']:,} rows took "
+              f"{regression['seconds']:.2f}s, {regression['slowdown']:.2f}x the recent median "
+              f"({regression['baseline_seconds']:.2f}s)")
+    if not args.no_history:
+        history.append(run)
+        tmp_path = f"{args.history}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(history, f, indent=2)
+        os.replace(tmp_path, args.history)
+        print(f"💾 Appended results to {args.history}")
+    if any("error" in result for result in results) or (regressions and args.fail_on_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Synthetic NYC-Shaped Datasets
+
+Generates CSV files with the shape of the real datasets, at any size, for
+the benchmarks:
+
+- `speed_humps`: DOT segments with a WKT `MULTILINESTRING` in `the_geom`
+- `NYC_311`: wide 311 service requests, mostly text, with a long
+  `resolution_description` and `latitude`/`longitude`
+- `NYC_vehicle_collisions`: crashes with dates, `latitude`/`longitude`
+  (some missing, as in the real data) and injury counts
+
+Rows are built with NumPy a block at a time and appended to the file, so
+10M-row files are generated in bounded memory. The same `seed` gives the
+same file.
+
+Usage:
+    python synthetic_data.py NYC_311 1000000 -o /tmp/NYC_311_1M.csv
+    python synthetic_data.py speed_humps 10000 -o /tmp/speed_humps_10k.csv
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+BLOCK_ROWS = 200000
+# West, south, east, north of the five boroughs
+NYC_BOUNDS = (-74.26, 40.49, -73.69, 40.92)
+BOROUGHS = np.array(["MANHATTAN", "BROOKLYN", "QUEENS", "BRONX", "STATEN ISLAND"])
+STREETS = np.array(["BROADWAY", "ATLANTIC AVENUE", "QUEENS BOULEVARD", "GRAND CONCOURSE",
+                    "VICTORY BOULEVARD", "FLATBUSH AVENUE", "LEXINGTON AVENUE", "NOSTRAND AVENUE"])
+COMPLAINTS = np.array(["Noise - Residential", "Illegal Parking", "Blocked Driveway", "HEAT/HOT WATER",
+                       "Street Condition", "Noise - Street/Sidewalk", "Water System", "UNSANITARY CONDITION"])
+AGENCIES = np.array([("NYPD", "New York City Police Department"), ("HPD", "Department of Housing Preservation and Development"),
+                     ("DOT", "Department of Transportation"), ("DEP", "Department of Environmental Protection")])
+STATUSES = np.array(["Closed", "Open", "In Progress", "Pending"])
+FACTORS = np.array(["Driver Inattention/Distraction", "Unspecified", "Failure to Yield Right-of-Way",
+                    "Following Too Closely", "Passing or Lane Usage Improper", "Unsafe Speed"])
+RESOLUTION = ("The Police Department responded to the complaint and took action to fix the condition. "
+              "The complaint has been closed; if the problem persists, please file a new request")
+
+
+def _coordinates(rng, n: int) -> tuple:
+    west, south, east, north = NYC_BOUNDS
+    return rng.uniform(west, east, n), rng.uniform(south, north, n)
+
+
+def _timestamps(rng, n: int, start: str = "2015-01-01", days: int = 3650) -> pd.Series:
+    seconds = rng.integers(0, days * 86400, n)
+    return pd.Series(pd.Timestamp(start) + pd.to_timedelta(seconds, unit="s"))
+
+
+def _fmt(values: np.ndarray, fmt: str = "%.6f") -> np.ndarray:
+    return np.char.mod(fmt, values)
+
+
+def speed_humps_block(rng, first: int, n: int) -> pd.DataFrame:
+    lon, lat = _coordinates(rng, n)
+    dlon, dlat = rng.uniform(-0.001, 0.001, n), rng.uniform(-0.001, 0.001, n)
+    geom = pd.Series(_fmt(lon)) + " " + _fmt(lat) + ", " + _fmt(lon + dlon) + " " + _fmt(lat + dlat)
+    return pd.DataFrame({
+        "the_geom": "MULTILINESTRING ((" + geom + "))",
+        "segmentid": np.arange(first, first + n) + 10000,
+        "onstreet": STREETS[rng.integers(0, len(STREETS), n)],
+        "fromstreet": STREETS[rng.integers(0, len(STREETS), n)],
+        "tostreet": STREETS[rng.integers(0, len(STREETS), n)],
+        "boro": BOROUGHS[rng.integers(0, len(BOROUGHS), n)],
+        "humps": rng.integers(1, 4, n),
+        "date_installed": _timestamps(rng, n).dt.strftime("%Y-%m-%dT00:00:00.000"),
+    })
+
+
+def nyc_311_block(rng, first: int, n: int) -> pd.DataFrame:
+    created = _timestamps(rng, n)
+    closed = created + pd.to_timedelta(rng.integers(600, 30 * 86400, n), unit="s")
+    agency = AGENCIES[rng.integers(0, len(AGENCIES), n)]
+    lon, lat = _coordinates(rng, n)
+    missing = rng.random(n) < 0.02
+    numbers = pd.Series(rng.integers(1, 3000, n).astype(str))
+    streets = STREETS[rng.integers(0, len(STREETS), n)]
+    return pd.DataFrame({
+        "unique_key": np.arange(first, first + n) + 40000000,
+        "created_date": created.dt.strftime("%Y-%m-%dT%H:%M:%S.000"),
+        "closed_date": closed.dt.strftime("%Y-%m-%dT%H:%M:%S.000"),
+        "agency": agency[:, 0],
+        "agency_name": agency[:, 1],
+        "complaint_type": COMPLAINTS[rng.integers(0, len(COMPLAINTS), n)],
+        "descriptor": np.where(rng.random(n) < 0.1, "Loud Music/Party, caller states it happens nightly",
+                               "Banging/Pounding"),
+        "location_type": np.where(rng.random(n) < 0.5, "RESIDENTIAL BUILDING", "Street/Sidewalk"),
+        "incident_zip": rng.integers(10001, 11698, n),
+        "incident_address": numbers + " " + streets,
+        "street_name": streets,
+        "cross_street_1": STREETS[rng.integers(0, len(STREETS), n)],
+        "cross_street_2": STREETS[rng.integers(0, len(STREETS), n)],
+        "city": "NEW YORK",
+        "status": STATUSES[rng.integers(0, len(STATUSES), n)],
+        "resolution_description": RESOLUTION,
+        "community_board": pd.Series(rng.integers(1, 19, n).astype(str)).str.zfill(2) + " "
+                           + BOROUGHS[rng.integers(0, len(BOROUGHS), n)],
+        "borough": BOROUGHS[rng.integers(0, len(BOROUGHS), n)],
+        "latitude": np.where(missing, np.nan, lat.round(8)),
+        "longitude": np.where(missing, np.nan, lon.round(8)),
+    })
+
+
+def collisions_block(rng, first: int, n: int) -> pd.DataFrame:
+    crashed = _timestamps(rng, n, start="2012-07-01", days=4500)
+    lon, lat = _coordinates(rng, n)
+    missing = rng.random(n) < 0.08
+    return pd.DataFrame({
+        "crash_date": crashed.dt.strftime("%Y-%m-%dT00:00:00.000"),
+        "crash_time": crashed.dt.hour.astype(str) + ":" + crashed.dt.minute.astype(str).str.zfill(2),
+        "borough": BOROUGHS[rng.integers(0, len(BOROUGHS), n)],
+        "zip_code": rng.integers(10001, 11698, n),
+        "latitude": np.where(missing, np.nan, lat.round(6)),
+        "longitude": np.where(missing, np.nan, lon.round(6)),
+        "on_street_name": STREETS[rng.integers(0, len(STREETS), n)],
+        "number_of_persons_injured": rng.poisson(0.3, n),
+        "number_of_persons_killed": (rng.random(n) < 0.001).astype(int),
+        "contributing_factor_vehicle_1": FACTORS[rng.integers(0, len(FACTORS), n)],
+        "collision_id": np.arange(first, first + n) + 3000000,
+    })
+
+
+GENERATORS = {
+    "speed_humps": speed_humps_block,
+    "NYC_311": nyc_311_block,
+    "NYC_vehicle_collisions": collisions_block,
+}
+
+
+def generate(kind: str, rows: int, output_path: str, seed: int = 0) -> str:
+    """Write ``rows`` synthetic rows of ``kind`` to ``output_path``; return the path.
+
+    The file is written under a temporary name and renamed when complete.
+    """
+    block = GENERATORS[kind]
+    rng = np.random.default_rng(seed)
+    tmp_path = f"{output_path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        for first in range(0, rows, BLOCK_ROWS):
+            block(rng, first, min(BLOCK_ROWS, rows - first)).to_csv(f, index=False, header=first == 0)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic NYC-shaped CSV")
+    parser.add_argument("kind", choices=sorted(GENERATORS), help="Dataset shape")
+    parser.add_argument("rows", type=int, help="Number of rows")
+    parser.add_argument("-o", "--output", required=True, help="Output CSV path")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+    path = generate(args.kind, args.rows, args.output, args.seed)
+    print(f"✅ Wrote {args.rows:,} {args.kind} rows to {path} ({os.path.getsize(path) / 1e6:,.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Stage Metrics
+
+Shared instrumentation for the downloaders, metadata generators, processors
+and upload scripts. Every stage and sub-step is timed as a *span*:
+
+    from stage_metrics import span
+
+    with span("download.page", dataset="speed_humps") as current:
+        ...
+        current.add(rows=rows, bytes=nbytes)
+
+A finished span records its wall time, the peak memory of the process so
+far, the enclosing span of the same thread, the exception it raised (if
+any) and its attributes (`rows`, `bytes`, `wire_bytes`, `status`,
+`cache_hit`, ...).
+
+Nothing is written unless metrics are enabled, with the `--metrics PATH`
+option of the scripts or the `CSAI_METRICS` environment variable:
+
+- `*.jsonl`: one JSON object per span, appended as soon as the span ends.
+  Worker processes append to the same file; the spans of one run share a
+  `run_id`.
+- `*.prom`: Prometheus text format with totals per span and dataset,
+  written when the main process exits (e.g. for the node_exporter textfile
+  collector). Spans of worker processes are only kept in JSON lines.
+
+Usage:
+    CSAI_METRICS=/tmp/nightly.jsonl python ../pipeline/orchestrator.py
+    python stage_metrics.py summary /tmp/nightly.jsonl
+    python stage_metrics.py prometheus /tmp/nightly.jsonl -o /tmp/nightly.prom
+"""
+
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+ENV_VAR = "CSAI_METRICS"              # Path of the .jsonl or .prom output
+RUN_ENV_VAR = "CSAI_METRICS_RUN"      # Run id shared with worker processes
+COUNTERS = ("rows", "bytes", "wire_bytes")    # Attributes summed in Prometheus output
+LABELS = ("dataset",)                 # Attributes used as Prometheus labels
+PROMETHEUS_PREFIX = "csai_span"
+_END = object()
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident memory of this process.
+
+    Linux keeps ``ru_maxrss`` across ``exec``, so a spawned worker would
+    report the parent's peak; ``VmHWM`` belongs to the current image only.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Span:
+    """One timed stage or sub-step"""
+
+    def __init__(self, name: str, parent: Optional[str] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.seconds = 0.0
+        self.discarded = False
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    def set(self, **attributes) -> None:
+        """Set attributes, e.g. ``status=304``"""
+        self.attributes.update(attributes)
+
+    def add(self, **counts) -> None:
+        """Increment numeric attributes, e.g. ``rows=len(chunk)``"""
+        for key, value in counts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def finish(self) -> None:
+        self.seconds = time.perf_counter() - self._started
+
+    def to_record(self, run_id: Optional[str]) -> dict:
+        return {"run_id": run_id, "span": self.name, "parent": self.parent,
+                "start": round(self.started_at, 6), "seconds": round(self.seconds, 6),
+                "peak_rss_bytes": peak_rss_bytes(), "pid": os.getpid(),
+                "thread": threading.current_thread().name, "error": self.error,
+                "attributes": self.attributes}
+
+
+class StageMetrics:
+    """Records spans and exports them as JSON lines or Prometheus text.
+
+    Spans nest per thread. The JSON lines file is opened in append mode and
+    each span is written with a single ``write``, so threads and worker
+    processes can share it.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.run_id = None
+        self.totals = {}
+        self._fd = None
+        self._fd_pid = None
+        self._exit_hook = False
+        self._reset_locks()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_locks)
+
+    def _reset_locks(self) -> None:
+        # A lock held by another thread at fork time would never be released in the child
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @property
+    def prometheus(self) -> bool:
+        return self.enabled and self.path.endswith(".prom")
+
+    def configure(self, path: Optional[str] = None) -> None:
+        """Export spans to ``path`` (default: ``$CSAI_METRICS``); a no-op without either.
+
+        The path and run id are put in the environment, so worker processes
+        started afterwards record into the same run.
+        """
+        path = path or os.environ.get(ENV_VAR)
+        if not path:
+            return
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.path = os.path.abspath(path)
+        self.run_id = os.environ.get(RUN_ENV_VAR) or f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        os.environ[ENV_VAR] = self.path
+        os.environ[RUN_ENV_VAR] = self.run_id
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self.prometheus and not self._exit_hook:
+            atexit.register(self._write_prometheus)
+            self._exit_hook = True
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> Span:
+        """The innermost open span of this thread (a detached one if there is none)"""
+        stack = self._stack()
+        return stack[-1] if stack else Span("")
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time the ``with`` block as a span called ``name``"""
+        stack = self._stack()
+        current = Span(name, stack[-1].name if stack else None, attributes)
+        stack.append(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.error = type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            current.finish()
+            if self.enabled and not current.discarded:
+                self._record(current.to_record(self.run_id))
+
+    def timed_iter(self, iterable: Iterable, name: str, **attributes) -> Iterator:
+        """Yield from ``iterable``, timing the production of each item as a span.
+
+        Items with a length (DataFrames, Arrow batches) add it as ``rows``.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.span(name, **attributes) as current:
+                item = next(iterator, _END)
+                if item is _END:
+                    current.discarded = True
+                elif hasattr(item, "__len__"):
+                    current.add(rows=len(item))
+            if item is _END:
+                return
+            yield item
+
+    def _record(self, record: dict) -> None:
+        if self.prometheus:
+            with self._lock:
+                accumulate(self.totals, record)
+            return
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self._fd is None or self._fd_pid != os.getpid():
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._fd_pid = os.getpid()
+            os.write(self._fd, line)
+
+    def _write_prometheus(self) -> None:
+        if multiprocessing.parent_process() is not None or not self.totals:
+            return
+        with self._lock:
+            text = to_prometheus(self.totals)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+def accumulate(totals: dict, record: dict) -> None:
+    """Add one span record to ``totals``, keyed by span name and ``LABELS``"""
+    attributes = record.get("attributes") or {}
+    key = (record["span"],) + tuple(str(attributes.get(label, "")) for label in LABELS)
+    entry = totals.setdefault(key, dict({"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                         "peak_rss_bytes": 0}, **{counter: 0 for counter in COUNTERS}))
+    entry["calls"] += 1
+    entry["errors"] += bool(record.get("error"))
+    entry["seconds"] += record["seconds"]
+    entry["max_seconds"] = max(entry["max_seconds"], record["seconds"])
+    entry["peak_rss_bytes"] = max(entry["peak_rss_bytes"], record.get("peak_rss_bytes") or 0)
+    for counter in COUNTERS:
+        value = attributes.get(counter)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            entry[counter] += value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def to_prometheus(totals: dict) -> str:
+    """Render ``accumulate`` totals in the Prometheus text exposition format"""
+    series = [("calls_total", "counter", "calls", "Spans finished"),
+              ("errors_total", "counter", "errors", "Spans that raised an exception"),
+              ("seconds_total", "counter", "seconds", "Wall time spent in the span"),
+              ("max_seconds", "gauge", "max_seconds", "Longest single span"),
+              ("peak_rss_bytes", "gauge", "peak_rss_bytes", "Peak resident memory of the process at span end")]
+    series += [(f"{counter}_total", "counter", counter, f"Sum of the span's {counter} attribute")
+               for counter in COUNTERS]
+    lines = []
+    for suffix, kind, field, description in series:
+        name = f"{PROMETHEUS_PREFIX}_{suffix}"
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        for key in sorted(totals):
+            labels = [("span", key[0])] + [(label, value) for label, value in zip(LABELS, key[1:]) if value]
+            rendered = ",".join(f'{label}="{_escape(value)}"' for label, value in labels)
+            lines.append(f"{name}{{{rendered}}} {totals[key][field]:g}")
+    return "\n".join(lines) + "\n"
+
+
+def read_records(path: str, run_id: Optional[str] = None) -> list:
+    """Spans of one run in a JSON lines file (default: the last run)"""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run_id is None and records:
+        run_id = records[-1]["run_id"]
+    return [record for record in records if record["run_id"] == run_id]
+
+
+def summarize(records: list) -> list:
+    """Totals per span name, slowest first, with each span's share of the run's wall time"""
+    totals = {}
+    for record in records:
+        accumulate(totals, dict(record, attributes={key: value for key, value in
+                                                    (record.get("attributes") or {}).items()
+                                                    if key not in LABELS}))
+    wall = (max(r["start"] + r["seconds"] for r in records) - min(r["start"] for r in records)
+            if records else 0)
+    rows = [dict(entry, span=key[0], share=entry["seconds"] / wall if wall else 0)
+            for key, entry in totals.items()]
+    return sorted(rows, key=lambda row: -row["seconds"])
+
+
+def print_summary(records: list) -> None:
+    if not records:
+        print("No spans recorded.")
+        return
+    print(f"📋 Run {records[0]['run_id']}: {len(records):,} spans")
+    print(f"   {'span':<28} {'calls':>7} {'seconds':>10} {'share':>7} {'max s':>8} "
+          f"{'rows':>12} {'MB':>9} {'peak MB':>8}")
+    for row in summarize(records):
+        print(f"   {row['span']:<28} {row['calls']:>7,} {row['seconds']:>10,.2f} {row['share']:>7.1%} "
+              f"{row['max_seconds']:>8,.2f} {row['rows']:>12,} {row['bytes'] / 1e6:>9,.1f} "
+              f"{row['peak_rss_bytes'] / 1e6:>8,.0f}"
+              + (f"  ({row['errors']} failed)" if row["errors"] else ""))
+
+
+def add_metrics_argument(parser: argparse.ArgumentParser) -> None:
+    """Add the ``--metrics`` option shared by the scripts"""
+    parser.add_argument("--metrics",
+                        help=f"Record stage timings to this .jsonl (JSON lines) or .prom "
+                             f"(Prometheus text) file (default: ${ENV_VAR})")
+
+
+metrics = StageMetrics()
+metrics.configure()
+configure = metrics.configure
+span = metrics.span
+timed_iter = metrics.timed_iter
+current_span = metrics.current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or convert recorded stage metrics")
+    parser.add_argument("command", choices=["summary", "prometheus"],
+                        help="Print a table of where the time went, or convert to Prometheus text")
+    parser.add_argument("path", help="JSON lines file written with --metrics / $CSAI_METRICS")
+    parser.add_argument("--run", help="Run id to read (default: the last run in the file)")
+    parser.add_argument("-o", "--output", help="Output file for 'prometheus' (default: stdout)")
+    args = parser.parse_args()
+
+    records = read_records(args.path, args.run)
+    if args.command == "summary":
+        print_summary(records)
+        return
+    totals = {}
+    for record in records:
+        accumulate(totals, record)
+    text = to_prometheus(totals)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ Wrote {len(totals)} series to {args.output}")
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
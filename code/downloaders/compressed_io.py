@@ -0,0 +1,67 @@
+"""
+Compressed Download Storage
+
+Writes downloads as gzip (``.gz``) or zstd (``.zst``) files while they are
+streamed, chosen by the output file extension. Data is compressed in
+independent frames of about ``FRAME_SIZE`` bytes (gzip members or zstd
+frames), and each page of a download ends on a frame boundary. Concatenated
+frames are a valid file for every gzip/zstd reader, so pages can be
+truncated on resume and parallel parts joined by plain concatenation.
+
+gzip uses the standard library; zstd uses the ``pyarrow`` codec, which is
+also what the processors and uploaders read ``.zst`` files with.
+"""
+
+import gzip
+from typing import Optional
+
+FRAME_SIZE = 4 * 1024 * 1024     # Uncompressed bytes per gzip member / zstd frame
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+
+
+def compression_for_path(path: str) -> Optional[str]:
+    """``"gzip"``, ``"zstd"`` or None, from the file extension"""
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+def with_compression_extension(path: str, compression: Optional[str]) -> str:
+    """Append the extension of ``compression`` to ``path`` unless it is already there"""
+    if not compression or compression_for_path(path) == compression:
+        return path
+    return path + COMPRESSION_EXTENSIONS[compression]
+
+
+class FrameCompressor:
+    """Buffer streamed bytes and emit them as self-contained compressed frames"""
+
+    def __init__(self, compression: str, frame_size: int = FRAME_SIZE):
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+        self.compression = compression
+        self.frame_size = frame_size
+        self._buffer = bytearray()
+        self._codec = None
+        if compression == "zstd":
+            import pyarrow as pa
+            self._codec = pa.Codec("zstd", compression_level=COMPRESSION_LEVELS["zstd"])
+
+    def compress(self, data: bytes) -> bytes:
+        """Add ``data``; return the frames that are complete"""
+        self._buffer += data
+        if len(self._buffer) < self.frame_size:
+            return b""
+        return self.flush()
+
+    def flush(self) -> bytes:
+        """Compress everything buffered into one frame"""
+        if not self._buffer:
+            return b""
+        data, self._buffer = bytes(self._buffer), bytearray()
+        if self._codec is not None:
+            return self._codec.compress(data, asbytes=True)
+        return gzip.compress(data, compresslevel=COMPRESSION_LEVELS["gzip"])
+
@@ -0,0 +1,186 @@
+"""
+Shared Download Cache
+
+A content-addressed cache for downloaded files, shared by all downloaders.
+Each file is stored once under ``objects/<sha256>``; ``index.json`` maps a
+request (URL and the parameters that shape its content) to the object and
+the validators the server sent with it (``ETag``, ``Last-Modified`` and the
+views API ``rowsUpdatedAt``).
+
+Before downloading again, the downloader sends the validators back as
+``If-None-Match``/``If-Modified-Since``; when the server answers
+``304 Not Modified`` the cached object is handed out as a hard link (or its
+path), so an unchanged dataset costs one small request and no copy. Outputs
+linked from the cache share their bytes with it and must not be edited in
+place. The least recently used entries are evicted once the cache grows past
+``max_bytes``.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def detach(path: str) -> None:
+    """Remove ``path`` if it is a hard link shared with another file (e.g. a
+    cache object), so that writing a new download there cannot change it"""
+    if os.path.exists(path) and os.stat(path).st_nlink > 1:
+        os.remove(path)
+
+
+class DownloadCache:
+    """Content-addressed store of downloads in ``cache_dir``, evicted by LRU"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, params: Optional[dict] = None) -> str:
+        """Cache key of a request: its URL and content-shaping parameters"""
+        request = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256)
+
+    def lookup(self, url: str, params: Optional[dict] = None) -> Optional[dict]:
+        """Return the cached entry of a request, or None if it is not cached"""
+        with self._lock:
+            entry = self._load_index()["entries"].get(self.key(url, params))
+        if entry is None or not os.path.exists(self.object_path(entry["sha256"])):
+            return None
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: Optional[dict]) -> dict:
+        """``If-None-Match``/``If-Modified-Since`` headers revalidating ``entry``"""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, params: Optional[dict], path: str,
+              validators: Optional[dict] = None) -> dict:
+        """Add the downloaded file at ``path`` to the cache; return its entry.
+
+        The file is hard-linked into the store (copied if the cache is on
+        another file system); content already stored is not stored twice.
+        ``validators`` holds ``etag``, ``last_modified`` and other values
+        used to revalidate the entry later.
+        """
+        sha256 = file_sha256(path)
+        object_path = self.object_path(sha256)
+        if not os.path.exists(object_path):
+            tmp_path = f"{object_path}.tmp"
+            try:
+                os.link(path, tmp_path)
+            except OSError:
+                shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, object_path)
+        entry = {"url": url, "params": params or {}, "sha256": sha256,
+                 "size": os.path.getsize(object_path), "last_access": time.time(),
+                 **{name: value for name, value in (validators or {}).items() if value is not None}}
+        with self._lock:
+            index = self._load_index()
+            previous = index["entries"].get(self.key(url, params))
+            index["entries"][self.key(url, params)] = entry
+            if previous is not None:
+                self._remove_unreferenced(index, previous["sha256"])
+            self._evict(index, keep=sha256)
+            self._save_index(index)
+        return entry
+
+    def link(self, entry: dict, output_path: str) -> str:
+        """Hand out a cached object as ``output_path``; return the path.
+
+        ``output_path`` becomes a hard link to the object (a copy if hard
+        links are not possible), and the entry is marked as recently used.
+        """
+        object_path = self.object_path(entry["sha256"])
+        if not (os.path.exists(output_path) and os.path.samefile(object_path, output_path)):
+            tmp_path = f"{output_path}.cachelink"
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            try:
+                os.link(object_path, tmp_path)
+            except OSError:
+                shutil.copyfile(object_path, tmp_path)
+            os.replace(tmp_path, output_path)
+        self.touch(entry)
+        return output_path
+
+    def touch(self, entry: dict) -> None:
+        """Mark ``entry`` as used now, for LRU eviction"""
+        with self._lock:
+            index = self._load_index()
+            stored = index["entries"].get(self.key(entry["url"], entry["params"]))
+            if stored is not None:
+                stored["last_access"] = time.time()
+                self._save_index(index)
+
+    def size(self) -> int:
+        """Total bytes of the stored objects"""
+        with self._lock:
+            entries = self._load_index()["entries"].values()
+        return sum({entry["sha256"]: entry["size"] for entry in entries}.values())
+
+    def _evict(self, index: dict, keep: Optional[str] = None) -> None:
+        """Drop least recently used entries until the objects fit ``max_bytes``"""
+        entries = index["entries"]
+        sizes = {entry["sha256"]: entry["size"] for entry in entries.values()}
+        total = sum(sizes.values())
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if entry["sha256"] == keep:
+                continue
+            del entries[key]
+            if self._remove_unreferenced(index, entry["sha256"]):
+                total -= sizes[entry["sha256"]]
+                print(f"🧹 Evicted {entry['url']} ({entry['size'] / 1e6:,.1f} MB) from the download cache")
+
+    def _remove_unreferenced(self, index: dict, sha256: str) -> bool:
+        """Delete the object ``sha256`` if no entry uses it; return True if deleted"""
+        if any(entry["sha256"] == sha256 for entry in index["entries"].values()):
+            return False
+        if os.path.exists(self.object_path(sha256)):
+            os.remove(self.object_path(sha256))
+        return True
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {"entries": {}}
+        with open(self.index_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self, index: dict) -> None:
+        """Write the index atomically so a crash never leaves it half-written"""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=4)
+        os.replace(tmp_path, self.index_path)
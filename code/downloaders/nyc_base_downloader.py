@@ -6,17 +6,229 @@ Base class and specific downloaders for NYC Open Data CSV files.
 
 import requests
 import argparse
-from typing import Optional
+import csv
+import io
+import os
+import json
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import NamedTuple, Optional
+from urllib.parse import urlparse
 from abc import ABC, abstractmethod
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+
+from compressed_io import (COMPRESSION_EXTENSIONS, FrameCompressor, compression_for_path,
+                           with_compression_extension)
+from download_cache import DEFAULT_MAX_BYTES, DownloadCache, detach
+from stage_metrics import add_metrics_argument, configure as configure_metrics, current_span, span
+
+
+DEFAULT_PAGE_SIZE = 50000     # Rows requested per SoQL page ($limit)
+CHUNK_SIZE = 1024 * 1024      # Bytes streamed to disk per write
+SYNC_SELECT = ":id, :updated_at, *"   # Row id and update time needed for upserts
+ROW_GROUP_SIZE = 100000       # Rows per Parquet row group
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.ContentDecodingError)
+ACCEPT_ENCODING = "gzip, deflate"     # Compressed transfer, decoded while streaming
+
+# Socrata column types (views API ``dataTypeName``) with a typed Arrow equivalent;
+# every other type (text, url, WKT geometries, ...) is stored as a string
+SOCRATA_ARROW_TYPES = {
+    "number": "float64",
+    "double": "float64",
+    "money": "float64",
+    "percent": "float64",
+    "checkbox": "bool",
+    "calendar_date": "timestamp[ms]",
+    "floating_timestamp": "timestamp[ms]",
+}
+
+
+class CsvRecordCounter:
+    """Count CSV records in a byte stream without parsing it.
+
+    Newlines inside quoted fields (e.g. multi-line 311 descriptions) are not
+    counted, so the result matches what a CSV reader would return.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.in_quotes = False
+        self.partial = False
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        if not self.in_quotes and b'"' not in chunk:
+            self.records += chunk.count(b"\n")
+        else:
+            segments = chunk.split(b"\n")
+            for segment in segments[:-1]:
+                if segment.count(b'"') % 2:
+                    self.in_quotes = not self.in_quotes
+                if not self.in_quotes:
+                    self.records += 1
+            if segments[-1].count(b'"') % 2:
+                self.in_quotes = not self.in_quotes
+        self.partial = not chunk.endswith(b"\n")
+
+    def finish(self) -> int:
+        """Return the record count, including a final unterminated line"""
+        if self.partial:
+            self.records += 1
+            self.partial = False
+        return self.records
+
+
+class DownloadRange(NamedTuple):
+    """An independently downloadable slice of a dataset.
+
+    Either an offset window (``offset``/``limit``) or a ``$where`` clause that
+    is paged from its own offset 0. The default range covers the whole dataset.
+    ``select`` overrides the returned columns (``$select``).
+    """
+    where: Optional[str] = None
+    offset: int = 0
+    limit: Optional[int] = None
+    select: Optional[str] = None
+
+
+def csv_to_parquet(csv_path: str, parquet_path: str, column_types: Optional[dict] = None,
+                   row_group_size: int = ROW_GROUP_SIZE, compression: str = "zstd") -> int:
+    """Stream a CSV file into a Parquet file, one row group at a time.
+
+    ``column_types`` maps column names to Arrow type names (e.g. ``"float64"``);
+    missing columns are inferred by Arrow. If a value cannot be converted to
+    its declared type, that column falls back to string and the file is
+    converted again. Returns the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    types = {name: pa.type_for_alias(alias) for name, alias in (column_types or {}).items()}
+    while True:
+        tmp_path = f"{parquet_path}.tmp"
+        try:
+            reader = pa_csv.open_csv(
+                csv_path,
+                read_options=pa_csv.ReadOptions(block_size=16 * 1024 * 1024),
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                convert_options=pa_csv.ConvertOptions(column_types=types))
+            schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type)
+                                else field for field in reader.schema])
+            rows = 0
+            pending = []
+            pending_rows = 0
+            with pq.ParquetWriter(tmp_path, schema, compression=compression) as writer:
+                for batch in reader:
+                    pending.append(batch)
+                    pending_rows += batch.num_rows
+                    if pending_rows >= row_group_size:
+                        writer.write_table(pa.Table.from_batches(pending).cast(schema),
+                                           row_group_size=row_group_size)
+                        rows += pending_rows
+                        pending, pending_rows = [], 0
+                if pending:
+                    writer.write_table(pa.Table.from_batches(pending).cast(schema),
+                                       row_group_size=row_group_size)
+                    rows += pending_rows
+            os.replace(tmp_path, parquet_path)
+            return rows
+        except pa.ArrowInvalid as e:
+            match = re.search(r"CSV column #(\d+)", str(e))
+            if not match:
+                raise
+            column = header[int(match.group(1))]
+            if types.get(column) == pa.string():
+                raise
+            print(f"⚠️  Column '{column}' does not match its declared type; storing it as text")
+            types[column] = pa.string()
+
+
+class DownloadManifest:
+    """Sidecar ``<output>.manifest.json`` recording the progress of a download.
+
+    Paged downloads record each completed page with the output file size after
+    it, parallel downloads record the planned ranges and which of them are
+    complete. A manifest is only reused when its ``signature`` (URL, page
+    size, selected columns, mode) matches the current request.
+    """
+
+    def __init__(self, output_path: str, signature: dict):
+        self.path = f"{output_path}.manifest.json"
+        self.signature = signature
+        self.pages = []
+        self.ranges = None
+        self.completed = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Load a previous manifest; return True if it can be resumed"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("signature") != self.signature:
+            return False
+        self.pages = state.get("pages", [])
+        self.ranges = [DownloadRange(*rng) for rng in state["ranges"]] if state.get("ranges") else None
+        self.completed = {int(i): rows for i, rows in state.get("completed", {}).items()}
+        return True
+
+    def record_page(self, offset: int, rows: int, bytes_end: int) -> None:
+        self.pages.append({"offset": offset, "rows": rows, "bytes_end": bytes_end})
+        self.save()
+
+    def record_range(self, index: int, rows: int) -> None:
+        with self._lock:
+            self.completed[index] = rows
+            self.save()
+
+    def save(self) -> None:
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"signature": self.signature, "pages": self.pages,
+                       "ranges": [list(rng) for rng in self.ranges] if self.ranges else None,
+                       "completed": self.completed}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
 
 class NYCDataDownloader(ABC):
     """Base class for NYC Open Data CSV downloaders"""
     
-    def __init__(self, app_token: Optional[str] = None):
-        self.session = requests.Session()
+    def __init__(self, app_token: Optional[str] = None, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 cache: Optional[DownloadCache] = None,
+                 session: Optional[requests.Session] = None):
+        # A session passed in is shared with other downloaders and sized by its owner
+        self.shared_session = session is not None
+        self.session = session or requests.Session()
+        self.session.headers.update({'Accept-Encoding': ACCEPT_ENCODING})
         if app_token:
             self.session.headers.update({'X-App-Token': app_token})
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self.wire_bytes = 0
+        self._stats_lock = threading.Lock()
     
     @property
     @abstractmethod
@@ -30,18 +242,640 @@ class NYCDataDownloader(ABC):
         """Each subclass must define its dataset name for descriptions"""
         pass
     
-    def download_csv(self, output_path: str, timeout: int = 10) -> None:
-        """Download the CSV file and save it to disk"""
+    @property
+    def DATASET_ID(self) -> str:
+        """Socrata four-by-four id, taken from ``BASE_URL``"""
+        match = re.search(r"/resource/([^/.]+)", self.BASE_URL)
+        if not match:
+            raise ValueError(f"Cannot find a dataset id in {self.BASE_URL}")
+        return match.group(1)
+
+    @property
+    def VIEWS_URL(self) -> str:
+        """Views API endpoint with the dataset's metadata (``rowsUpdatedAt``)"""
+        parsed = urlparse(self.BASE_URL)
+        return f"{parsed.scheme}://{parsed.netloc}/api/views/{self.DATASET_ID}.json"
+
+    def download_csv(self, output_path: str, timeout: int = 10,
+                     page_size: int = DEFAULT_PAGE_SIZE, workers: int = 1,
+                     partition_column: Optional[str] = None,
+                     partition_freq: str = "year", select: Optional[str] = None,
+                     use_cache: bool = True) -> bool:
+        """Download the CSV file and save it to disk.
+
+        With a positive ``page_size`` the dataset is walked page by page with
+        ``$limit``/``$offset``; otherwise a single request is streamed to disk.
+        With ``workers`` > 1 independent ranges are fetched concurrently (see
+        ``download_csv_parallel``). With a ``cache``, an unchanged dataset is
+        linked from the cache instead (see ``download_csv_cached``). An
+        ``output_path`` ending in ``.gz`` or ``.zst`` is written compressed
+        while it is streamed (see ``compressed_io``). Returns True on success.
+        """
+        detach(output_path)
+        if self.cache is not None and use_cache:
+            return self.download_csv_cached(output_path, timeout=timeout, page_size=page_size,
+                                            workers=workers, partition_column=partition_column,
+                                            partition_freq=partition_freq, select=select)
+        if workers > 1 and page_size and page_size > 0:
+            return self.download_csv_parallel(output_path, workers=workers, page_size=page_size,
+                                              timeout=timeout, partition_column=partition_column,
+                                              partition_freq=partition_freq, select=select)
+        if page_size and page_size > 0:
+            return self.download_csv_paged(output_path, page_size=page_size, timeout=timeout,
+                                           select=select)
+
         print(f"📥 Requesting CSV data from: {self.BASE_URL}")
+        started, wire_start = time.monotonic(), self.wire_bytes
         try:
-            response = self.session.get(self.BASE_URL, timeout=timeout)
-            print(f"🔄 Status code: {response.status_code}")
-            response.raise_for_status()
             with open(output_path, "wb") as f:
-                f.write(response.content)
-            print(f"✅ CSV file successfully downloaded to: {output_path}")
+                rows, nbytes = self._stream_page(f, {"$select": select} if select else {},
+                                                 timeout=timeout,
+                                                 compression=compression_for_path(output_path))
+            self._report_throughput(output_path, rows, nbytes, started, self.wire_bytes - wire_start)
+            return True
+        except requests.RequestException as e:
+            print(f"❌ Failed to download CSV: {e}")
+            return False
+
+    def download_csv_cached(self, output_path: str, timeout: int = 10,
+                            page_size: int = DEFAULT_PAGE_SIZE, workers: int = 1,
+                            partition_column: Optional[str] = None,
+                            partition_freq: str = "year", select: Optional[str] = None) -> bool:
+        """Serve the download from ``self.cache`` when the dataset is unchanged.
+
+        The views API is requested with the ``ETag``/``Last-Modified`` of the
+        cached copy as ``If-None-Match``/``If-Modified-Since``. A
+        ``304 Not Modified`` (or an unchanged ``rowsUpdatedAt`` from servers
+        that ignore conditional requests) hard-links the cached file to
+        ``output_path``; otherwise the dataset is downloaded as usual and
+        added to the cache.
+        """
+        # Parameters that change the bytes of the output; page size and workers do not
+        params = {"select": select, "single_request": not (page_size and page_size > 0),
+                  "partition_column": partition_column if workers > 1 else None,
+                  "partition_freq": partition_freq if workers > 1 and partition_column else None,
+                  "compression": compression_for_path(output_path)}
+        entry = self.cache.lookup(self.BASE_URL, params)
+        try:
+            response = self._get(self.VIEWS_URL, timeout=timeout,
+                                 headers=self.cache.conditional_headers(entry))
+            rows_updated_at = None
+            if response.status_code != 304:
+                rows_updated_at = int(response.json().get("rowsUpdatedAt") or 0) or None
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️  Could not revalidate the cached copy ({e}); downloading")
+            response, rows_updated_at = None, None
+        if entry is not None and response is not None and (
+                response.status_code == 304 or
+                (rows_updated_at and rows_updated_at == entry.get("rows_updated_at"))):
+            self.cache.hits += 1
+            self.cache.link(entry, output_path)
+            current_span().set(cache_hit=True)
+            reason = "304 Not Modified" if response.status_code == 304 else f"rowsUpdatedAt {rows_updated_at}"
+            print(f"✅ {self.DATASET_NAME} is unchanged ({reason}); "
+                  f"linked {entry['size'] / 1e6:,.1f} MB from the cache to {output_path}")
+            return True
+
+        self.cache.misses += 1
+        if not self.download_csv(output_path, timeout=timeout, page_size=page_size, workers=workers,
+                                 partition_column=partition_column, partition_freq=partition_freq,
+                                 select=select, use_cache=False):
+            return False
+        validators = {}
+        if response is not None:
+            validators = {"etag": response.headers.get("ETag"),
+                          "last_modified": response.headers.get("Last-Modified"),
+                          "rows_updated_at": rows_updated_at}
+        entry = self.cache.store(self.BASE_URL, params, output_path, validators)
+        self.cache.link(entry, output_path)
+        print(f"🗄️  Cached {output_path} as {entry['sha256'][:12]} in {self.cache.cache_dir}")
+        return True
+
+    def download_csv_paged(self, output_path: str, page_size: int = DEFAULT_PAGE_SIZE,
+                           timeout: int = 10, select: Optional[str] = None) -> bool:
+        """Download every row by walking ``$limit``/``$offset`` pages.
+
+        Pages are ordered by the Socrata row id (``:id``) so that offsets are
+        stable, and each page is streamed to disk in chunks, so memory use does
+        not grow with the dataset size. Only the first page's header is kept.
+        Completed pages are checkpointed in a ``DownloadManifest``; after a
+        failure, running the same download again truncates the output to the
+        last complete page and continues from there.
+        """
+        print(f"📥 Requesting CSV data from: {self.BASE_URL} (page size: {page_size:,})")
+        started, wire_start = time.monotonic(), self.wire_bytes
+        manifest = DownloadManifest(output_path, {"url": self.BASE_URL, "mode": "paged",
+                                                  "page_size": page_size, "select": select})
+        rng = DownloadRange(select=select)
+        done_rows = done_bytes = 0
+        if manifest.load() and manifest.pages and os.path.exists(output_path):
+            last = manifest.pages[-1]
+            done_rows = sum(page["rows"] for page in manifest.pages)
+            done_bytes = last["bytes_end"]
+            rng = rng._replace(offset=last["offset"] + last["rows"])
+            print(f"♻️  Resuming from checkpoint: {done_rows:,} rows already downloaded")
+            f = open(output_path, "r+b")
+            f.truncate(done_bytes)
+            f.seek(done_bytes)
+        else:
+            manifest.pages = []
+            f = open(output_path, "wb")
+        try:
+            with f:
+                rows, nbytes = self._download_range(
+                    f, rng, page_size, timeout, start_page=len(manifest.pages),
+                    on_page=lambda offset, page_rows: manifest.record_page(offset, page_rows, f.tell()),
+                    compression=compression_for_path(output_path))
+            manifest.remove()
+            self._report_throughput(output_path, done_rows + rows, done_bytes + nbytes, started,
+                                    self.wire_bytes - wire_start)
+            return True
+        except requests.RequestException as e:
+            print(f"❌ Failed to download CSV: {e}")
+            if os.path.exists(manifest.path):
+                print(f"♻️  Progress saved to {manifest.path}; rerun the same command to resume")
+            return False
+
+    def download_csv_parallel(self, output_path: str, workers: int = 4,
+                              page_size: int = DEFAULT_PAGE_SIZE, timeout: int = 10,
+                              partition_column: Optional[str] = None,
+                              partition_freq: str = "year",
+                              select: Optional[str] = None) -> bool:
+        """Fetch independent ranges of the dataset concurrently.
+
+        The dataset is split into offset windows of ``page_size`` rows, or into
+        date partitions on ``partition_column`` (one ``$where`` clause per
+        year or month). Up to ``workers`` ranges are downloaded at the same time
+        into part files over the shared session's connection pool, then the
+        parts are concatenated in range order. With offset windows the output
+        is identical to a sequential paged download; date partitions give the
+        same rows, grouped by partition instead of in ``:id`` order. The range plan and completed ranges are
+        checkpointed in a ``DownloadManifest``, so a rerun after a failure only
+        fetches the ranges that are still missing. Compressed parts are written
+        without their header (except the first) and joined frame by frame.
+        """
+        print(f"📥 Requesting CSV data from: {self.BASE_URL} "
+              f"({workers} workers, page size: {page_size:,})")
+        started, wire_start = time.monotonic(), self.wire_bytes
+        compression = compression_for_path(output_path)
+        manifest = DownloadManifest(output_path, {
+            "url": self.BASE_URL, "mode": "parallel", "page_size": page_size, "select": select,
+            "partition_column": partition_column, "partition_freq": partition_freq})
+        try:
+            if manifest.load() and manifest.ranges:
+                ranges = manifest.ranges
+                print(f"♻️  Resuming from checkpoint: {len(manifest.completed)} of "
+                      f"{len(ranges)} ranges already downloaded")
+            else:
+                if partition_column:
+                    ranges = self.plan_date_ranges(partition_column, partition_freq, timeout=timeout)
+                else:
+                    ranges = self.plan_offset_ranges(page_size, timeout=timeout)
+                ranges = [rng._replace(select=select) for rng in ranges]
+                manifest.ranges, manifest.completed = ranges, {}
+                manifest.save()
+                print(f"🧩 Split into {len(ranges)} ranges")
+            self._configure_pool(workers)
+
+            part_paths = [f"{output_path}.part{i:05d}" for i in range(len(ranges))]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {i: pool.submit(self._download_range_to_file, part_paths[i], rng,
+                                          page_size, timeout, manifest, i, compression)
+                           for i, rng in enumerate(ranges)
+                           if not (i in manifest.completed and os.path.exists(part_paths[i]))}
+                csv_bytes = sum(future.result()[1] for future in futures.values())
+            total_rows = sum(manifest.completed.values())
+
+            with span("download.merge", dataset=self.DATASET_NAME, parts=len(part_paths)):
+                total_bytes = self._merge_parts(part_paths, output_path, skip_headers=not compression)
+            for path in part_paths:
+                os.remove(path)
+            manifest.remove()
+            self._report_throughput(output_path, total_rows, csv_bytes if compression else total_bytes,
+                                    started, self.wire_bytes - wire_start)
+            return True
         except requests.RequestException as e:
             print(f"❌ Failed to download CSV: {e}")
+            if os.path.exists(manifest.path):
+                print(f"♻️  Progress saved to {manifest.path}; rerun the same command to resume")
+            return False
+
+    def download_csv_incremental(self, output_path: str, page_size: int = DEFAULT_PAGE_SIZE,
+                                 timeout: int = 10, workers: int = 1) -> bool:
+        """Bring a local copy up to date with only the rows changed since the last run.
+
+        The local CSV carries the Socrata ``:id`` and ``:updated_at`` columns,
+        and a ``<output>.sync.json`` sidecar stores the dataset's
+        ``rowsUpdatedAt`` and the ``:updated_at`` watermark of the last sync.
+        If the views API reports no change since then nothing is downloaded;
+        otherwise rows with ``:updated_at`` at or after the watermark are
+        fetched and upserted into the local copy by ``:id``. Without a usable
+        local copy a full download is made. Rows deleted upstream are not
+        detected; run a full download to drop them.
+        """
+        if compression_for_path(output_path):
+            print(f"❌ Incremental syncs upsert into a plain CSV; use an output path "
+                  f"without {', '.join(COMPRESSION_EXTENSIONS.values())}")
+            return False
+        state_path = f"{output_path}.sync.json"
+        state = self._load_sync_state(state_path)
+        try:
+            rows_updated_at = self.get_rows_updated_at(timeout=timeout)
+            if (state.get("watermark") and os.path.exists(output_path)
+                    and self._has_sync_columns(output_path)):
+                if rows_updated_at and rows_updated_at <= state.get("rows_updated_at", 0):
+                    print(f"✅ {output_path} is already up to date "
+                          f"(rowsUpdatedAt: {rows_updated_at})")
+                    return True
+                watermark = self._query_single_row(
+                    {"$select": "max(:updated_at) AS watermark"}, timeout).get("watermark")
+                if not self._sync_delta(output_path, state["watermark"], page_size, timeout):
+                    return False
+            else:
+                print("🆕 No previous sync found, downloading the full dataset")
+                watermark = self._query_single_row(
+                    {"$select": "max(:updated_at) AS watermark"}, timeout).get("watermark")
+                if not self.download_csv(output_path, timeout=timeout, page_size=page_size,
+                                         workers=workers, select=SYNC_SELECT):
+                    return False
+        except requests.RequestException as e:
+            print(f"❌ Failed to sync CSV: {e}")
+            return False
+
+        # Written atomically so a crash never leaves a half-written watermark
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dataset_id": self.DATASET_ID, "rows_updated_at": rows_updated_at,
+                       "watermark": watermark}, f, indent=4)
+        os.replace(tmp_path, state_path)
+        print(f"🔖 Sync watermark saved to {state_path}: {watermark}")
+        return True
+
+    def get_rows_updated_at(self, timeout: int = 10) -> int:
+        """Return the dataset's ``rowsUpdatedAt`` epoch from the views API"""
+        return int(self.get_view(timeout=timeout).get("rowsUpdatedAt") or 0)
+
+    def get_view(self, timeout: int = 10) -> dict:
+        """Return the dataset's views API metadata"""
+        return self._get(self.VIEWS_URL, timeout=timeout).json()
+
+    def get_column_types(self, timeout: int = 10) -> dict:
+        """Map CSV column names to Arrow type names using the views API schema"""
+        columns = self.get_view(timeout=timeout).get("columns", [])
+        return {col["fieldName"]: SOCRATA_ARROW_TYPES.get(col.get("dataTypeName", ""), "string")
+                for col in columns if col.get("fieldName")}
+
+    def download_parquet(self, output_path: str, timeout: int = 10,
+                         incremental: bool = False, **download_kwargs) -> bool:
+        """Download the dataset and store it as a typed, compressed Parquet file.
+
+        The rows are first downloaded to a ``<output>.csv`` staging file with
+        the regular (paged, parallel, resumable or incremental) CSV download,
+        then streamed into Parquet row groups with the column types from the
+        views API, so memory stays bounded by the row group size. The staging
+        CSV is kept for incremental syncs, which upsert into it.
+        """
+        staging_path = f"{output_path}.csv"
+        if incremental:
+            ok = self.download_csv_incremental(staging_path, timeout=timeout, **download_kwargs)
+        else:
+            ok = self.download_csv(staging_path, timeout=timeout, **download_kwargs)
+        if not ok:
+            return False
+        try:
+            column_types = self.get_column_types(timeout=timeout)
+        except requests.RequestException as e:
+            print(f"⚠️  Could not fetch column types ({e}); inferring them from the data")
+            column_types = {}
+        started = time.monotonic()
+        with span("download.parse", dataset=self.DATASET_NAME) as current:
+            rows = csv_to_parquet(staging_path, output_path, column_types)
+            current.add(rows=rows, bytes=os.path.getsize(staging_path))
+        print(f"🧱 Wrote {rows:,} rows to Parquet: {output_path} "
+              f"({os.path.getsize(output_path) / 1e6:,.1f} MB, "
+              f"{time.monotonic() - started:,.1f}s)")
+        if not incremental:
+            os.remove(staging_path)
+        return True
+
+    def _sync_delta(self, output_path: str, watermark: str, page_size: int, timeout: int) -> bool:
+        """Download rows changed since ``watermark`` and upsert them by ``:id``"""
+        delta_path = f"{output_path}.delta"
+        print(f"🔁 Requesting rows updated since {watermark}")
+        started = time.monotonic()
+        try:
+            with open(delta_path, "wb") as f:
+                rows, nbytes = self._download_range(
+                    f, DownloadRange(where=f":updated_at >= '{watermark}'", select=SYNC_SELECT),
+                    page_size, timeout)
+            self._report_throughput(delta_path, rows, nbytes, started)
+            if rows:
+                updated, inserted = self.upsert_csv(output_path, delta_path)
+                print(f"🔀 Upserted into {output_path}: {updated:,} updated, {inserted:,} new rows")
+            return True
+        except ValueError as e:
+            print(f"❌ Failed to merge changed rows: {e}")
+            return False
+        finally:
+            if os.path.exists(delta_path):
+                os.remove(delta_path)
+
+    @staticmethod
+    def upsert_csv(base_path: str, delta_path: str, key: str = ":id") -> tuple:
+        """Replace rows of ``base_path`` whose ``key`` appears in ``delta_path``.
+
+        The base file is streamed once, so only the (small) delta is held in
+        memory. Rows of the delta that are not in the base are appended.
+        Returns (updated rows, inserted rows).
+        """
+        csv.field_size_limit(2 ** 31 - 1)
+        with open(delta_path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            delta_header = next(reader)
+            delta = {row[delta_header.index(key)]: row for row in reader}
+
+        tmp_path = f"{base_path}.tmp"
+        updated = 0
+        with open(base_path, newline="", encoding="utf-8") as src, \
+                open(tmp_path, "w", newline="", encoding="utf-8") as dst:
+            reader = csv.reader(src)
+            header = next(reader)
+            if header != delta_header:
+                raise ValueError("the dataset columns changed since the last sync; "
+                                 "run a full download instead")
+            key_index = header.index(key)
+            writer = csv.writer(dst, lineterminator="\n")
+            writer.writerow(header)
+            for row in reader:
+                replacement = delta.pop(row[key_index], None)
+                if replacement is not None:
+                    row = replacement
+                    updated += 1
+                writer.writerow(row)
+            writer.writerows(delta.values())
+        os.replace(tmp_path, base_path)
+        return updated, len(delta)
+
+    @staticmethod
+    def _has_sync_columns(output_path: str) -> bool:
+        with open(output_path, newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        return ":id" in header and ":updated_at" in header
+
+    @staticmethod
+    def _load_sync_state(state_path: str) -> dict:
+        """The previous sync's state; an unreadable file counts as no previous sync"""
+        if not os.path.exists(state_path):
+            return {}
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable sync state {state_path}: {e}")
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def count_rows(self, where: Optional[str] = None, timeout: int = 10) -> int:
+        """Return the number of rows matching ``where`` using ``count(*)``"""
+        params = {"$select": "count(*) AS count"}
+        if where:
+            params["$where"] = where
+        row = self._query_single_row(params, timeout)
+        return int(row.get("count") or 0)
+
+    def plan_offset_ranges(self, page_size: int, timeout: int = 10) -> list:
+        """Split the dataset into ``$offset`` windows of ``page_size`` rows"""
+        total = self.count_rows(timeout=timeout)
+        return [DownloadRange(offset=offset, limit=page_size)
+                for offset in range(0, max(total, 1), page_size)]
+
+    def plan_date_ranges(self, column: str, freq: str = "year", timeout: int = 10) -> list:
+        """Split the dataset into ``$where`` windows on a date column.
+
+        ``freq`` is ``"year"`` or ``"month"``. Rows with no value in ``column``
+        are fetched by a final ``IS NULL`` range so that no row is dropped.
+        """
+        if freq not in ("year", "month"):
+            raise ValueError(f"Unsupported partition frequency: {freq}")
+        row = self._query_single_row(
+            {"$select": f"min({column}) AS lo, max({column}) AS hi"}, timeout)
+        ranges = []
+        if row.get("lo") and row.get("hi"):
+            year, month = int(row["lo"][:4]), int(row["lo"][5:7]) if freq == "month" else 1
+            last = (int(row["hi"][:4]), int(row["hi"][5:7]) if freq == "month" else 1)
+            while (year, month) <= last:
+                if freq == "month":
+                    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+                else:
+                    next_year, next_month = year + 1, 1
+                ranges.append(DownloadRange(where=(
+                    f"{column} >= '{year:04d}-{month:02d}-01T00:00:00' AND "
+                    f"{column} < '{next_year:04d}-{next_month:02d}-01T00:00:00'")))
+                year, month = next_year, next_month
+        ranges.append(DownloadRange(where=f"{column} IS NULL"))
+        return ranges
+
+    def _query_single_row(self, params: dict, timeout: int) -> dict:
+        """Run an aggregate SoQL query and return its first row as a dict"""
+        response = self._get(self.BASE_URL, params=params, timeout=timeout)
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        return rows[0] if rows else {}
+
+    def _configure_pool(self, workers: int) -> None:
+        """Size the session's connection pool for ``workers`` threads"""
+        if self.shared_session:
+            return
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _download_range_to_file(self, path: str, rng: "DownloadRange", page_size: int,
+                                timeout: int, manifest: Optional[DownloadManifest] = None,
+                                index: int = 0, compression: Optional[str] = None) -> tuple:
+        with open(path, "wb") as f:
+            # Compressed parts cannot have their header cut when merged: drop it now
+            rows, nbytes = self._download_range(f, rng, page_size, timeout, compression=compression,
+                                                header=not (compression and index > 0))
+        if manifest is not None:
+            manifest.record_range(index, rows)
+        return rows, nbytes
+
+    def _download_range(self, f, rng: "DownloadRange", page_size: int, timeout: int,
+                        start_page: int = 0, on_page=None, compression: Optional[str] = None,
+                        header: bool = True) -> tuple:
+        """Walk the pages of one range into ``f``; return (rows, bytes).
+
+        ``start_page`` > 0 continues a range whose header is already written;
+        ``header=False`` leaves the header out altogether.
+        ``on_page(offset, rows)`` is called after each page is flushed to disk.
+        Pages are compressed with ``compression`` (``"gzip"``/``"zstd"``).
+        """
+        total_rows = total_bytes = 0
+        offset = rng.offset
+        page = start_page
+        label = f"[offset {rng.offset:,}] " if rng.limit else (f"[{rng.where}] " if rng.where else "")
+        while True:
+            limit = page_size if rng.limit is None else min(page_size, rng.limit - (offset - rng.offset))
+            params = {"$limit": limit, "$offset": offset, "$order": ":id"}
+            if rng.where:
+                params["$where"] = rng.where
+            if rng.select:
+                params["$select"] = rng.select
+            rows, nbytes = self._stream_page(f, params, timeout=timeout,
+                                             skip_header=page > 0 or not header,
+                                             compression=compression)
+            if on_page is not None:
+                f.flush()
+                on_page(offset, rows)
+            page += 1
+            total_rows += rows
+            total_bytes += nbytes
+            print(f"📄 {label}Page {page}: {rows:,} rows (total: {total_rows:,})")
+            offset += rows
+            if rows < limit or (rng.limit is not None and offset - rng.offset >= rng.limit):
+                return total_rows, total_bytes
+
+    @staticmethod
+    def _merge_parts(part_paths: list, output_path: str, skip_headers: bool = True) -> int:
+        """Concatenate part files in order, keeping only the first header"""
+        written = 0
+        with open(output_path, "wb") as out:
+            for i, path in enumerate(part_paths):
+                with open(path, "rb") as part:
+                    if i > 0 and skip_headers:
+                        part.readline()
+                    while True:
+                        chunk = part.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        written += len(chunk)
+        return written
+
+    def _stream_page(self, f, params: dict, timeout: int = 10,
+                     skip_header: bool = False, compression: Optional[str] = None) -> tuple:
+        """Stream one response into ``f``; return (data rows, CSV bytes).
+
+        The response is requested with ``Accept-Encoding: gzip`` and decoded
+        chunk by chunk as it arrives; the compressed bytes read from the
+        connection are added to ``wire_bytes``. With ``compression`` the CSV is
+        re-compressed into frames ending with the page. If the transfer fails
+        part-way, ``f`` is truncated back to where the page started before the
+        request is retried.
+        """
+        start = f.tell()
+
+        def attempt() -> tuple:
+            f.seek(start)
+            f.truncate()
+            counter = CsvRecordCounter()
+            compressor = FrameCompressor(compression) if compression else None
+            written = 0
+            skip = skip_header
+            with span("download.page", dataset=self.DATASET_NAME,
+                      offset=params.get("$offset", 0)) as current, \
+                    self._get(self.BASE_URL, params=params, timeout=timeout,
+                              stream=True, retry=False) as response:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    counter.feed(chunk)
+                    if skip:
+                        newline = chunk.find(b"\n")
+                        if newline < 0:
+                            continue
+                        chunk = chunk[newline + 1:]
+                        skip = False
+                    f.write(compressor.compress(chunk) if compressor else chunk)
+                    written += len(chunk)
+                if compressor:
+                    f.write(compressor.flush())
+                with self._stats_lock:
+                    self.wire_bytes += response.raw.tell()
+                # The header line is always part of the response
+                rows = max(counter.finish() - 1, 0)
+                current.add(rows=rows, bytes=written, wire_bytes=response.raw.tell())
+            return rows, written
+
+        return self._with_retries(attempt, f"Page at offset {params.get('$offset', 0)}")
+
+    def _get(self, url: str, params: Optional[dict] = None, timeout: int = 10,
+             stream: bool = False, retry: bool = True,
+             headers: Optional[dict] = None) -> requests.Response:
+        """GET ``url``, raising for HTTP errors and retrying transient failures.
+
+        Each attempt is recorded as a ``download.request`` span; with
+        ``stream=True`` it ends when the headers have arrived.
+        """
+        def attempt() -> requests.Response:
+            with span("download.request", dataset=self.DATASET_NAME, url=url) as current:
+                response = self.session.get(url, params=params, timeout=timeout, stream=stream,
+                                            headers=headers)
+                current.set(status=response.status_code)
+            try:
+                response.raise_for_status()
+            except requests.HTTPError:
+                response.close()
+                raise
+            return response
+
+        return self._with_retries(attempt, "Request") if retry else attempt()
+
+    def _with_retries(self, action, description: str):
+        """Call ``action`` until it succeeds, backing off on transient errors.
+
+        Connection errors, timeouts, broken transfers and 429/5xx responses
+        are retried up to ``max_retries`` times with exponential backoff and
+        full jitter; a ``Retry-After`` header sets the minimum wait.
+        """
+        attempt = 0
+        while True:
+            try:
+                return action()
+            except requests.RequestException as e:
+                response = e.response if isinstance(e, requests.HTTPError) else None
+                retryable = isinstance(e, RETRY_ERRORS) or (
+                    response is not None and response.status_code in RETRY_STATUS)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(
+                    attempt, response.headers.get("Retry-After") if response is not None else None)
+                attempt += 1
+                print(f"⚠️  {description} failed ({e}); retry {attempt}/{self.max_retries} "
+                      f"in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Exponential backoff with full jitter, never shorter than ``Retry-After``"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                wait = float(retry_after)
+            except ValueError:
+                try:
+                    wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    wait = 0
+            delay = max(delay, min(wait, self.backoff_max))
+        return delay
+
+    def _report_throughput(self, output_path: str, rows: int, nbytes: int,
+                           started: float, wire_bytes: Optional[int] = None) -> None:
+        """Print the final row/byte counts and download rates.
+
+        ``nbytes`` counts CSV bytes; the bytes received (``wire_bytes``) and
+        the size on disk are reported when compression made them smaller.
+        """
+        elapsed = max(time.monotonic() - started, 1e-9)
+        current_span().add(rows=rows, bytes=nbytes, wire_bytes=wire_bytes or 0)
+        print(f"✅ CSV file successfully downloaded to: {output_path}")
+        print(f"📊 {rows:,} rows, {nbytes / 1e6:,.1f} MB in {elapsed:,.1f}s "
+              f"({rows / elapsed:,.0f} rows/s, {nbytes / 1e6 / elapsed:,.2f} MB/s)")
+        if wire_bytes and wire_bytes < nbytes:
+            print(f"🌐 {wire_bytes / 1e6:,.1f} MB transferred with compression "
+                  f"({nbytes / wire_bytes:,.1f}x smaller than the CSV)")
+        stored = os.path.getsize(output_path)
+        if stored < nbytes and compression_for_path(output_path):
+            print(f"💾 {stored / 1e6:,.1f} MB stored as {compression_for_path(output_path)} "
+                  f"({nbytes / stored:,.1f}x smaller than the CSV)")
     
     def create_argument_parser(self) -> argparse.ArgumentParser:
         """Create standardized argument parser"""
@@ -52,10 +886,67 @@ class NYCDataDownloader(ABC):
                           help="Optional Socrata API app token")
         parser.add_argument("--timeout", type=int, default=10,
                           help="Request timeout in seconds (default: 10)")
+        parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                          help=f"Rows per $limit/$offset page; 0 downloads with a single request "
+                               f"(default: {DEFAULT_PAGE_SIZE})")
+        parser.add_argument("--workers", type=int, default=1,
+                          help="Number of ranges downloaded concurrently (default: 1)")
+        parser.add_argument("--partition-column",
+                          help="Split parallel downloads by year/month of this date column "
+                               "instead of by offset windows")
+        parser.add_argument("--partition-freq", choices=["year", "month"], default="year",
+                          help="Date partition size for --partition-column (default: year)")
+        parser.add_argument("--incremental", action="store_true",
+                          help="Only fetch rows changed since the last run and upsert them "
+                               "into the existing output file")
+        parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                          help="Output file format (default: csv). Parquet output is typed "
+                               "from the views API schema and zstd-compressed")
+        parser.add_argument("--max-retries", type=int, default=5,
+                          help="Retries per request on timeouts, dropped connections, "
+                               "429 and 5xx responses (default: 5)")
+        parser.add_argument("--compress", choices=sorted(COMPRESSION_EXTENSIONS),
+                          help="Store the CSV gzip- or zstd-compressed while it is downloaded "
+                               "(adds .gz/.zst to the output path; also chosen by an output "
+                               "path ending in .gz or .zst)")
+        parser.add_argument("--cache-dir",
+                          help="Shared download cache; an unchanged dataset is revalidated "
+                               "with a conditional request and linked from the cache")
+        parser.add_argument("--cache-max-gb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3,
+                          help=f"Size at which least recently used cache entries are evicted "
+                               f"(default: {DEFAULT_MAX_BYTES / 1024 ** 3:g})")
+        add_metrics_argument(parser)
         return parser
     
     def run(self) -> None:
-        """Main execution method"""
+        """Main execution method; exits with status 1 if the download fails"""
         parser = self.create_argument_parser()
         args = parser.parse_args()
-        self.download_csv(args.output, timeout=args.timeout)
\ No newline at end of file
+        if args.app_token:
+            self.session.headers.update({'X-App-Token': args.app_token})
+        self.max_retries = args.max_retries
+        if args.compress:
+            if args.format == "parquet" or args.incremental:
+                parser.error("--compress applies to full CSV downloads; Parquet output is "
+                             "already zstd-compressed")
+            args.output = with_compression_extension(args.output, args.compress)
+        if args.cache_dir:
+            self.cache = DownloadCache(args.cache_dir, int(args.cache_max_gb * 1024 ** 3))
+        configure_metrics(args.metrics)
+        with span("download", dataset=self.DATASET_NAME, format=args.format) as current:
+            if args.format == "parquet":
+                partitions = {} if args.incremental else {
+                    "partition_column": args.partition_column, "partition_freq": args.partition_freq}
+                ok = self.download_parquet(args.output, timeout=args.timeout,
+                                           incremental=args.incremental, page_size=args.page_size,
+                                           workers=args.workers, **partitions)
+            elif args.incremental:
+                ok = self.download_csv_incremental(args.output, page_size=args.page_size,
+                                                   timeout=args.timeout, workers=args.workers)
+            else:
+                ok = self.download_csv(args.output, timeout=args.timeout, page_size=args.page_size,
+                                       workers=args.workers, partition_column=args.partition_column,
+                                       partition_freq=args.partition_freq)
+            current.set(ok=ok)
+        if not ok:
+            sys.exit(1)
@@ -0,0 +1,305 @@
+"""
+Local Socrata Stub Server
+
+A small in-process HTTP server that imitates the NYC Open Data
+``/resource/<id>.csv`` endpoint, so the downloaders can be exercised offline.
+It generates a synthetic 311-like dataset and understands the SoQL subset the
+downloaders use: ``$limit``, ``$offset``, ``$order=:id``, ``$where`` (``>=``,
+``<``, ``>``, ``<=``, ``=`` comparisons joined by ``AND``, and ``IS NULL``),
+``count(*)``/``min()``/``max()`` and column-list selects (including the
+``:id`` and ``:updated_at`` system fields). ``/api/views/<id>.json`` returns
+``rowsUpdatedAt`` with an ``ETag`` and ``Last-Modified`` derived from it, and
+answers ``If-None-Match``/``If-Modified-Since`` with ``304 Not Modified``
+while the data is unchanged. ``update_rows``/``append_rows`` simulate upstream edits
+for incremental syncs, and ``inject_faults`` makes upcoming CSV requests
+fail with an HTTP status (optionally with ``Retry-After``) or drop the
+connection half-way through the body, to exercise retries and checkpoints.
+CSV responses are gzip-encoded for clients that send ``Accept-Encoding:
+gzip`` (as Socrata does) unless ``gzip=False``. A per-request ``latency`` makes network-bound behaviour (and the speed-up of
+parallel downloads) visible.
+
+Usage:
+    python socrata_stub.py --rows 20000 --latency 0.2 --page-size 1000 --workers 8
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import re
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+COLUMNS = ["unique_key", "created_date", "complaint_type", "descriptor", "latitude", "longitude"]
+COMPLAINTS = ["Noise - Residential", "Illegal Parking", "Blocked Driveway", "Street Condition"]
+
+_CLAUSE = re.compile(r"^\s*(\S+)\s*(>=|<=|>|<|=)\s*'([^']*)'\s*$")
+_IS_NULL = re.compile(r"^\s*(\S+)\s+IS\s+NULL\s*$", re.IGNORECASE)
+_AGGREGATE = re.compile(r"(count|min|max)\(([^)]*)\)\s+AS\s+(\w+)", re.IGNORECASE)
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+
+def make_rows(n: int, start: datetime = datetime(2020, 1, 1), first: int = 0) -> list:
+    """Generate ``n`` synthetic 311-like rows keyed by ``:id``"""
+    rows = []
+    for i in range(first, first + n):
+        created = start + timedelta(hours=7 * i)
+        rows.append({
+            ":id": f"row-{i:08d}",
+            ":updated_at": _timestamp(created),
+            "unique_key": str(40000000 + i),
+            # Every 50th row has no date so IS NULL partitions are exercised
+            "created_date": "" if i % 50 == 49 else created.strftime("%Y-%m-%dT%H:%M:%S.000"),
+            "complaint_type": COMPLAINTS[i % len(COMPLAINTS)],
+            # Quoted commas and newlines, as in real 311 descriptors
+            "descriptor": f"Caller reports issue #{i}, see notes\nsecond line" if i % 7 == 0 else "Loud Music/Party",
+            "latitude": f"{40.5 + (i % 1000) / 2000:.6f}",
+            "longitude": f"{-74.2 + (i % 997) / 1500:.6f}",
+        })
+    return rows
+
+
+def _compile_where(where: str):
+    """Turn a ``$where`` clause into a predicate over row dicts"""
+    checks = []
+    for clause in re.split(r"\s+AND\s+", where, flags=re.IGNORECASE):
+        null_match = _IS_NULL.match(clause)
+        if null_match:
+            checks.append((null_match.group(1), None, None))
+        else:
+            checks.append(_CLAUSE.match(clause).groups())
+    compare = {">=": str.__ge__, "<=": str.__le__, ">": str.__gt__, "<": str.__lt__, "=": str.__eq__}
+
+    def predicate(row: dict) -> bool:
+        for column, op, value in checks:
+            current = row.get(column, "")
+            if op is None:
+                if current:
+                    return False
+            # ISO timestamps and zero-padded ids compare correctly as strings
+            elif not current or not compare[op](current, value):
+                return False
+        return True
+
+    return predicate
+
+
+class SocrataStubServer:
+    """Serve synthetic rows on ``http://127.0.0.1:<port>/resource/<id>.csv``"""
+
+    def __init__(self, rows: list, latency: float = 0.0, port: int = 0, gzip: bool = True):
+        self.rows = rows
+        self.latency = latency
+        self.gzip = gzip
+        self.rows_updated_at = int(time.time())
+        self.faults = []
+        self.requests = []
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url_for(self, dataset_id: str = "stub-0001") -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/resource/{dataset_id}.csv"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def inject_faults(self, *faults) -> None:
+        """Queue faults for the next CSV requests.
+
+        Each fault is an HTTP status code (e.g. ``503``), a ``(status,
+        retry_after)`` tuple, or ``"drop"`` to cut the response body short.
+        """
+        with self._lock:
+            self.faults.extend(faults)
+
+    def update_rows(self, indices: list, **changes) -> None:
+        """Edit existing rows upstream and bump their ``:updated_at``"""
+        now = _timestamp(datetime.utcnow())
+        for i in indices:
+            self.rows[i].update(changes, **{":updated_at": now})
+        self.rows_updated_at += 1
+
+    def append_rows(self, n: int) -> None:
+        """Add ``n`` new rows upstream"""
+        new_rows = make_rows(n, first=len(self.rows))
+        now = _timestamp(datetime.utcnow())
+        for row in new_rows:
+            row[":updated_at"] = now
+        self.rows.extend(new_rows)
+        self.rows_updated_at += 1
+
+    def query(self, params: dict) -> tuple:
+        """Evaluate the SoQL subset; return (header, list of row dicts)"""
+        rows = self.rows
+        if params.get("$where"):
+            predicate = _compile_where(params["$where"])
+            rows = [row for row in rows if predicate(row)]
+        select = params.get("$select")
+        header = COLUMNS
+        if select and not _AGGREGATE.search(select):
+            header = []
+            for column in (part.strip() for part in select.split(",")):
+                header.extend(COLUMNS if column == "*" else [column])
+        elif select:
+            result, header = {}, []
+            for func, column, alias in _AGGREGATE.findall(select):
+                header.append(alias)
+                if func.lower() == "count":
+                    result[alias] = str(len(rows))
+                else:
+                    values = [row[column] for row in rows if row.get(column)]
+                    result[alias] = (min if func.lower() == "min" else max)(values) if values else ""
+            return header, [result]
+        if params.get("$order") == ":id":
+            rows = sorted(rows, key=lambda row: row[":id"])
+        offset = int(params.get("$offset", 0))
+        # Like Socrata, an unpaged request only returns the first 1000 rows
+        limit = int(params.get("$limit", 1000))
+        return header, rows[offset:offset + limit]
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                with stub._lock:
+                    stub.requests.append(params)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                fault = None
+                if not parsed.path.startswith("/api/views/"):
+                    with stub._lock:
+                        fault = stub.faults.pop(0) if stub.faults else None
+                if fault is not None and fault != "drop":
+                    status, retry_after = fault if isinstance(fault, tuple) else (fault, None)
+                    self.send_response(status)
+                    if retry_after is not None:
+                        self.send_header("Retry-After", str(retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if parsed.path.startswith("/api/views/"):
+                    etag = f'"{stub.rows_updated_at}"'
+                    last_modified = formatdate(stub.rows_updated_at, usegmt=True)
+                    if self._not_modified(etag):
+                        with stub._lock:
+                            stub.not_modified += 1
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.end_headers()
+                        return
+                    content_type = "application/json"
+                    body = json.dumps({"rowsUpdatedAt": stub.rows_updated_at}).encode("utf-8")
+                else:
+                    content_type = "text/csv; charset=UTF-8"
+                    header, rows = stub.query(params)
+                    buffer = io.StringIO()
+                    writer = csv.DictWriter(buffer, fieldnames=header, extrasaction="ignore",
+                                            lineterminator="\n")
+                    writer.writeheader()
+                    writer.writerows(rows)
+                    body = buffer.getvalue().encode("utf-8")
+                encoded = (not parsed.path.startswith("/api/views/") and stub.gzip
+                           and "gzip" in self.headers.get("Accept-Encoding", ""))
+                if encoded:
+                    body = gzip.compress(body, compresslevel=6)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                if encoded:
+                    self.send_header("Content-Encoding", "gzip")
+                if parsed.path.startswith("/api/views/"):
+                    self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", last_modified)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if fault == "drop":
+                    self.wfile.write(body[:len(body) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def _not_modified(self, etag: str) -> bool:
+                """Evaluate the conditional request headers against the current data"""
+                if_none_match = self.headers.get("If-None-Match")
+                if if_none_match is not None:
+                    return etag in [tag.strip() for tag in if_none_match.split(",")]
+                if_modified_since = self.headers.get("If-Modified-Since")
+                if if_modified_since:
+                    try:
+                        return stub.rows_updated_at <= parsedate_to_datetime(if_modified_since).timestamp()
+                    except (TypeError, ValueError):
+                        return False
+                return False
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def compare_downloads(rows: int, latency: float, page_size: int, workers: int,
+                      partition_column: str = None) -> None:
+    """Download the stub dataset sequentially and in parallel; compare results"""
+    from nyc_base_downloader import NYCDataDownloader
+
+    with SocrataStubServer(make_rows(rows), latency=latency) as stub:
+        class StubDownloader(NYCDataDownloader):
+            BASE_URL = stub.url_for()
+            DATASET_NAME = "Socrata stub"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs, timings = [], []
+            for n in (1, workers):
+                path = os.path.join(tmp, f"workers_{n}.csv")
+                started = time.monotonic()
+                ok = StubDownloader().download_csv(path, page_size=page_size, workers=n,
+                                                   partition_column=partition_column)
+                timings.append(time.monotonic() - started)
+                if not ok:
+                    raise SystemExit(f"❌ Download with {n} worker(s) failed")
+                with open(path, newline="", encoding="utf-8") as f:
+                    outputs.append(list(csv.reader(f)))
+
+    # Date partitions are merged chronologically with undated rows last,
+    # so only offset windows reproduce the sequential :id order exactly
+    if partition_column:
+        outputs = [[records[0]] + sorted(records[1:]) for records in outputs]
+    identical = outputs[0] == outputs[1]
+    print(f"{'✅' if identical else '❌'} Parallel output matches sequential ({len(outputs[1]) - 1:,} rows): {identical}")
+    print(f"⏱️  1 worker: {timings[0]:.2f}s, {workers} workers: {timings[1]:.2f}s "
+          f"(speed-up {timings[0] / timings[1]:.1f}x)")
+    if not identical:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sequential and parallel downloads against a local Socrata stub")
+    parser.add_argument("--rows", type=int, default=20000, help="Number of synthetic rows (default: 20000)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds of latency per request (default: 0.2)")
+    parser.add_argument("--page-size", type=int, default=1000, help="Rows per page (default: 1000)")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel workers to compare against 1 (default: 8)")
+    parser.add_argument("--partition-column", help="Partition the parallel download by this date column")
+    args = parser.parse_args()
+
+    compare_downloads(args.rows, args.latency, args.page_size, args.workers, args.partition_column)
@@ -0,0 +1,248 @@
+"""
+Batch Metadata Generator
+
+Regenerates every metadata YAML file in one process. The datasets are those
+of the existing ``metadata/*.yaml`` files plus the generator scripts in this
+folder. View metadata is fetched concurrently through one pooled session with
+retries, and each response is cached on disk as
+``views_cache/<dataset_id>/<rowsUpdatedAt>.json``. The ``ETag`` and
+``Last-Modified`` of the latest response are sent back on the next run, so an
+unchanged dataset costs one ``304 Not Modified`` and no download.
+
+Only YAML files whose source changed are rewritten. An existing file keeps
+its manually edited fields; only the fields that follow the source
+(``name``, ``description``, ``last_updated``) are refreshed. Missing files
+are generated from the template like the single-dataset scripts do.
+
+Usage:
+    python batch_metadata.py
+    python batch_metadata.py --datasets speed_humps NYC_311 --workers 4
+    python batch_metadata.py --overwrite    # regenerate every file from the template
+"""
+
+import argparse
+import glob
+import importlib.util
+import inspect
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple, Optional
+
+import requests
+import yaml
+
+from nyc_metadata_base import REQUEST_TIMEOUT, VIEWS_URL, NYCMetadataGenerator, make_session
+from stage_metrics import add_metrics_argument, configure as configure_metrics, span
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "../../"))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, "views_cache")
+DEFAULT_WORKERS = 8
+
+
+class DatasetEntry(NamedTuple):
+    dataset_id: str
+    data_name: str
+
+
+def discover_datasets(output_dir: str) -> list:
+    """Datasets of the YAML files in ``output_dir`` and of the generator scripts"""
+    datasets = {}
+    for path in sorted(glob.glob(os.path.join(output_dir, "*.yaml"))):
+        with open(path, encoding="utf-8") as f:
+            metadata = yaml.safe_load(f) or {}
+        if metadata.get("dataset_id"):
+            data_name = os.path.splitext(os.path.basename(path))[0]
+            datasets[data_name] = DatasetEntry(metadata["dataset_id"], data_name)
+    for generator_class in generator_classes():
+        if generator_class.DEFAULT_DATA_NAME not in datasets:
+            datasets[generator_class.DEFAULT_DATA_NAME] = DatasetEntry(
+                generator_class.DEFAULT_DATASET_ID, generator_class.DEFAULT_DATA_NAME)
+    return list(datasets.values())
+
+
+def generator_classes() -> list:
+    """``NYCMetadataGenerator`` subclasses defined by the scripts in this folder"""
+    classes = []
+    for path in sorted(glob.glob(os.path.join(SCRIPT_DIR, "*.py"))):
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        if module_name in ("nyc_metadata_base", "batch_metadata"):
+            continue
+        spec = importlib.util.spec_from_file_location(f"metadata_generators.{module_name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        classes.extend(obj for obj in vars(module).values()
+                       if inspect.isclass(obj) and issubclass(obj, NYCMetadataGenerator)
+                       and obj is not NYCMetadataGenerator and obj.__module__ == module.__name__)
+    return classes
+
+
+class ViewsCache:
+    """Views API responses on disk, one file per dataset and ``rowsUpdatedAt``"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _validators_path(self, dataset_id: str) -> str:
+        return os.path.join(self.cache_dir, dataset_id, "validators.json")
+
+    def _view_path(self, dataset_id: str, rows_updated_at) -> str:
+        return os.path.join(self.cache_dir, dataset_id, f"{rows_updated_at}.json")
+
+    def validators(self, dataset_id: str) -> Optional[dict]:
+        """``etag``, ``last_modified`` and ``rowsUpdatedAt`` of the latest cached response"""
+        path = self._validators_path(dataset_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            validators = json.load(f)
+        if not os.path.exists(self._view_path(dataset_id, validators["rowsUpdatedAt"])):
+            return None
+        return validators
+
+    def load(self, dataset_id: str, rows_updated_at) -> dict:
+        with open(self._view_path(dataset_id, rows_updated_at), encoding="utf-8") as f:
+            return json.load(f)
+
+    def store(self, dataset_id: str, data: dict, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """Cache ``data`` under its ``rowsUpdatedAt`` and remember its validators;
+        responses for older ``rowsUpdatedAt`` values are removed"""
+        os.makedirs(os.path.join(self.cache_dir, dataset_id), exist_ok=True)
+        rows_updated_at = data.get("rowsUpdatedAt", 0)
+        view_path = self._view_path(dataset_id, rows_updated_at)
+        self._write_json(view_path, data)
+        self._write_json(self._validators_path(dataset_id), {
+            "etag": etag, "last_modified": last_modified, "rowsUpdatedAt": rows_updated_at})
+        for path in glob.glob(self._view_path(dataset_id, "*")):
+            if path not in (view_path, self._validators_path(dataset_id)):
+                os.remove(path)
+
+    @staticmethod
+    def _write_json(path: str, content: dict) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(content, f, indent=4)
+        os.replace(tmp_path, path)
+
+
+class BatchMetadataGenerator(NYCMetadataGenerator):
+    """Metadata generator for any NYC Open Data dataset, reading views through a cache"""
+    DEFAULT_DATASET_ID = ""
+    DEFAULT_DATA_NAME = ""
+    DATASET_DESCRIPTION = "NYC Open Data datasets"
+
+    def __init__(self, template_path: str = "template_metadata.yaml",
+                 session: Optional[requests.Session] = None,
+                 cache: Optional[ViewsCache] = None, views_url: str = VIEWS_URL):
+        super().__init__(template_path, session)
+        self.cache = cache
+        self.VIEWS_URL = views_url
+        self.not_modified = 0
+
+    def get_dataset_metadata(self, dataset_id: str, timeout: int = REQUEST_TIMEOUT) -> dict:
+        """Fetch view metadata, revalidating the cached response if there is one"""
+        validators = self.cache.validators(dataset_id) if self.cache else None
+        headers = {}
+        if validators and validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators and validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        with span("metadata.request", dataset=dataset_id) as current:
+            response = self.session.get(self.VIEWS_URL.format(dataset_id=dataset_id),
+                                        headers=headers, timeout=timeout)
+            current.set(status=response.status_code, bytes=len(response.content))
+            if response.status_code == 304 and validators:
+                self.not_modified += 1
+                return self.cache.load(dataset_id, validators["rowsUpdatedAt"])
+            response.raise_for_status()
+            data = response.json()
+        if self.cache:
+            self.cache.store(dataset_id, data, response.headers.get("ETag"),
+                             response.headers.get("Last-Modified"))
+        return data
+
+    def update_metadata(self, dataset: DatasetEntry, output_dir: str, data: dict,
+                        overwrite: bool = False) -> Optional[str]:
+        """Write the YAML of ``dataset`` if its source changed; return the path written, or None"""
+        out_path = os.path.join(output_dir, f"{dataset.data_name}.yaml")
+        if overwrite or not os.path.exists(out_path):
+            return self.generate_metadata(dataset.dataset_id, output_dir, self.template_path,
+                                          dataset.data_name, data=data)
+        with open(out_path, encoding="utf-8") as f:
+            metadata = yaml.safe_load(f)
+        # Keep manual edits where the payload has no value (e.g. a minimal views response)
+        fields = {key: value for key, value in self.source_fields(data).items()
+                  if key == "last_updated" or data.get(key)}
+        if all(metadata.get(key) == value for key, value in fields.items()):
+            return None
+        metadata.update(fields)
+        self.write_metadata(metadata, out_path)
+        print(f"✅ Metadata updated in {out_path}")
+        return out_path
+
+
+def run_batch(datasets: list, output_dir: str, template_path: str, cache_dir: str,
+              workers: int = DEFAULT_WORKERS, overwrite: bool = False,
+              views_url: str = VIEWS_URL) -> dict:
+    """Fetch the views of ``datasets`` concurrently and update their YAML files.
+
+    Returns a dict with the ``written``, ``unchanged`` and ``failed`` data names.
+    """
+    generator = BatchMetadataGenerator(template_path, session=make_session(pool_size=workers),
+                                       cache=ViewsCache(cache_dir), views_url=views_url)
+    result = {"written": [], "unchanged": [], "failed": []}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generator.get_dataset_metadata, dataset.dataset_id): dataset
+                   for dataset in datasets}
+        for future in as_completed(futures):
+            dataset = futures[future]
+            try:
+                written = generator.update_metadata(dataset, output_dir, future.result(), overwrite)
+            except (requests.RequestException, OSError, yaml.YAMLError) as e:
+                print(f"❌ {dataset.data_name} ({dataset.dataset_id}): {e}")
+                result["failed"].append(dataset.data_name)
+                continue
+            result["written" if written else "unchanged"].append(dataset.data_name)
+
+    print(f"📊 {len(result['written'])} written, {len(result['unchanged'])} unchanged, "
+          f"{len(result['failed'])} failed ({generator.not_modified} views not modified)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate all metadata YAML files in one process")
+    parser.add_argument("--output_dir", default=os.path.join(PROJECT_ROOT, "metadata"),
+                        help="Directory with the YAML files")
+    parser.add_argument("--template", default=os.path.join(SCRIPT_DIR, "template_metadata.yaml"),
+                        help="Path to YAML template")
+    parser.add_argument("--datasets", nargs="+", help="Data names to update (default: all)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent views API requests (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR,
+                        help="Directory of cached views API responses")
+    parser.add_argument("--views_url", default=VIEWS_URL,
+                        help="Views API URL template with a {dataset_id} placeholder")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Regenerate files from the template, discarding manual edits")
+    add_metrics_argument(parser)
+    args = parser.parse_args()
+    configure_metrics(args.metrics)
+
+    datasets = discover_datasets(args.output_dir)
+    if args.datasets:
+        unknown = set(args.datasets) - {dataset.data_name for dataset in datasets}
+        if unknown:
+            parser.error(f"Unknown datasets: {', '.join(sorted(unknown))}")
+        datasets = [dataset for dataset in datasets if dataset.data_name in args.datasets]
+
+    with span("metadata", datasets=len(datasets)):
+        result = run_batch(datasets, args.output_dir, args.template, args.cache_dir,
+                           args.workers, args.overwrite, args.views_url)
+    if result["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Streaming Metadata Scanner
+
+Computes the data-derived fields of a metadata YAML file in one chunked pass
+over a downloaded file (CSV, ``.csv.gz``, ``.csv.zst`` or Parquet):
+
+- ``temporal``: datetime columns are detected on a sample of rows; the one
+  with the most values becomes ``time_column``, with its range and
+  resolution (the finest time component that is not always zero).
+- ``spatial``: the bounding box of a WKT (or EWKT) geometry column or of
+  latitude/longitude columns, the geometry type, and the point density over
+  the occupied area (the ~1 km grid cells that contain at least one point).
+- ``map_algebra``: a raster cell size of about the mean spacing between
+  points, rounded to 1, 2 or 5 x 10^n meters.
+
+Only the detected columns are read after the sample, and every statistic is
+a running aggregate, so memory stays bounded by the chunk size and the
+number of occupied grid cells (a few thousand for NYC).
+
+Usage:
+    python metadata_scanner.py ../../data/NYC_311.csv
+    python metadata_scanner.py ../../data/speed_humps.csv --update ../../metadata/speed_humps.yaml
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "..", "processors"))
+
+from wkt_geometry import parse_wkt_coordinates  # noqa: E402
+
+DEFAULT_CHUNK_SIZE = 100000     # Rows read at a time
+SAMPLE_ROWS = 1000              # Rows used to detect datetime and geometry columns
+DETECTION_RATIO = 0.9           # Share of non-empty sample values that must parse
+GRID_DEGREES = 0.01             # Occupancy grid cell (~1.1 km of latitude)
+MIN_RASTER_POINTS = 100         # Fewer points are not worth rasterizing
+MIN_CELL_METERS, MAX_CELL_METERS = 10, 1000
+METERS_PER_DEGREE = 111320.0
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+
+# Tried in order on the sample; "ISO8601" covers Socrata's floating timestamps
+DATETIME_FORMATS = ["ISO8601", "%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y"]
+LATITUDE_NAMES = ("latitude", "lat")
+LONGITUDE_NAMES = ("longitude", "lon", "lng", "long")
+WKT_PATTERN = re.compile(r"^\s*(SRID=\d+;)?\s*(MULTI)?(POINT|LINESTRING|POLYGON)\b", re.IGNORECASE)
+GEOMETRY_TYPES = {"POINT": "point", "LINESTRING": "line", "POLYGON": "polygon"}
+# (label, components that must all be zero for a coarser resolution); the
+# labels are the frequency names of the `temporal_resolution` field ("daily")
+RESOLUTIONS = [("secondly", ("second", "microsecond")), ("minutely", ("minute",)),
+               ("hourly", ("hour",)), ("daily", ("day",)), ("monthly", ("month",))]
+
+
+def read_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, columns: Optional[list] = None,
+                nrows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Yield ``path`` as string DataFrames of at most ``chunk_size`` rows"""
+    if path.endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        read = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas().astype("string")
+            read += batch.num_rows
+            if nrows is not None and read >= nrows:
+                return
+        return
+    options = dict(dtype=str, usecols=columns, chunksize=chunk_size, nrows=nrows)
+    if path.endswith(COMPRESSED_EXTENSIONS):
+        import pyarrow as pa
+        with pa.input_stream(path, compression="detect") as stream:
+            yield from pd.read_csv(stream, **options)
+    else:
+        yield from pd.read_csv(path, **options)
+
+
+def detect_datetime_format(values: pd.Series) -> Optional[str]:
+    """The first of ``DATETIME_FORMATS`` parsing most of ``values``, or None"""
+    values = values.dropna()
+    values = values[values.str.strip() != ""]
+    # Plain numbers (ids, counts) are not timestamps even if they parse as years
+    if values.empty or values.str.fullmatch(r"[-+.\d\s]+").mean() > 0.5:
+        return None
+    for fmt in DATETIME_FORMATS:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+        if parsed.notna().mean() >= DETECTION_RATIO:
+            return fmt
+    return None
+
+
+def find_column(columns: list, names: tuple) -> Optional[str]:
+    """The first column whose lower-cased name is in ``names``"""
+    return next((column for column in columns if column.lower() in names), None)
+
+
+class TemporalStats:
+    """Running range and resolution of one datetime column"""
+
+    def __init__(self, column: str, fmt: str):
+        self.column = column
+        self.fmt = fmt
+        self.count = 0
+        self.min = None
+        self.max = None
+        # Components seen with a non-zero (non-one for day/month) value
+        self.nonzero = set()
+
+    def update(self, values: pd.Series) -> None:
+        parsed = pd.to_datetime(values, format=self.fmt, errors="coerce").dropna()
+        if parsed.empty:
+            return
+        self.count += len(parsed)
+        low, high = parsed.min(), parsed.max()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        for component in ("microsecond", "second", "minute", "hour", "day", "month"):
+            if component in self.nonzero:
+                continue
+            field = getattr(parsed.dt, component)
+            if (field != (1 if component in ("day", "month") else 0)).any():
+                self.nonzero.add(component)
+
+    @property
+    def resolution(self) -> str:
+        for label, components in RESOLUTIONS:
+            if self.nonzero.intersection(components):
+                return label
+        return "yearly"
+
+    def summary(self) -> dict:
+        return {"column": self.column, "count": self.count,
+                "start": self.min.isoformat() if self.min is not None else None,
+                "end": self.max.isoformat() if self.max is not None else None,
+                "resolution": self.resolution}
+
+
+class SpatialStats:
+    """Running bounding box, geometry type and occupied grid cells of the points"""
+
+    def __init__(self):
+        self.count = 0
+        self.bbox = [math.inf, math.inf, -math.inf, -math.inf]
+        self.cells = set()
+        self.geometry_types = {}
+
+    def update(self, x: np.ndarray, y: np.ndarray, geometries: int) -> None:
+        """Add the vertices ``x``/``y`` (lon/lat) of ``geometries`` features"""
+        valid = (np.abs(y) <= 90) & (np.abs(x) <= 180) & ((x != 0) | (y != 0))
+        x, y = x[valid], y[valid]
+        if len(x) == 0:
+            return
+        self.count += geometries
+        self.bbox = [min(self.bbox[0], float(x.min())), min(self.bbox[1], float(y.min())),
+                     max(self.bbox[2], float(x.max())), max(self.bbox[3], float(y.max()))]
+        cells = (np.floor(y / GRID_DEGREES).astype(np.int64) * 100000
+                 + np.floor(x / GRID_DEGREES).astype(np.int64))
+        self.cells.update(np.unique(cells).tolist())
+
+    def occupied_km2(self) -> float:
+        """Area of the occupied grid cells, at the latitude of the bounding box center"""
+        latitude = math.radians((self.bbox[1] + self.bbox[3]) / 2)
+        cell_km = GRID_DEGREES * METERS_PER_DEGREE / 1000
+        return len(self.cells) * cell_km * cell_km * math.cos(latitude)
+
+    @property
+    def geometry_type(self) -> str:
+        if not self.geometry_types:
+            return "point" if self.count else "unknown"
+        return max(self.geometry_types, key=self.geometry_types.get)
+
+
+def nice_cell_size(meters: float) -> int:
+    """Round to 1, 2 or 5 x 10^n meters, within the raster cell size limits"""
+    meters = min(max(meters, MIN_CELL_METERS), MAX_CELL_METERS)
+    exponent = 10 ** math.floor(math.log10(meters))
+    step = min((1, 2, 5, 10), key=lambda step: abs(step * exponent - meters))
+    return int(step * exponent)
+
+
+def scan_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """Scan ``path`` once and return its temporal, spatial and raster statistics"""
+    sample = next(read_chunks(path, SAMPLE_ROWS, nrows=SAMPLE_ROWS), pd.DataFrame())
+    columns = [column for column in sample.columns if not column.startswith(":")]
+
+    temporal = []
+    geometry_column = None
+    for column in columns:
+        values = sample[column].dropna()
+        if values.empty:
+            continue
+        if WKT_PATTERN.match(str(values.iloc[0])) and values.str.match(WKT_PATTERN).mean() >= DETECTION_RATIO:
+            geometry_column = geometry_column or column
+            continue
+        fmt = detect_datetime_format(values)
+        if fmt:
+            temporal.append(TemporalStats(column, fmt))
+
+    latitude, longitude = find_column(columns, LATITUDE_NAMES), find_column(columns, LONGITUDE_NAMES)
+    use_lat_lon = latitude is not None and longitude is not None
+    spatial_columns = [latitude, longitude] if use_lat_lon else [geometry_column] if geometry_column else []
+    read_columns = [stats.column for stats in temporal] + spatial_columns
+
+    spatial = SpatialStats()
+    rows = 0
+    if read_columns:
+        for chunk in read_chunks(path, chunk_size, columns=read_columns):
+            rows += len(chunk)
+            for stats in temporal:
+                stats.update(chunk[stats.column])
+            if use_lat_lon:
+                y = pd.to_numeric(chunk[latitude], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                x = pd.to_numeric(chunk[longitude], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                present = ~(np.isnan(x) | np.isnan(y))
+                spatial.update(x[present], y[present], int(present.sum()))
+            elif geometry_column:
+                geoms = chunk[geometry_column].dropna()
+                x, y, offsets = parse_wkt_coordinates(geoms)
+                spatial.update(x, y, int((np.diff(offsets) > 0).sum()))
+                kinds = geoms.str.extract(WKT_PATTERN)[2].str.upper().map(GEOMETRY_TYPES).value_counts()
+                for kind, count in kinds.items():
+                    spatial.geometry_types[kind] = spatial.geometry_types.get(kind, 0) + int(count)
+    else:
+        rows = sum(len(chunk) for chunk in read_chunks(path, chunk_size, columns=columns[:1] or None))
+
+    return summarize(rows, temporal, spatial, spatial_columns)
+
+
+def summarize(rows: int, temporal: list, spatial: SpatialStats, spatial_columns: list) -> dict:
+    """Turn the running statistics into the scan result"""
+    result = {"rows": rows, "datetime_columns": [stats.summary() for stats in temporal if stats.count]}
+    time_column = max((stats for stats in temporal if stats.count), key=lambda stats: stats.count, default=None)
+    result["temporal"] = {
+        "temporal_type": "event-based" if time_column else "static",
+        "temporal_resolution": time_column.resolution if time_column else "N/A",
+        "time_column": time_column.column if time_column else "",
+        "temporal_range": [time_column.summary()["start"], time_column.summary()["end"]] if time_column else [],
+    }
+    if not spatial.count:
+        result["spatial"] = {"geometry_type": "unknown", "bounding_box": []}
+        result["raster_conversion"] = {"suitable_for_rasterization": False,
+                                       "recommended_cell_size": "", "interpolation_method": ""}
+        return result
+
+    area_km2 = spatial.occupied_km2()
+    density = spatial.count / area_km2 if area_km2 else 0.0
+    # Mean spacing of points spread evenly over the occupied area
+    spacing = math.sqrt(area_km2 * 1e6 / spatial.count)
+    result["spatial"] = {
+        "geometry_type": spatial.geometry_type,
+        "geometry_columns": spatial_columns,
+        "bounding_box": [round(value, 6) for value in spatial.bbox],
+        "occupied_area_km2": round(area_km2, 2),
+        "point_density_per_km2": round(density, 2),
+    }
+    result["raster_conversion"] = {
+        "suitable_for_rasterization": spatial.count >= MIN_RASTER_POINTS,
+        "recommended_cell_size": f"{nice_cell_size(spacing)} meters",
+        "interpolation_method": "nearest neighbor",
+    }
+    return result
+
+
+def apply_scan(metadata: dict, scan: dict) -> dict:
+    """Fill the temporal, spatial and map algebra fields of ``metadata`` from ``scan``"""
+    metadata.setdefault("temporal", {}).update(scan["temporal"])
+    spatial = metadata.setdefault("spatial", {})
+    if scan["spatial"]["geometry_type"] != "unknown":
+        spatial["geometry_type"] = scan["spatial"]["geometry_type"]
+    spatial["bounding_box"] = scan["spatial"]["bounding_box"]
+    if "point_density_per_km2" in scan["spatial"]:
+        spatial["point_density_per_km2"] = scan["spatial"]["point_density_per_km2"]
+    metadata.setdefault("map_algebra", {})["raster_conversion"] = scan["raster_conversion"]
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute temporal and spatial metadata from a data file")
+    parser.add_argument("data_file", help="CSV (.csv, .csv.gz, .csv.zst) or Parquet file to scan")
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows read at a time")
+    parser.add_argument("--update", metavar="YAML", help="Metadata YAML file to fill in with the results")
+    args = parser.parse_args()
+
+    scan = scan_file(args.data_file, args.chunk_size)
+    print(json.dumps(scan, indent=4))
+    if args.update:
+        from nyc_metadata_base import NYCMetadataGenerator
+        with open(args.update, encoding="utf-8") as f:
+            metadata = yaml.safe_load(f)
+        NYCMetadataGenerator.write_metadata(apply_scan(metadata, scan), args.update)
+        print(f"✅ Metadata updated in {args.update}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,22 +6,55 @@ Base class and specific generators for creating metadata YAML files from NYC Ope
 
 import argparse
 import requests
+import sys
 import yaml
 import os
 from datetime import datetime
 from abc import ABC, abstractmethod
+from requests.adapters import HTTPAdapter
 from typing import Optional
+from urllib3.util.retry import Retry
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+
+from stage_metrics import add_metrics_argument, configure as configure_metrics, span  # noqa: E402
+
+VIEWS_URL = "https://data.cityofnewyork.us/api/views/{dataset_id}.json"
+REQUEST_TIMEOUT = 30          # Seconds per views API request
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def make_session(pool_size: int = 10, max_retries: int = 5) -> requests.Session:
+    """A session with a connection pool of ``pool_size`` and retries with backoff"""
+    session = requests.Session()
+    retry = Retry(total=max_retries, backoff_factor=1, status_forcelist=RETRY_STATUS,
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _str_presenter(dumper, data):
+    if isinstance(data, str):
+        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='"')
+    return dumper.represent_scalar('tag:yaml.org,2002:str', data)
 
 
 class NYCMetadataGenerator(ABC):
     """Base class for NYC Open Data metadata generators"""
     
-    def __init__(self, template_path: str = "template_metadata.yaml"):
+    # Views API endpoint; ``{dataset_id}`` is filled in
+    VIEWS_URL = VIEWS_URL
+
+    def __init__(self, template_path: str = "template_metadata.yaml",
+                 session: Optional[requests.Session] = None):
         # Get the root of the project based on the script's location
         script_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.abspath(os.path.join(script_dir, "../../"))
         self.default_output_dir = os.path.join(project_root, "metadata")
         self.template_path = template_path
+        self.session = session or make_session(pool_size=1)
     
     @property
     @abstractmethod
@@ -46,17 +79,15 @@ class NYCMetadataGenerator(ABC):
         with open(path, "r", encoding="utf-8") as f:
             return yaml.safe_load(f)
     
-    def get_dataset_metadata(self, dataset_id: str) -> dict:
+    def get_dataset_metadata(self, dataset_id: str, timeout: int = REQUEST_TIMEOUT) -> dict:
         """Fetch dataset metadata from NYC Open Data API"""
-        url = f"https://data.cityofnewyork.us/api/views/{dataset_id}.json"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        
-        # DEBUG: Print the structure of data
-        import pprint
-        pprint.pprint(data)
-        
+        with span("metadata.request", dataset=dataset_id) as current:
+            response = self.session.get(self.VIEWS_URL.format(dataset_id=dataset_id), timeout=timeout)
+            current.set(status=response.status_code, bytes=len(response.content))
+            response.raise_for_status()
+            data = response.json()
+        print(f"📥 Fetched metadata for {dataset_id}: {data.get('name', '')!r} "
+              f"({len(data.get('columns', []))} columns, rowsUpdatedAt {data.get('rowsUpdatedAt')})")
         return data
     
     def detect_geometry_type(self, columns: list) -> str:
@@ -72,21 +103,27 @@ class NYCMetadataGenerator(ABC):
         return "unknown"
     
     def generate_metadata(self, dataset_id: str, output_dir: str, 
-                         template_path: str, data_name: Optional[str] = None) -> None:
-        """Generate metadata YAML file for the dataset"""
+                         template_path: str, data_name: Optional[str] = None,
+                         data: Optional[dict] = None, scan: Optional[dict] = None) -> str:
+        """Generate metadata YAML file for the dataset; return its path.
+
+        ``data`` is the views API payload; it is fetched when not given.
+        ``scan`` is the result of ``metadata_scanner.scan_file`` on the
+        downloaded data; it replaces the default temporal, spatial and
+        raster fields.
+        """
         template = self.load_template(template_path)
-        data = self.get_dataset_metadata(dataset_id)
+        if data is None:
+            data = self.get_dataset_metadata(dataset_id)
 
         columns = data.get("columns", [])
         geometry_type = self.detect_geometry_type(columns)
 
         template["dataset_id"] = dataset_id
         template["data_name"] = data_name if data_name else dataset_id
-        template["name"] = data.get("name", "")
-        template["description"] = data.get("description", "")
+        template.update(self.source_fields(data))
         template["source_organization"] = data.get("metadata", {}).get("owner", {}).get("displayName", "")
         template["domain"] = data.get("category", "unknown").lower()
-        template["last_updated"] = datetime.utcfromtimestamp(data.get("rowsUpdatedAt", 0)).strftime('%Y-%m-%d')
         template["update_frequency"] = "unknown"
 
         template["access"]["primary_url"] = f"https://data.cityofnewyork.us/d/{dataset_id}"
@@ -116,21 +153,32 @@ class NYCMetadataGenerator(ABC):
             "interpolation_method": ""
         }
 
+        if scan is not None:
+            from metadata_scanner import apply_scan
+            apply_scan(template, scan)
+
         os.makedirs(output_dir, exist_ok=True)
         filename = f"{data_name}.yaml" if data_name else f"{dataset_id}.yaml"
         out_path = os.path.join(output_dir, filename)
+        self.write_metadata(template, out_path)
+        print(f"✅ Metadata saved to {out_path}")
+        return out_path
+
+    @staticmethod
+    def source_fields(data: dict) -> dict:
+        """Top-level fields that follow the source dataset (views API payload)"""
+        return {
+            "name": data.get("name", ""),
+            "description": data.get("description", ""),
+            "last_updated": datetime.utcfromtimestamp(data.get("rowsUpdatedAt", 0)).strftime('%Y-%m-%d'),
+        }
 
-        def str_presenter(dumper, data):
-            if isinstance(data, str):
-                return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='"')
-            return dumper.represent_scalar('tag:yaml.org,2002:str', data)
-
-        yaml.add_representer(str, str_presenter)
-        
+    @staticmethod
+    def write_metadata(metadata: dict, out_path: str) -> None:
+        """Write a metadata dict as YAML with quoted strings"""
+        yaml.add_representer(str, _str_presenter)
         with open(out_path, "w", encoding="utf-8") as f:
-            yaml.dump(template, f, sort_keys=False)
-
-        print(f"✅ Metadata saved to {out_path}")
+            yaml.dump(metadata, f, sort_keys=False)
     
     def create_argument_parser(self) -> argparse.ArgumentParser:
         """Create standardized argument parser"""
@@ -149,13 +197,25 @@ class NYCMetadataGenerator(ABC):
         parser.add_argument("--data_name", 
                           default=self.DEFAULT_DATA_NAME,
                           help=f"Custom data name for the metadata file (default: {self.DEFAULT_DATA_NAME})")
+        parser.add_argument("--data_file",
+                          help="Downloaded data file to scan for the temporal, spatial and raster fields")
+        add_metrics_argument(parser)
         return parser
     
     def run(self) -> None:
         """Main execution method"""
         parser = self.create_argument_parser()
         args = parser.parse_args()
-        self.generate_metadata(args.dataset_id, args.output_dir, args.template, args.data_name)
+        configure_metrics(args.metrics)
+        scan = None
+        if args.data_file:
+            from metadata_scanner import scan_file
+            with span("metadata.scan", dataset=args.data_name) as current:
+                scan = scan_file(args.data_file)
+                current.add(rows=scan["rows"], bytes=os.path.getsize(args.data_file))
+            print(f"🔍 Scanned {scan['rows']:,} rows of {args.data_file}")
+        with span("metadata", dataset=args.data_name):
+            self.generate_metadata(args.dataset_id, args.output_dir, args.template, args.data_name, scan=scan)
 
 # # Specific metadata generator classes
 # class SpeedHumpsMetadataGenerator(NYCMetadataGenerator):
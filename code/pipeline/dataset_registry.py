@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Dataset Registry
+
+Builds the stage classes of every dataset from the `metadata/*.yaml` files,
+so a new Socrata dataset only needs a YAML file:
+
+- **Downloader**: the `NYCDataDownloader` subclass of the script named by
+  `implementation.downloader_module` when that file exists (for datasets
+  that customize it); otherwise one is generated from `access.api_endpoint`
+  (or `dataset_id`) and `name`.
+- **Processor**: the `NYCDataProcessor` subclass of
+  `implementation.processor_module`; datasets without one skip processing.
+- **Metadata**: every YAML file is refreshed with `batch_metadata.py`. A new
+  dataset can start as a stub holding only `dataset_id` and `data_name`;
+  stubs are filled in from the template.
+
+Stage scripts are imported the first time one of their stages runs, and all
+downloaders share one pooled `requests.Session`, so many datasets are
+handled in one process with one set of connections. The orchestrator
+([orchestrator.py](orchestrator.py)) runs the stages from this registry.
+
+Usage:
+    python dataset_registry.py list
+    python dataset_registry.py metadata --datasets speed_humps NYC_311
+"""
+
+import argparse
+import importlib.util
+import inspect
+import os
+import re
+import sys
+import threading
+from typing import NamedTuple, Optional
+
+import requests
+import yaml
+from requests.adapters import HTTPAdapter
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ROOT = os.path.dirname(CODE_DIR)
+for _folder in ("common", "downloaders", "processors", "upload_to_hugging_face"):
+    sys.path.insert(0, os.path.join(CODE_DIR, _folder))
+
+from nyc_base_downloader import NYCDataDownloader  # noqa: E402
+from nyc_base_processor import NYCDataProcessor  # noqa: E402
+from stage_metrics import add_metrics_argument, configure as configure_metrics, span  # noqa: E402
+
+DEFAULT_METADATA_DIR = os.path.join(PROJECT_ROOT, "metadata")
+SOCRATA_DOMAIN = "https://data.cityofnewyork.us"
+DEFAULT_POOL_SIZE = 16        # Connections kept open by the shared download session
+
+
+class DatasetSpec(NamedTuple):
+    """The parts of a metadata YAML file that the pipeline needs"""
+    name: str
+    dataset_id: str
+    downloader_module: Optional[str]
+    processor_module: Optional[str]
+    depends_on: tuple
+    metadata_path: str
+    title: str = ""
+    api_endpoint: str = ""
+    stub: bool = False
+
+    @property
+    def csv_url(self) -> str:
+        """The ``/resource/<id>.csv`` endpoint of the dataset"""
+        if self.api_endpoint:
+            return re.sub(r"\.\w+$", ".csv", self.api_endpoint)
+        return f"{SOCRATA_DOMAIN}/resource/{self.dataset_id}.csv"
+
+
+def load_specs(metadata_dir: str, names: Optional[list] = None) -> list:
+    """Read every ``*.yaml`` of ``metadata_dir`` (or only the datasets in ``names``)"""
+    specs = []
+    for filename in sorted(os.listdir(metadata_dir)):
+        if not filename.endswith((".yaml", ".yml")):
+            continue
+        path = os.path.join(metadata_dir, filename)
+        with open(path, encoding="utf-8") as f:
+            metadata = yaml.safe_load(f) or {}
+        implementation = metadata.get("implementation") or {}
+        name = metadata.get("data_name") or os.path.splitext(filename)[0]
+        if names and name not in names:
+            continue
+        specs.append(DatasetSpec(name=name, dataset_id=metadata.get("dataset_id", ""),
+                                 downloader_module=implementation.get("downloader_module"),
+                                 processor_module=implementation.get("processor_module"),
+                                 depends_on=tuple(implementation.get("depends_on") or ()),
+                                 metadata_path=path, title=metadata.get("name") or "",
+                                 api_endpoint=(metadata.get("access") or {}).get("api_endpoint") or "",
+                                 stub="access" not in metadata))
+    missing = set(names or ()) - {spec.name for spec in specs}
+    if missing:
+        raise ValueError(f"No metadata found for: {', '.join(sorted(missing))}")
+    return specs
+
+
+def module_path(module_name: Optional[str]) -> Optional[str]:
+    """File of a ``<folder>.<script>`` module, or None if it does not exist"""
+    if not module_name:
+        return None
+    path = os.path.join(CODE_DIR, *module_name.split(".")) + ".py"
+    return path if os.path.exists(path) else None
+
+
+def load_stage_class(module_name: Optional[str], base_class: type) -> Optional[type]:
+    """Return the ``base_class`` subclass defined in a ``<folder>.<script>`` module.
+
+    Returns None when the module does not exist. Scripts are loaded from
+    their file under a dotted name, so ``downloaders.speed_humps`` and
+    ``processors.speed_humps`` do not clash.
+    """
+    path = module_path(module_name)
+    if path is None:
+        return None
+    module = sys.modules.get(module_name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[module_name] = module
+    for _, obj in inspect.getmembers(module, inspect.isclass):
+        if issubclass(obj, base_class) and obj.__module__ == module.__name__ and not inspect.isabstract(obj):
+            return obj
+    raise ValueError(f"{module_name} does not define a {base_class.__name__} subclass")
+
+
+def make_download_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """A session keeping up to ``pool_size`` connections per host.
+
+    Downloaders retry requests themselves, so the adapter does not.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class DatasetRegistry:
+    """Stage classes of the datasets in ``metadata_dir``, resolved on first use.
+
+    ``downloader`` instances share ``session``; size ``pool_size`` for the
+    number of downloads (times ranges per download) running at once.
+    """
+
+    def __init__(self, metadata_dir: str = DEFAULT_METADATA_DIR, names: Optional[list] = None,
+                 pool_size: int = DEFAULT_POOL_SIZE, app_token: Optional[str] = None):
+        self.metadata_dir = metadata_dir
+        self.specs = {spec.name: spec for spec in load_specs(metadata_dir, names)}
+        self.session = make_download_session(pool_size)
+        if app_token:
+            self.session.headers.update({"X-App-Token": app_token})
+        self._classes = {}
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self.specs.values())
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
+    def downloader_class(self, name: str) -> Optional[type]:
+        """The dataset's downloader script class, or one generated from its YAML"""
+        with self._lock:
+            if ("download", name) not in self._classes:
+                spec = self.specs[name]
+                cls = load_stage_class(spec.downloader_module, NYCDataDownloader)
+                if cls is None and spec.dataset_id:
+                    cls = type(f"{name}Downloader", (NYCDataDownloader,),
+                               {"BASE_URL": spec.csv_url, "DATASET_NAME": spec.title or name,
+                                "__module__": __name__})
+                self._classes[("download", name)] = cls
+            return self._classes[("download", name)]
+
+    def downloader(self, name: str, **kwargs) -> Optional[NYCDataDownloader]:
+        """A downloader for ``name`` on the shared session; None without a dataset id"""
+        cls = self.downloader_class(name)
+        return cls(session=self.session, **kwargs) if cls else None
+
+    def has_processor(self, name: str) -> bool:
+        """Whether the dataset has a processor script, without importing it"""
+        return module_path(self.specs[name].processor_module) is not None
+
+    def processor_class(self, name: str) -> Optional[type]:
+        with self._lock:
+            if ("process", name) not in self._classes:
+                self._classes[("process", name)] = load_stage_class(self.specs[name].processor_module,
+                                                                     NYCDataProcessor)
+            return self._classes[("process", name)]
+
+    def refresh_metadata(self, template_path: Optional[str] = None, cache_dir: Optional[str] = None,
+                         workers: int = 8, overwrite: bool = False,
+                         views_url: Optional[str] = None) -> dict:
+        """Update the YAML files with ``batch_metadata.run_batch``; stubs are generated in full.
+
+        The datasets are re-read afterwards. Returns the ``run_batch`` result.
+        """
+        sys.path.insert(0, os.path.join(CODE_DIR, "metadata_generators"))
+        from batch_metadata import DEFAULT_CACHE_DIR, VIEWS_URL, DatasetEntry, run_batch
+
+        template_path = template_path or os.path.join(CODE_DIR, "metadata_generators", "template_metadata.yaml")
+        result = {"written": [], "unchanged": [], "failed": []}
+        stubs = [spec for spec in self if spec.stub or overwrite]
+        for group, regenerate in ((stubs, True), ([spec for spec in self if spec not in stubs], False)):
+            entries = [DatasetEntry(spec.dataset_id, spec.name) for spec in group if spec.dataset_id]
+            if not entries:
+                continue
+            for key, names in run_batch(entries, self.metadata_dir, template_path,
+                                        cache_dir or DEFAULT_CACHE_DIR, workers, regenerate,
+                                        views_url or VIEWS_URL).items():
+                result[key].extend(names)
+        self.specs = {spec.name: spec for spec in load_specs(self.metadata_dir, list(self.specs))}
+        with self._lock:
+            self._classes.clear()
+        return result
+
+
+def print_registry(registry: DatasetRegistry) -> None:
+    print(f"📚 {len(registry)} datasets in {registry.metadata_dir}")
+    for spec in registry:
+        downloader = "script" if module_path(spec.downloader_module) else (
+            "generated" if spec.dataset_id else "none")
+        processor = "script" if registry.has_processor(spec.name) else "none"
+        print(f"   {spec.name:<28} {spec.dataset_id or '-':<10} downloader: {downloader:<9} "
+              f"processor: {processor}{'  (stub)' if spec.stub else ''}")
+        if downloader == "generated":
+            print(f"   {'':<28} {spec.csv_url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the datasets in metadata/ or refresh their YAML files")
+    parser.add_argument("command", choices=["list", "metadata"],
+                        help="'list' shows each dataset's stage code; 'metadata' refreshes the YAML files")
+    parser.add_argument("--metadata-dir", default=DEFAULT_METADATA_DIR,
+                        help="Folder with the dataset YAML files (default: metadata/)")
+    parser.add_argument("--datasets", nargs="+", help="Only these data_names (default: all)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent views API requests (default: 8)")
+    parser.add_argument("--overwrite", action="store_true",
+                        help="Regenerate every YAML file from the template, discarding manual edits")
+    parser.add_argument("--views-url", help="Views API URL template with a {dataset_id} placeholder")
+    add_metrics_argument(parser)
+    args = parser.parse_args()
+    configure_metrics(args.metrics)
+    try:
+        registry = DatasetRegistry(args.metadata_dir, args.datasets)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "list":
+        print_registry(registry)
+        return
+    with span("metadata", datasets=len(registry)):
+        result = registry.refresh_metadata(workers=args.workers, overwrite=args.overwrite,
+                                           views_url=args.views_url)
+    if result["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
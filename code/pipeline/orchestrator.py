@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Pipeline Orchestrator
+
+Runs download → process → profile → upload for the datasets described by the
+YAML files in `metadata/`, as one dependency graph, in one process. The
+stages of a dataset come from the dataset registry
+([dataset_registry.py](dataset_registry.py)): the script named by its
+`implementation.downloader_module` / `processor_module` fields (e.g.
+`downloaders.speed_humps` is `code/downloaders/speed_humps.py`), or a
+downloader generated from the YAML file when there is no script. A dataset
+whose processor module does not exist goes straight from download to
+profile. All downloads share one pooled HTTP session, and `--stages metadata`
+refreshes the YAML files first. An optional `implementation.depends_on` list of other datasets'
+`data_name`s makes a dataset's processing wait for theirs (e.g. for spatial
+joins).
+
+Independent datasets run concurrently, with a bounded thread pool per stage
+(`--workers download=4 process=2 ...`). Every stage records a fingerprint of
+its inputs in `<data-dir>/pipeline_state.json`: the SHA-256 of its input
+files and its options, or the views API `rowsUpdatedAt` for downloads. A
+stage whose fingerprint and outputs are unchanged is skipped, so a second
+run over unchanged data does no work.
+
+Usage:
+    python orchestrator.py --datasets speed_humps raised_crosswalks
+    python orchestrator.py --stages metadata download process profile
+    python orchestrator.py --stages download process profile --workers download=4 process=2
+    python orchestrator.py --organization oscur --profiler sampled
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ROOT = os.path.dirname(CODE_DIR)
+for _folder in ("common", "downloaders", "processors", "upload_to_hugging_face"):
+    sys.path.insert(0, os.path.join(CODE_DIR, _folder))
+
+from dataset_registry import DatasetRegistry  # noqa: E402
+from nyc_base_downloader import DEFAULT_PAGE_SIZE  # noqa: E402
+from download_cache import DownloadCache  # noqa: E402
+from profile_cache import PROFILE_SAMPLE_BYTES, file_sha256  # noqa: E402
+from stage_metrics import add_metrics_argument, configure as configure_metrics, span  # noqa: E402
+
+STAGES = ("download", "process", "profile", "upload")
+DEFAULT_STAGE_WORKERS = {"download": 4, "process": 2, "profile": 2, "upload": 2}
+STATE_NAME = "pipeline_state.json"
+
+
+class PipelineState:
+    """``pipeline_state.json``: stage fingerprints and cached file hashes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {"stages": {}, "files": {}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def fingerprint(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self.state["stages"].get(key, {}).get("fingerprint")
+
+    def record(self, key: str, fingerprint: Optional[str], seconds: float) -> None:
+        with self._lock:
+            self.state["stages"][key] = {"fingerprint": fingerprint, "seconds": round(seconds, 3),
+                                         "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            self._save()
+
+    def file_hash(self, path: str) -> str:
+        """SHA-256 of ``path``, reused while its size and mtime are unchanged"""
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            cached = self.state["files"].get(os.path.abspath(path))
+        if cached and cached["signature"] == signature:
+            return cached["sha256"]
+        sha256 = file_sha256(path)
+        with self._lock:
+            self.state["files"][os.path.abspath(path)] = {"signature": signature, "sha256": sha256}
+        return sha256
+
+    def _save(self) -> None:
+        """Write the state atomically so a crash never leaves it half-written"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+class Pipeline:
+    """Build and run the download → process → profile → upload graph"""
+
+    def __init__(self, registry: DatasetRegistry, data_dir: str, stages: tuple = STAGES,
+                 stage_workers: Optional[dict] = None, force: bool = False,
+                 page_size: int = DEFAULT_PAGE_SIZE, download_workers: int = 1,
+                 cache_dir: Optional[str] = None, profiler: str = "datamart",
+                 sample_rows: Optional[int] = None, organization: Optional[str] = None,
+                 api=None):
+        self.registry = registry
+        self.specs = registry.specs
+        self.data_dir = data_dir
+        self.stages = tuple(stage for stage in STAGES if stage in stages)
+        self.stage_workers = {**DEFAULT_STAGE_WORKERS, **(stage_workers or {})}
+        self.force = force
+        self.page_size = page_size
+        self.download_workers = download_workers
+        self.cache = DownloadCache(cache_dir) if cache_dir else None
+        self.profiler = profiler
+        self.sample_rows = sample_rows
+        self.organization = organization
+        self.api = api
+        if "upload" in self.stages and api is None:
+            raise ValueError("the upload stage needs a Hugging Face API (or a fake Hub)")
+        os.makedirs(data_dir, exist_ok=True)
+        self.state = PipelineState(os.path.join(data_dir, STATE_NAME))
+
+    def paths(self, name: str) -> dict:
+        """Files a dataset's stages read and write"""
+        folder = os.path.join(self.data_dir, name)
+        raw = os.path.join(folder, f"{name}.csv")
+        processed = os.path.join(folder, f"{name}_processed.csv")
+        return {"raw": raw, "processed": processed if self.registry.has_processor(name) else raw,
+                "profile": os.path.join(folder, f"{name}_profile.json")}
+
+    def plan(self) -> dict:
+        """Map each task (``"<dataset>:<stage>"``) to the tasks it waits for"""
+        graph = {}
+        for name in self.specs:
+            previous = None
+            for stage in self.stages:
+                if stage == "download" and self.registry.downloader_class(name) is None:
+                    print(f"⚠️  {name}: no dataset_id or downloader module; "
+                          f"expecting {self.paths(name)['raw']}")
+                    continue
+                if stage == "process" and not self.registry.has_processor(name):
+                    continue
+                key = f"{name}:{stage}"
+                graph[key] = [previous] if previous else []
+                if stage == "process":
+                    for other in self.specs[name].depends_on:
+                        if other not in self.specs:
+                            print(f"⚠️  {name} depends on {other}, which is not part of this run")
+                            continue
+                        graph[key].append(self._ready_task(other))
+                previous = key
+        for key, deps in graph.items():
+            graph[key] = [dep for dep in deps if dep in graph]
+        self._check_acyclic(graph)
+        return graph
+
+    def _ready_task(self, name: str) -> str:
+        """The task after which a dataset's data is final (processed, or downloaded)"""
+        if "process" in self.stages and self.registry.has_processor(name):
+            return f"{name}:process"
+        return f"{name}:download"
+
+    @staticmethod
+    def _check_acyclic(graph: dict) -> None:
+        visiting, done = set(), set()
+
+        def visit(key, path):
+            if key in done:
+                return
+            if key in visiting:
+                raise ValueError(f"Dependency cycle: {' → '.join(path + [key])}")
+            visiting.add(key)
+            for dep in graph[key]:
+                visit(dep, path + [key])
+            visiting.discard(key)
+            done.add(key)
+
+        for key in graph:
+            visit(key, [])
+
+    def run(self) -> dict:
+        """Run every task once its dependencies are done; return their statuses.
+
+        A status is ``done``, ``skipped`` (inputs unchanged), ``failed`` or
+        ``blocked`` (a dependency failed).
+        """
+        graph = self.plan()
+        print(f"🗺️  {len(graph)} tasks for {len(self.specs)} datasets; workers per stage: "
+              + ", ".join(f"{stage}={self.stage_workers[stage]}" for stage in self.stages))
+        started = time.monotonic()
+        pools = {stage: ThreadPoolExecutor(max_workers=self.stage_workers[stage], thread_name_prefix=stage)
+                 for stage in self.stages}
+        status, running, pending = {}, {}, set(graph)
+        try:
+            while pending or running:
+                changed = True
+                while changed:
+                    changed = False
+                    for key in sorted(pending):
+                        dep_status = [status.get(dep) for dep in graph[key]]
+                        if any(s in ("failed", "blocked") for s in dep_status):
+                            status[key] = "blocked"
+                        elif all(s in ("done", "skipped") for s in dep_status):
+                            name, stage = key.split(":")
+                            running[pools[stage].submit(self.run_task, name, stage)] = key
+                        else:
+                            continue
+                        pending.discard(key)
+                        changed = True
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    try:
+                        status[key] = future.result()
+                    except Exception as e:
+                        print(f"❌ {key} failed: {e}")
+                        status[key] = "failed"
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+        self._report(status, time.monotonic() - started)
+        return status
+
+    def run_task(self, name: str, stage: str) -> str:
+        """Run one stage of one dataset unless its fingerprint is unchanged.
+
+        The task is recorded as a ``pipeline.<stage>`` span, fingerprinting included.
+        """
+        key = f"{name}:{stage}"
+        with span(f"pipeline.{stage}", dataset=name) as current:
+            fingerprint = getattr(self, f"_fingerprint_{stage}")(name)
+            if (not self.force and fingerprint is not None and fingerprint == self.state.fingerprint(key)
+                    and all(os.path.exists(path) for path in self._outputs(name, stage))):
+                current.set(skipped=True)
+                print(f"⏭️  {key}: inputs unchanged, skipped")
+                return "skipped"
+            print(f"▶️  {key}")
+            started = time.monotonic()
+            getattr(self, f"_run_{stage}")(name)
+            elapsed = time.monotonic() - started
+        self.state.record(key, fingerprint, elapsed)
+        print(f"✅ {key} finished in {elapsed:,.1f}s")
+        return "done"
+
+    def _outputs(self, name: str, stage: str) -> list:
+        paths = self.paths(name)
+        return {"download": [paths["raw"]], "process": [paths["processed"]],
+                "profile": [paths["profile"]], "upload": []}[stage]
+
+    def _digest(self, *parts) -> str:
+        return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+    def _fingerprint_download(self, name: str) -> Optional[str]:
+        """The dataset version (``rowsUpdatedAt``); None (always run) if unknown"""
+        downloader = self.registry.downloader(name)
+        if downloader is None:
+            return None
+        try:
+            rows_updated_at = downloader.get_rows_updated_at()
+        except Exception as e:
+            print(f"⚠️  {name}: could not read rowsUpdatedAt ({e}); downloading")
+            return None
+        return self._digest(downloader.BASE_URL, rows_updated_at, self.page_size) if rows_updated_at else None
+
+    def _fingerprint_process(self, name: str) -> str:
+        deps = [self.state.file_hash(self.paths(other)["processed"])
+                for other in self.specs[name].depends_on if other in self.specs]
+        return self._digest(self.specs[name].processor_module,
+                            self.state.file_hash(self.paths(name)["raw"]), deps)
+
+    def _fingerprint_profile(self, name: str) -> str:
+        return self._digest(self.profiler, self.sample_rows,
+                            self.state.file_hash(self.paths(name)["processed"]))
+
+    def _fingerprint_upload(self, name: str) -> str:
+        paths = self.paths(name)
+        return self._digest(self._repo_id(name), self.state.file_hash(paths["processed"]),
+                            self.state.file_hash(paths["profile"]) if os.path.exists(paths["profile"]) else None)
+
+    def _run_download(self, name: str) -> None:
+        path = self.paths(name)["raw"]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        downloader = self.registry.downloader(name, cache=self.cache)
+        if not downloader.download_csv(path, page_size=self.page_size, workers=self.download_workers):
+            raise RuntimeError(f"downloading {downloader.BASE_URL} failed")
+
+    def _run_process(self, name: str) -> None:
+        paths = self.paths(name)
+        self.registry.processor_class(name)().process(paths["raw"], paths["processed"], file_format="csv")
+
+    def _run_profile(self, name: str) -> None:
+        from profile_cache import get_or_create_profile
+        profile = get_or_create_profile(self.paths(name)["processed"], load_max_size=PROFILE_SAMPLE_BYTES,
+                                        include_sample=True, plots=True, engine=self.profiler,
+                                        sample_rows=self.sample_rows)
+        path = self.paths(name)["profile"]
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=4)
+        os.replace(f"{path}.tmp", path)
+
+    def _run_upload(self, name: str) -> None:
+        import pyarrow as pa
+        from generate_dataset_script import profile_dtypes
+        from parquet_shards import upload_shards, write_parquet_shards
+
+        paths = self.paths(name)
+        repo_id = self._repo_id(name)
+        extra_files, schema = {}, None
+        if os.path.exists(paths["profile"]):
+            with open(paths["profile"], "rb") as f:
+                extra_files["profiling_metadata.json"] = f.read()
+            profile = json.loads(extra_files["profiling_metadata.json"])
+            schema = pa.schema([(column, pa.type_for_alias(dtype))
+                                for column, dtype in profile_dtypes(profile).items()])
+        self.api.create_repo(repo_id, repo_type="dataset", exist_ok=True)
+        with tempfile.TemporaryDirectory() as shard_dir:
+            try:
+                shards = write_parquet_shards(paths["processed"], shard_dir, schema=schema)
+            except pa.ArrowInvalid as e:
+                print(f"⚠️  {name}: profiled column types do not fit every row ({e}); uploading strings")
+                shards = write_parquet_shards(paths["processed"], shard_dir)
+            upload_shards(self.api, repo_id, shards, extra_files=extra_files,
+                          commit_message=f"Upload {name} as Parquet shards")
+
+    def _repo_id(self, name: str) -> str:
+        return f"{self.organization}/{name}"
+
+    def _report(self, status: dict, elapsed: float) -> None:
+        print(f"📋 Pipeline finished in {elapsed:,.1f}s")
+        icons = {"done": "✅", "skipped": "⏭️ ", "failed": "❌", "blocked": "⛔"}
+        for name in self.specs:
+            cells = [f"{stage} {icons[status[f'{name}:{stage}']]}" for stage in self.stages
+                     if f"{name}:{stage}" in status]
+            print(f"   {name:<28} {'  '.join(cells)}")
+
+
+def parse_stage_workers(values: list) -> dict:
+    """Parse ``stage=N`` pairs"""
+    workers = {}
+    for value in values or []:
+        stage, _, count = value.partition("=")
+        if stage not in STAGES or not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(f"expected <stage>=<N> with a stage in {STAGES}: {value}")
+        workers[stage] = int(count)
+    return workers
+
+
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run download → process → profile → upload for the "
+                                                 "datasets in metadata/ as a dependency graph")
+    parser.add_argument("--metadata-dir", default=os.path.join(PROJECT_ROOT, "metadata"),
+                        help="Folder with the dataset YAML files (default: metadata/)")
+    parser.add_argument("--data-dir", default=os.path.join(PROJECT_ROOT, "data"),
+                        help="Folder for downloaded, processed and profile files (default: data/)")
+    parser.add_argument("--datasets", nargs="+", help="Only run these data_names (default: all)")
+    parser.add_argument("--stages", nargs="+", choices=("metadata",) + STAGES,
+                        default=[s for s in STAGES if s != "upload"],
+                        help="Stages to run (default: download process profile); 'metadata' refreshes "
+                             "the YAML files with conditional views API requests before the others")
+    parser.add_argument("--workers", nargs="+", metavar="STAGE=N",
+                        help="Concurrent datasets per stage (default: "
+                             + " ".join(f"{s}={n}" for s, n in DEFAULT_STAGE_WORKERS.items()) + ")")
+    parser.add_argument("--force", action="store_true", help="Run every stage even if its inputs are unchanged")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"Rows per download page (default: {DEFAULT_PAGE_SIZE})")
+    parser.add_argument("--download-workers", type=int, default=1,
+                        help="Parallel ranges within one dataset's download (default: 1)")
+    parser.add_argument("--cache-dir", help="Shared download cache (see code/downloaders/download_cache.py)")
+    parser.add_argument("--app-token", help="Socrata API app token, sent by every download")
+    parser.add_argument("--profiler", choices=["datamart", "sampled"], default="datamart",
+                        help="Profiler for the profile stage (default: datamart)")
+    parser.add_argument("--sample-rows", type=int, help="Rows sampled by --profiler sampled")
+    parser.add_argument("--organization", help="Hugging Face organization for the upload stage")
+    parser.add_argument("--token", help="Hugging Face token (default: the logged-in token)")
+    parser.add_argument("--fake-hub", help="Upload to a local fake Hub in this folder instead")
+    add_metrics_argument(parser)
+    return parser
+
+
+def main():
+    parser = create_argument_parser()
+    args = parser.parse_args()
+    try:
+        stage_workers = parse_stage_workers(args.workers)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    configure_metrics(args.metrics)
+    api = None
+    if "upload" in args.stages:
+        if not args.organization:
+            parser.error("--organization is required for the upload stage")
+        if args.fake_hub:
+            from fake_hf_api import FakeHfApi
+            api = FakeHfApi(args.fake_hub)
+        else:
+            from huggingface_hub import HfApi
+            api = HfApi(token=args.token)
+
+    # One connection per concurrent download range, shared by all datasets
+    pool_size = stage_workers.get("download", DEFAULT_STAGE_WORKERS["download"]) * max(args.download_workers, 1)
+    try:
+        registry = DatasetRegistry(args.metadata_dir, args.datasets, pool_size=pool_size,
+                                   app_token=args.app_token)
+    except ValueError as e:
+        parser.error(str(e))
+    if "metadata" in args.stages:
+        with span("metadata", datasets=len(registry)):
+            if registry.refresh_metadata()["failed"]:
+                print("⚠️  Some metadata files could not be refreshed; continuing with the current files")
+    stages = tuple(stage for stage in args.stages if stage != "metadata")
+    if not stages:
+        return
+
+    pipeline = Pipeline(registry, args.data_dir, stages=stages,
+                        stage_workers=stage_workers, force=args.force, page_size=args.page_size,
+                        download_workers=args.download_workers, cache_dir=args.cache_dir,
+                        profiler=args.profiler, sample_rows=args.sample_rows,
+                        organization=args.organization, api=api)
+    with span("pipeline", datasets=len(pipeline.specs)):
+        status = pipeline.run()
+    if any(value in ("failed", "blocked") for value in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+"""
+NYC Open Data Processors - Base Class
+
+Base class for chunked, streaming post-processors of downloaded datasets.
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, NamedTuple, Optional
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+
+from stage_metrics import add_metrics_argument, configure as configure_metrics, span, timed_iter  # noqa: E402
+
+DEFAULT_CHUNK_SIZE = 100000   # Rows read, transformed and written at a time
+CSV_SAMPLE_ROWS = 1000        # Rows sampled to estimate bytes per row for CSV partitions
+COMPRESSED_EXTENSIONS = (".gz", ".zst")   # gzip/zstd CSVs written by the downloaders
+
+
+class Partition(NamedTuple):
+    """A slice of the input that a worker process reads by itself.
+
+    CSV inputs are split into byte ranges (``start``/``end``) that begin and
+    end on record boundaries; Parquet inputs into lists of ``row_groups``.
+    Only these offsets are sent to the workers, never the data.
+    """
+    index: int
+    start: int = 0
+    end: int = 0
+    row_groups: tuple = ()
+
+
+class NYCDataProcessor(ABC):
+    """Base class for dataset processors that stream their input in chunks.
+
+    The input (CSV or Parquet) is read ``chunk_size`` rows at a time, each
+    chunk goes through the dataset's ``transform`` hook and is appended to the
+    output straight away, so peak memory depends on the chunk size and not on
+    the size of the file.
+    """
+
+    # Optional pandas dtypes for CSV columns whose type could differ between chunks
+    COLUMN_TYPES: Optional[dict] = None
+
+    @property
+    @abstractmethod
+    def DATASET_NAME(self) -> str:
+        """Each subclass must define its dataset name for descriptions"""
+        pass
+
+    @abstractmethod
+    def transform(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Each subclass must transform one chunk of rows"""
+        pass
+
+    def read_chunks(self, input_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """Yield the input file as DataFrames of at most ``chunk_size`` rows.
+
+        ``.csv.gz`` and ``.csv.zst`` inputs are decompressed while they are read.
+        Reading and parsing each chunk is recorded as a ``process.read`` span.
+        """
+        if input_path.endswith((".parquet", ".pq")):
+            import pyarrow.parquet as pq
+            batches = pq.ParquetFile(input_path).iter_batches(batch_size=chunk_size)
+            yield from timed_iter((batch.to_pandas() for batch in batches), "process.read",
+                                  dataset=self.DATASET_NAME)
+        elif input_path.endswith(COMPRESSED_EXTENSIONS):
+            import pyarrow as pa
+            with pa.input_stream(input_path, compression="detect") as stream:
+                yield from timed_iter(pd.read_csv(stream, chunksize=chunk_size, dtype=self.COLUMN_TYPES),
+                                      "process.read", dataset=self.DATASET_NAME)
+        else:
+            yield from timed_iter(pd.read_csv(input_path, chunksize=chunk_size, dtype=self.COLUMN_TYPES),
+                                  "process.read", dataset=self.DATASET_NAME)
+
+    def process(self, input_path: str, output_path: str, file_format: str = "csv",
+                chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1) -> int:
+        """Transform ``input_path`` chunk by chunk into ``output_path``; return the row count.
+
+        With ``workers`` > 1 the chunks are transformed on a process pool (see
+        ``process_parallel``). Compressed CSV inputs cannot be split into byte
+        ranges and are always processed by a single process.
+        """
+        if workers > 1 and input_path.endswith(COMPRESSED_EXTENSIONS):
+            print(f"⚠️  {input_path} is compressed and cannot be partitioned; using 1 worker")
+            workers = 1
+        if workers > 1:
+            return self.process_parallel(input_path, output_path, file_format=file_format,
+                                         chunk_size=chunk_size, workers=workers)
+        print(f"⚙️  Processing {self.DATASET_NAME}: {input_path} (chunks of {chunk_size:,} rows)")
+        started = time.monotonic()
+        writer = ChunkWriter(output_path, file_format)
+        rows = 0
+        try:
+            for chunk in self.read_chunks(input_path, chunk_size):
+                with span("process.transform", dataset=self.DATASET_NAME, rows=len(chunk)):
+                    chunk = self.transform(chunk)
+                with span("process.write", dataset=self.DATASET_NAME, rows=len(chunk)):
+                    writer.write(chunk)
+                rows += len(chunk)
+                print(f"🧮 Processed {rows:,} rows")
+        finally:
+            writer.close()
+        print(f"✅ Saved processed dataset to: {output_path} "
+              f"({rows:,} rows in {time.monotonic() - started:,.1f}s)")
+        return rows
+
+    def process_parallel(self, input_path: str, output_path: str, file_format: str = "csv",
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 2) -> int:
+        """Transform partitions of the input on ``workers`` processes.
+
+        The input is split into partitions of about ``chunk_size`` rows (see
+        ``Partition``); each worker reads its own partition from disk,
+        transforms it and writes a ``<output>.partNNNNN`` file, so no rows are
+        pickled between processes. The parts are then concatenated in input
+        order. Also reports the parallel efficiency: the CPU time the workers
+        spent, relative to wall time x ``workers``.
+        """
+        print(f"⚙️  Processing {self.DATASET_NAME}: {input_path} "
+              f"({workers} workers, partitions of ~{chunk_size:,} rows)")
+        started = time.monotonic()
+        partitions = list(self.plan_partitions(input_path, chunk_size))
+        part_paths = [f"{output_path}.part{p.index:05d}" for p in partitions]
+        rows, busy = 0, 0.0
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_process_partition, self, input_path, part_path,
+                                       file_format, partition)
+                           for partition, part_path in zip(partitions, part_paths)]
+                for future in futures:
+                    part_rows, seconds = future.result()
+                    rows += part_rows
+                    busy += seconds
+                    print(f"🧮 Processed {rows:,} rows")
+            merge_parts(part_paths, output_path, file_format)
+        finally:
+            for path in part_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        elapsed = time.monotonic() - started
+        print(f"✅ Saved processed dataset to: {output_path} "
+              f"({rows:,} rows in {elapsed:,.1f}s)")
+        print(f"📊 {len(partitions)} partitions on {workers} workers, parallel efficiency "
+              f"{busy / max(elapsed * workers, 1e-9):.0%} (worker CPU time / wall time x workers)")
+        return rows
+
+    def plan_partitions(self, input_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Partition]:
+        """Split the input into partitions of about ``chunk_size`` rows"""
+        if input_path.endswith((".parquet", ".pq")):
+            import pyarrow.parquet as pq
+            metadata = pq.ParquetFile(input_path).metadata
+            groups, rows, index = [], 0, 0
+            for i in range(metadata.num_row_groups):
+                groups.append(i)
+                rows += metadata.row_group(i).num_rows
+                if rows >= chunk_size:
+                    yield Partition(index, row_groups=tuple(groups))
+                    groups, rows, index = [], 0, index + 1
+            if groups or index == 0:
+                yield Partition(index, row_groups=tuple(groups))
+        else:
+            yield from _csv_partitions(input_path, chunk_size)
+
+    def read_partition(self, input_path: str, partition: Partition) -> pd.DataFrame:
+        """Read one partition produced by ``plan_partitions`` (a ``process.read`` span)"""
+        with span("process.read", dataset=self.DATASET_NAME, partition=partition.index) as current:
+            if input_path.endswith((".parquet", ".pq")):
+                import pyarrow.parquet as pq
+                chunk = pq.ParquetFile(input_path).read_row_groups(list(partition.row_groups)).to_pandas()
+            else:
+                with open(input_path, "rb") as f:
+                    header = f.readline()
+                    f.seek(partition.start)
+                    data = f.read(partition.end - partition.start)
+                current.add(bytes=len(data))
+                chunk = pd.read_csv(io.BytesIO(header + data), dtype=self.COLUMN_TYPES)
+            current.add(rows=len(chunk))
+        return chunk
+
+    def report_scaling(self, input_path: str, max_workers: int, file_format: str = "csv",
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+        """Time the processor with 1, 2, 4, ... ``max_workers`` workers.
+
+        Prints the speed-up and scaling efficiency (speed-up / workers) of each
+        run relative to the single-process run, and returns them as dicts.
+        """
+        counts = sorted({1, max_workers} | {2 ** i for i in range(1, max_workers.bit_length())
+                                            if 2 ** i < max_workers})
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for workers in counts:
+                output_path = os.path.join(tmp, f"workers_{workers}.{file_format}")
+                started = time.monotonic()
+                self.process(input_path, output_path, file_format=file_format,
+                             chunk_size=chunk_size, workers=workers)
+                elapsed = time.monotonic() - started
+                speedup = results[0]["seconds"] / elapsed if results else 1.0
+                results.append({"workers": workers, "seconds": elapsed, "speedup": speedup,
+                                "efficiency": speedup / workers})
+        print("📈 Scaling report")
+        for result in results:
+            print(f"   {result['workers']:>3} workers: {result['seconds']:8.2f}s  "
+                  f"speed-up {result['speedup']:5.2f}x  efficiency {result['efficiency']:.0%}")
+        return results
+
+    def add_arguments(self, parser: argparse.ArgumentParser) -> None:
+        """Hook for subclasses to add dataset-specific options"""
+        pass
+
+    def configure(self, args: argparse.Namespace) -> None:
+        """Hook for subclasses to read their dataset-specific options"""
+        pass
+
+    def create_argument_parser(self) -> argparse.ArgumentParser:
+        """Create standardized argument parser"""
+        parser = argparse.ArgumentParser(description=f"Process the {self.DATASET_NAME} dataset")
+        parser.add_argument("-i", "--input", required=True,
+                            help="Path to the input CSV or Parquet file")
+        parser.add_argument("-o", "--output", required=True,
+                            help="Path to the output file")
+        parser.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                            help="Output file format (default: csv)")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f"Rows processed at a time (default: {DEFAULT_CHUNK_SIZE})")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Number of processes transforming partitions in parallel (default: 1)")
+        parser.add_argument("--scaling-report", action="store_true",
+                            help="Time runs with 1, 2, 4, ... --workers processes and report "
+                                 "the speed-up and scaling efficiency")
+        add_metrics_argument(parser)
+        self.add_arguments(parser)
+        return parser
+
+    def run(self) -> None:
+        """Main execution method"""
+        parser = self.create_argument_parser()
+        args = parser.parse_args()
+        self.configure(args)
+        configure_metrics(args.metrics)
+        if args.scaling_report:
+            self.report_scaling(args.input, args.workers, file_format=args.format,
+                                chunk_size=args.chunk_size)
+        with span("process", dataset=self.DATASET_NAME, workers=args.workers,
+                  bytes=os.path.getsize(args.input)) as current:
+            current.add(rows=self.process(args.input, args.output, file_format=args.format,
+                                          chunk_size=args.chunk_size, workers=args.workers))
+
+
+class ChunkWriter:
+    """Append DataFrame chunks to a CSV or Parquet file.
+
+    Parquet files get one row group per chunk; the schema is ``schema`` or
+    is fixed by the first chunk (columns that are empty in it are stored as
+    strings), and later chunks are cast to it.
+    """
+
+    def __init__(self, output_path: str, file_format: str = "csv", schema=None):
+        if file_format not in ("csv", "parquet"):
+            raise ValueError(f"Unsupported output format: {file_format}")
+        self.output_path = output_path
+        self.file_format = file_format
+        self._file = None
+        self._writer = None
+        self._schema = schema
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self.file_format == "parquet":
+            self._write_parquet(chunk)
+        else:
+            if self._file is None:
+                self._file = open(self.output_path, "w", newline="", encoding="utf-8")
+                chunk.to_csv(self._file, index=False)
+            else:
+                chunk.to_csv(self._file, index=False, header=False)
+
+    def _write_parquet(self, chunk: pd.DataFrame) -> None:
+        import pyarrow as pa
+
+        self.write_table(pa.Table.from_pandas(chunk, preserve_index=False))
+
+    def write_table(self, table) -> None:
+        """Append an Arrow table as a Parquet row group"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            if self._schema is None:
+                # Columns with no values in the first chunk cannot be typed yet: keep them as text
+                self._schema = pa.schema([
+                    field.with_type(pa.string()) if table.column(i).null_count == table.num_rows
+                    else field for i, field in enumerate(table.schema)]).remove_metadata()
+            self._writer = pq.ParquetWriter(self.output_path, self._schema, compression="zstd")
+        try:
+            table = table.select(self._schema.names)
+            # Columns without values take the output type, whatever type they were given
+            for i, field in enumerate(self._schema):
+                if table.column(i).null_count == table.num_rows and table.column(i).type != field.type:
+                    table = table.set_column(i, field, pa.nulls(table.num_rows, field.type))
+            table = table.cast(self._schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, KeyError) as e:
+            raise ValueError(f"Chunk does not match the output schema ({e}); pin the column "
+                             f"types with the processor's COLUMN_TYPES") from e
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is None and self._writer is None and not os.path.exists(self.output_path):
+            # Empty input: still leave an (empty) output file behind
+            open(self.output_path, "w").close()
+
+
+def _process_partition(processor: NYCDataProcessor, input_path: str, part_path: str,
+                       file_format: str, partition: Partition) -> tuple:
+    """Worker entry point: read, transform and write one partition"""
+    started = time.process_time()
+    writer = ChunkWriter(part_path, file_format)
+    try:
+        chunk = processor.read_partition(input_path, partition)
+        with span("process.transform", dataset=processor.DATASET_NAME, rows=len(chunk)):
+            chunk = processor.transform(chunk)
+        with span("process.write", dataset=processor.DATASET_NAME, rows=len(chunk)):
+            writer.write(chunk)
+    finally:
+        writer.close()
+    return len(chunk), time.process_time() - started
+
+
+def _csv_partitions(input_path: str, chunk_size: int) -> Iterator[Partition]:
+    """Split a CSV file into byte ranges of about ``chunk_size`` rows.
+
+    Ranges end after a newline that is outside quoted fields (an even number
+    of quote characters precede it), so multi-line values are never split.
+    """
+    size = os.path.getsize(input_path)
+    with open(input_path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        sample = [line for line in (f.readline() for _ in range(CSV_SAMPLE_ROWS)) if line]
+        row_bytes = max(sum(len(line) for line in sample) / max(len(sample), 1), 1)
+        target = max(int(row_bytes * chunk_size), 1)
+        index = 0
+        while start < size:
+            f.seek(start)
+            block = f.read(target)
+            end = start + len(block)
+            while end < size:
+                newline = block.rfind(b"\n")
+                while newline >= 0 and block.count(b'"', 0, newline) % 2:
+                    newline = block.rfind(b"\n", 0, newline)
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                # A single record is longer than the block: read further
+                block += f.read(target)
+                end = start + len(block)
+            yield Partition(index, start=start, end=end)
+            start, index = end, index + 1
+        if index == 0:
+            yield Partition(0, start=start, end=start)
+
+
+def _has_values(parquet_file, column: int) -> bool:
+    """Whether a column of a Parquet file has a non-null value (True without statistics)"""
+    metadata = parquet_file.metadata
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(column).statistics
+        if statistics is None or not statistics.has_null_count:
+            return True
+        if statistics.null_count < metadata.row_group(i).num_rows:
+            return True
+    return False
+
+
+def merge_schema(parquet_files: list):
+    """One schema for the part files of a parallel run.
+
+    Each worker types the columns of its own partition, and columns that are
+    empty in a partition are stored as text, so the parts can disagree. Each
+    column takes its type from the first part where it has values.
+    """
+    import pyarrow as pa
+
+    fields = {}
+    for parquet_file in parquet_files:
+        # Processed parts are flat, so Arrow fields and Parquet columns line up
+        for column, field in enumerate(parquet_file.schema_arrow):
+            if fields.get(field.name, (None, False))[1]:
+                continue
+            has_values = _has_values(parquet_file, column)
+            if field.name not in fields or has_values:
+                fields[field.name] = (field, has_values)
+    return pa.schema([field for field, _ in fields.values()])
+
+
+def merge_parts(part_paths: list, output_path: str, file_format: str = "csv") -> None:
+    """Concatenate processed part files in order into ``output_path``.
+
+    Parquet parts are cast to one schema (see ``merge_schema``).
+    """
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        parquet_files = [pq.ParquetFile(path) for path in part_paths]
+        schema = merge_schema(parquet_files) if parquet_files else None
+        writer = ChunkWriter(output_path, "parquet", schema)
+        try:
+            for parquet_file in parquet_files:
+                for i in range(parquet_file.num_row_groups):
+                    writer.write_table(parquet_file.read_row_group(i))
+        finally:
+            writer.close()
+        return
+    with open(output_path, "wb") as out:
+        for i, path in enumerate(part_paths):
+            with open(path, "rb") as part:
+                if i > 0:
+                    part.readline()
+                shutil.copyfileobj(part, out)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Rasterization Processor
+
+Turns point datasets (collisions, 311, the speed hump centroids written by
+`speed_humps.py --centroid`) into NumPy grids, following the
+`map_algebra.raster_conversion` block of the dataset's metadata YAML:
+
+- `suitable_for_rasterization` must be true (or pass `--force`);
+- `recommended_cell_size` ("100 meters", "1 km") sets the cell size;
+- `interpolation_method` "nearest neighbor" bins each point into the cell
+  that contains it; "bilinear" splits it between the four nearest cell
+  centers.
+
+The input is streamed in chunks (or partitions with `--workers`); each
+chunk is binned into totals for the cells it touches, which are added to
+running per-cell totals, so files larger than memory are fine and a chunk
+costs memory for its points, not for the whole grid. The grid is written as a `.npy` array (with a
+`.json` sidecar describing its extent) that `load_raster` opens with
+`np.load(..., mmap_mode="r")`. Grids made with the same bounds and cell size
+line up cell for cell, so map algebra across datasets is plain NumPy:
+
+    collisions, info = load_raster("collisions.npy")
+    humps, _ = load_raster("speed_humps.npy", like=info)
+    near_humps = collisions[humps > 0].sum()
+
+Usage:
+    python rasterize.py -i collisions.csv -o collisions.npy --metadata ../../metadata/NYC_vehicle_collisions.yaml
+    python rasterize.py -i speed_humps_with_latlon.csv -o speed_humps.npy --lat centroid_lat --lon centroid_lon --cell-size 100
+    python rasterize.py -i NYC_311.parquet -o 311_mean_delay.npy --cell-size 250 --value delay_hours --aggregate mean --workers 4
+"""
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from nyc_base_processor import DEFAULT_CHUNK_SIZE, COMPRESSED_EXTENSIONS, NYCDataProcessor
+from spatial_join import project
+from stage_metrics import span
+
+# West, south, east, north of the five boroughs; shared so grids line up
+NYC_BOUNDS = (-74.26, 40.49, -73.69, 40.92)
+DEFAULT_CELL_SIZE = 100.0      # Meters
+AGGREGATES = ("count", "sum", "mean")
+INTERPOLATIONS = ("nearest neighbor", "bilinear")
+_UNITS = {"m": 1.0, "meter": 1.0, "meters": 1.0, "km": 1000.0, "kilometer": 1000.0, "kilometers": 1000.0}
+
+
+def parse_cell_size(text) -> Optional[float]:
+    """Meters from a metadata cell size such as ``"100 meters"`` or ``"1 km"``"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", str(text or ""))
+    if not match:
+        return None
+    return float(match.group(1)) * _UNITS.get(match.group(2).lower() or "m", 1.0)
+
+
+def raster_settings(metadata_path: str) -> dict:
+    """The ``map_algebra.raster_conversion`` block of a metadata YAML file"""
+    import yaml
+    with open(metadata_path, encoding="utf-8") as f:
+        metadata = yaml.safe_load(f) or {}
+    return (metadata.get("map_algebra") or {}).get("raster_conversion") or {}
+
+
+class RasterGrid:
+    """A north-up grid of ``cell_size`` meters covering ``bounds`` (lon/lat)"""
+
+    def __init__(self, bounds: tuple = NYC_BOUNDS, cell_size: float = DEFAULT_CELL_SIZE):
+        self.bounds = tuple(float(value) for value in bounds)
+        self.cell_size = float(cell_size)
+        west, south, east, north = self.bounds
+        self.origin = ((west + east) / 2, (south + north) / 2)
+        (self.x0, x1), (y0, self.y1) = project(np.array([west, east]), np.array([south, north]), self.origin)
+        self.cols = int(np.ceil((x1 - self.x0) / self.cell_size))
+        self.rows = int(np.ceil((self.y1 - y0) / self.cell_size))
+
+    @property
+    def shape(self) -> tuple:
+        return (self.rows, self.cols)
+
+    def cell_coordinates(self, lon: np.ndarray, lat: np.ndarray) -> tuple:
+        """Fractional (row, col) of each point; cell centers are at n + 0.5"""
+        x, y = project(lon, lat, self.origin)
+        return (self.y1 - y) / self.cell_size, (x - self.x0) / self.cell_size
+
+    def info(self) -> dict:
+        return {"bounds": list(self.bounds), "cell_size": self.cell_size, "shape": list(self.shape),
+                "projection": "equirectangular meters around the center of bounds", "row_0": "north"}
+
+
+def _splat(grid: RasterGrid, rows: np.ndarray, cols: np.ndarray, interpolation: str) -> tuple:
+    """Flat cell indices and weights that each point contributes to"""
+    if interpolation == "bilinear":
+        u, v = rows - 0.5, cols - 0.5
+        r0, c0 = np.floor(u).astype(np.int64), np.floor(v).astype(np.int64)
+        wr, wc = u - r0, v - c0
+        cell_rows = np.concatenate([r0, r0, r0 + 1, r0 + 1])
+        cell_cols = np.concatenate([c0, c0 + 1, c0, c0 + 1])
+        weights = np.concatenate([(1 - wr) * (1 - wc), (1 - wr) * wc, wr * (1 - wc), wr * wc])
+        point = np.tile(np.arange(len(rows)), 4)
+    else:
+        cell_rows, cell_cols = np.floor(rows).astype(np.int64), np.floor(cols).astype(np.int64)
+        weights, point = np.ones(len(rows)), np.arange(len(rows))
+    inside = (cell_rows >= 0) & (cell_rows < grid.rows) & (cell_cols >= 0) & (cell_cols < grid.cols)
+    return cell_rows[inside] * grid.cols + cell_cols[inside], weights[inside], point[inside]
+
+
+class RasterProcessor(NYCDataProcessor):
+    DATASET_NAME = "rasterization"
+
+    def __init__(self, grid: Optional[RasterGrid] = None, lat_column: str = "latitude",
+                 lon_column: str = "longitude", value_column: Optional[str] = None,
+                 aggregate: str = "count", interpolation: str = "nearest neighbor"):
+        self.grid = grid or RasterGrid()
+        self.lat_column = lat_column
+        self.lon_column = lon_column
+        self.value_column = value_column
+        self.aggregate = aggregate
+        self.interpolation = interpolation
+
+    def transform(self, chunk):
+        """Add the ``cell_row``/``cell_col`` of each row's point (-1 outside the grid)"""
+        lon = pd.to_numeric(chunk[self.lon_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        lat = pd.to_numeric(chunk[self.lat_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        rows, cols = self.grid.cell_coordinates(lon, lat)
+        with np.errstate(invalid="ignore"):
+            inside = (rows >= 0) & (rows < self.grid.rows) & (cols >= 0) & (cols < self.grid.cols)
+        chunk["cell_row"] = np.where(inside, np.floor(np.nan_to_num(rows)), -1).astype(np.int64)
+        chunk["cell_col"] = np.where(inside, np.floor(np.nan_to_num(cols)), -1).astype(np.int64)
+        return chunk
+
+    def accumulate(self, chunk: pd.DataFrame) -> tuple:
+        """Sparse ``(cells, weights, values)`` totals of one chunk.
+
+        ``cells`` are the distinct flat cell indexes the chunk touches; the
+        other arrays hold their totals (``values`` is None without a value column).
+        """
+        lon = pd.to_numeric(chunk[self.lon_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        lat = pd.to_numeric(chunk[self.lat_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        values = None
+        if self.value_column:
+            values = pd.to_numeric(chunk[self.value_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        valid = ~(np.isnan(lon) | np.isnan(lat))
+        if values is not None:
+            valid &= ~np.isnan(values)
+            values = values[valid]
+        rows, cols = self.grid.cell_coordinates(lon[valid], lat[valid])
+        cells, weights, point = _splat(self.grid, rows, cols, self.interpolation)
+        cells, inverse = np.unique(cells, return_inverse=True)
+        totals = np.bincount(inverse, weights=weights, minlength=len(cells))
+        sums = np.bincount(inverse, weights=weights * values[point], minlength=len(cells)) if values is not None else None
+        return cells, totals, sums
+
+    def process(self, input_path: str, output_path: str, file_format: str = "csv",
+                chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1) -> int:
+        """Rasterize ``input_path`` into the ``.npy`` grid ``output_path``; return the row count.
+
+        ``file_format`` is ignored: rasters are always ``.npy`` arrays.
+        """
+        if workers > 1 and input_path.endswith(COMPRESSED_EXTENSIONS):
+            print(f"⚠️  {input_path} is compressed and cannot be partitioned; using 1 worker")
+            workers = 1
+        print(f"🗺️  Rasterizing {input_path} into a {self.grid.rows:,} x {self.grid.cols:,} grid "
+              f"of {self.grid.cell_size:g} m cells ({self.aggregate}, {self.interpolation})")
+        started = time.monotonic()
+        totals = np.zeros(self.grid.rows * self.grid.cols)
+        sums = np.zeros_like(totals) if self.value_column else None
+        rows = 0
+        if workers > 1:
+            # Partitions return sparse totals, so no full grid is pickled between processes
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                partitions = list(self.plan_partitions(input_path, chunk_size))
+                results = pool.map(_rasterize_partition, [self] * len(partitions),
+                                   [input_path] * len(partitions), partitions)
+                for part_rows, *partial in results:
+                    rows = self._add(totals, sums, rows + part_rows, *partial)
+        else:
+            for chunk in self.read_chunks(input_path, chunk_size):
+                rows = self._add(totals, sums, rows + len(chunk), *self.accumulate(chunk))
+        with span("process.write", dataset=self.DATASET_NAME, rows=rows):
+            self.write(output_path, totals, sums, rows)
+        print(f"✅ Saved raster to: {output_path} ({rows:,} rows in {time.monotonic() - started:,.1f}s)")
+        return rows
+
+    @staticmethod
+    def _add(totals: np.ndarray, sums: Optional[np.ndarray], rows: int, cells: np.ndarray,
+             part_totals: np.ndarray, part_sums: Optional[np.ndarray]) -> int:
+        """Scatter one chunk's sparse totals; ``rows`` is the running row count, returned as is"""
+        np.add.at(totals, cells, part_totals)
+        if sums is not None:
+            np.add.at(sums, cells, part_sums)
+        print(f"🧮 Rasterized {rows:,} rows")
+        return rows
+
+    def write(self, output_path: str, totals: np.ndarray, sums: Optional[np.ndarray], rows: int) -> None:
+        """Write the grid as a memory-mappable ``.npy`` file plus a ``.json`` sidecar"""
+        if self.aggregate == "count" or sums is None:
+            grid = totals
+        elif self.aggregate == "sum":
+            grid = sums
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                grid = np.where(totals > 0, sums / totals, np.nan)
+        dtype = "int64" if self.aggregate == "count" and self.interpolation != "bilinear" else "float64"
+        array = np.lib.format.open_memmap(output_path, mode="w+", dtype=dtype, shape=self.grid.shape)
+        array[:] = grid.reshape(self.grid.shape)
+        array.flush()
+        del array
+        info = {**self.grid.info(), "source_rows": rows, "aggregate": self.aggregate,
+                "value_column": self.value_column, "interpolation_method": self.interpolation}
+        with open(f"{os.path.splitext(output_path)[0]}.json", "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=4)
+
+    def add_arguments(self, parser):
+        parser.add_argument("--metadata", help="Metadata YAML whose map_algebra.raster_conversion block "
+                                               "sets the cell size and interpolation method")
+        parser.add_argument("--cell-size", type=float, help="Cell size in meters "
+                            f"(default: from --metadata, else {DEFAULT_CELL_SIZE:g})")
+        parser.add_argument("--interpolation", choices=INTERPOLATIONS,
+                            help="Interpolation method (default: from --metadata, else nearest neighbor)")
+        parser.add_argument("--bounds", type=float, nargs=4, default=NYC_BOUNDS,
+                            metavar=("WEST", "SOUTH", "EAST", "NORTH"),
+                            help="Grid extent in degrees (default: NYC; keep it equal across datasets)")
+        parser.add_argument("--lat", default="latitude", help="Latitude column")
+        parser.add_argument("--lon", default="longitude", help="Longitude column")
+        parser.add_argument("--value", help="Numeric column to aggregate (default: count points)")
+        parser.add_argument("--aggregate", choices=AGGREGATES, help="count, or sum/mean of --value")
+        parser.add_argument("--force", action="store_true",
+                            help="Rasterize even if the metadata says the dataset is not suitable")
+
+    def configure(self, args):
+        settings = raster_settings(args.metadata) if args.metadata else {}
+        if args.metadata and not settings.get("suitable_for_rasterization") and not args.force:
+            raise SystemExit(f"❌ {args.metadata} marks the dataset as not suitable for rasterization "
+                             "(use --force to rasterize anyway)")
+        cell_size = args.cell_size or parse_cell_size(settings.get("recommended_cell_size")) or DEFAULT_CELL_SIZE
+        interpolation = args.interpolation or (settings.get("interpolation_method") or "nearest neighbor").lower()
+        if interpolation not in INTERPOLATIONS:
+            print(f"⚠️  Unsupported interpolation method {interpolation!r}; using nearest neighbor")
+            interpolation = "nearest neighbor"
+        self.grid = RasterGrid(tuple(args.bounds), cell_size)
+        self.lat_column = args.lat
+        self.lon_column = args.lon
+        self.value_column = args.value
+        self.aggregate = args.aggregate or ("mean" if args.value else "count")
+        self.interpolation = interpolation
+
+
+def _rasterize_partition(processor: RasterProcessor, input_path: str, partition) -> tuple:
+    """Worker entry point: read and bin one partition"""
+    chunk = processor.read_partition(input_path, partition)
+    return (len(chunk), *processor.accumulate(chunk))
+
+
+def load_raster(path: str, like: Optional[dict] = None, mmap_mode: str = "r") -> tuple:
+    """Open a raster written by `RasterProcessor` as a memory map; return ``(array, info)``.
+
+    With ``like`` (the info of another raster), raise ``ValueError`` unless
+    both grids have the same bounds and cell size.
+    """
+    with open(f"{os.path.splitext(path)[0]}.json", encoding="utf-8") as f:
+        info = json.load(f)
+    if like is not None and (info["bounds"], info["cell_size"]) != (like["bounds"], like["cell_size"]):
+        raise ValueError(f"{path} is not on the same grid ({info['bounds']}, {info['cell_size']} m) "
+                         f"as the other raster ({like['bounds']}, {like['cell_size']} m)")
+    return np.load(path, mmap_mode=mmap_mode), info
+
+
+def main():
+    processor = RasterProcessor()
+    processor.run()
+
+if __name__ == "__main__":
+    main()
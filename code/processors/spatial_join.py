@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Spatial Join Processor
+
+Joins the rows of a (large) dataset with the features of another dataset by
+proximity, e.g. every vehicle collision with the speed humps within 50 m.
+
+The right-hand dataset is loaded once into a `GridIndex`: its points (or
+every vertex of its WKT geometries) are projected to meters around the
+center of the data, bucketed into square grid cells and sorted by cell, and
+the index is saved next to the data (`<right>.sidx.npz`) so later joins
+reuse it until the file changes. The left-hand dataset is then streamed in
+chunks like any processor; for each chunk, the cells around every point are
+looked up with `np.searchsorted` and all candidate pairs are checked at once
+with NumPy, so there is no Python loop over points.
+
+Modes:
+    nearest   one row per input row with the nearest feature within --distance
+    within    one row per (input row, feature) pair within --distance
+    count     one row per input row with the number of features within --distance
+
+Distances are in meters on a local equirectangular projection, which is
+accurate to well under a meter at city scale. For lines and polygons the
+distance is to their nearest vertex.
+
+Usage:
+    python spatial_join.py -i collisions.csv -o collisions_humps.csv --right speed_humps.csv --right-geom the_geom --right-id segmentid --distance 50
+    python spatial_join.py -i collisions.parquet -o collisions_humps.parquet --format parquet --right speed_humps_with_latlon.csv --mode count --workers 4
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from nyc_base_processor import NYCDataProcessor
+from wkt_geometry import parse_wkt_coordinates
+
+METERS_PER_DEGREE = 111320.0
+DEFAULT_DISTANCE = 50.0        # Meters
+MODES = ("nearest", "within", "count")
+INDEX_VERSION = 1
+_CELL_OFFSET = 2 ** 30         # Keeps cell coordinates positive when packed into one int64
+
+
+def _cell_keys(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+    """Pack integer cell coordinates into one sortable int64 key"""
+    return ((cx + _CELL_OFFSET) << 31) | (cy + _CELL_OFFSET)
+
+
+class GridIndex:
+    """Points bucketed into square cells of ``cell_size`` meters, sorted by cell.
+
+    ``features[i]`` is the feature (row of the indexed dataset) that point
+    ``i`` belongs to; ``ids`` holds the identifier of each feature.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, features: np.ndarray, ids: np.ndarray,
+                 cell_size: float, origin: tuple, source: Optional[dict] = None):
+        self.cell_size = float(cell_size)
+        self.origin = tuple(float(value) for value in origin)
+        self.ids = np.asarray(ids)
+        self.source = source or {}
+        keys = _cell_keys(*self._cells(x, y))
+        order = np.argsort(keys, kind="stable")
+        self.x, self.y, self.features = x[order], y[order], features[order]
+        self.cells, starts = np.unique(keys[order], return_index=True)
+        self.starts = np.append(starts, len(order)).astype(np.int64)
+
+    @classmethod
+    def from_lon_lat(cls, lon: np.ndarray, lat: np.ndarray, features: np.ndarray, ids: np.ndarray,
+                     cell_size: float, source: Optional[dict] = None) -> "GridIndex":
+        """Index lon/lat points, projected around the center of their bounding box"""
+        valid = ~(np.isnan(lon) | np.isnan(lat))
+        lon, lat, features = lon[valid], lat[valid], features[valid]
+        if len(lon) == 0:
+            raise ValueError("No coordinates to index")
+        origin = ((lon.min() + lon.max()) / 2, (lat.min() + lat.max()) / 2)
+        x, y = project(lon, lat, origin)
+        return cls(x, y, features, ids, cell_size, origin, source)
+
+    def _cells(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        return (np.floor(x / self.cell_size).astype(np.int64),
+                np.floor(y / self.cell_size).astype(np.int64))
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def save(self, path: str) -> None:
+        """Write the index as an ``.npz`` file (written atomically)"""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, version=INDEX_VERSION, x=self.x, y=self.y, features=self.features,
+                 ids=self.ids.astype(str), cell_size=self.cell_size, origin=np.array(self.origin),
+                 source=np.array([f"{key}={value}" for key, value in sorted(self.source.items())]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "GridIndex":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"Unsupported index version in {path}")
+            source = dict(item.split("=", 1) for item in data["source"].tolist())
+            # Points are stored sorted by cell, so rebuilding the cell table is one pass
+            return cls(data["x"], data["y"], data["features"], data["ids"],
+                       float(data["cell_size"]), tuple(data["origin"]), source)
+
+    def query_pairs(self, lon: np.ndarray, lat: np.ndarray, distance: float) -> tuple:
+        """All (query, feature) pairs closer than ``distance`` meters.
+
+        Returns ``(query, feature, meters)`` arrays with one entry per pair,
+        using the nearest vertex of each feature.
+        """
+        qx, qy = project(lon, lat, self.origin)
+        queries = np.flatnonzero(~(np.isnan(qx) | np.isnan(qy)))
+        qx, qy = qx[queries], qy[queries]
+        qcx, qcy = self._cells(qx, qy)
+        rings = int(np.ceil(distance / self.cell_size))
+
+        # Point ranges of every non-empty cell around every query
+        query_parts, start_parts, count_parts = [], [], []
+        for dx in range(-rings, rings + 1):
+            for dy in range(-rings, rings + 1):
+                keys = _cell_keys(qcx + dx, qcy + dy)
+                pos = np.searchsorted(self.cells, keys)
+                pos[pos == len(self.cells)] = 0
+                found = self.cells[pos] == keys if len(self.cells) else np.zeros(len(keys), bool)
+                query_parts.append(np.flatnonzero(found))
+                start_parts.append(self.starts[pos[found]])
+                count_parts.append(self.starts[pos[found] + 1] - self.starts[pos[found]])
+        candidate_query = np.concatenate(query_parts)
+        counts = np.concatenate(count_parts)
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+
+        # Expand each range into one candidate pair per point
+        pair_query = np.repeat(candidate_query, counts)
+        first_pair = np.cumsum(counts) - counts
+        points = np.repeat(np.concatenate(start_parts) - first_pair, counts) + np.arange(total)
+        meters = np.hypot(self.x[points] - qx[pair_query], self.y[points] - qy[pair_query])
+        close = meters <= distance
+        pair_query, features, meters = pair_query[close], self.features[points[close]], meters[close]
+
+        # Keep the nearest vertex of each (query, feature) pair
+        order = np.lexsort((meters, features, pair_query))
+        pair_query, features, meters = pair_query[order], features[order], meters[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (pair_query[1:] != pair_query[:-1]) | (features[1:] != features[:-1])
+        return queries[pair_query[first]], features[first], meters[first]
+
+    def nearest(self, lon: np.ndarray, lat: np.ndarray, distance: float) -> tuple:
+        """Nearest feature of every query within ``distance`` meters.
+
+        Returns ``(feature, meters)``; queries without one get -1 and NaN.
+        """
+        query, features, meters = self.query_pairs(lon, lat, distance)
+        nearest_feature = np.full(len(lon), -1, dtype=np.int64)
+        nearest_meters = np.full(len(lon), np.nan)
+        order = np.lexsort((meters, query))
+        query, features, meters = query[order], features[order], meters[order]
+        _, first = np.unique(query, return_index=True)
+        nearest_feature[query[first]] = features[first]
+        nearest_meters[query[first]] = meters[first]
+        return nearest_feature, nearest_meters
+
+
+def project(lon: np.ndarray, lat: np.ndarray, origin: tuple) -> tuple:
+    """Equirectangular projection of lon/lat to meters around ``origin``"""
+    lon0, lat0 = origin
+    x = (np.asarray(lon, dtype="float64") - lon0) * METERS_PER_DEGREE * np.cos(np.radians(lat0))
+    y = (np.asarray(lat, dtype="float64") - lat0) * METERS_PER_DEGREE
+    return x, y
+
+
+def _coordinates(chunk: pd.DataFrame, lat_column: str, lon_column: str) -> tuple:
+    return (pd.to_numeric(chunk[lon_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan),
+            pd.to_numeric(chunk[lat_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan))
+
+
+class SpatialJoinProcessor(NYCDataProcessor):
+    DATASET_NAME = "spatial join"
+
+    def __init__(self, index: Optional[GridIndex] = None, mode: str = "nearest",
+                 distance: float = DEFAULT_DISTANCE, lat_column: str = "latitude",
+                 lon_column: str = "longitude", prefix: str = "right_"):
+        self.index = index
+        self.mode = mode
+        self.distance = distance
+        self.lat_column = lat_column
+        self.lon_column = lon_column
+        self.prefix = prefix
+
+    def build_index(self, path: str, id_column: Optional[str] = None, lat_column: str = "latitude",
+                    lon_column: str = "longitude", geom_column: Optional[str] = None,
+                    cell_size: Optional[float] = None, index_path: Optional[str] = None) -> GridIndex:
+        """Index the dataset at ``path``, or load its saved index if it is up to date.
+
+        Points come from ``geom_column`` (every vertex of the WKT geometries)
+        or from ``lat_column``/``lon_column``. Features are identified by
+        ``id_column`` (default: their row number).
+        """
+        cell_size = cell_size or self.distance
+        index_path = index_path or f"{path}.sidx.npz"
+        stat = os.stat(path)
+        source = {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                  "id": id_column or "", "geometry": geom_column or f"{lon_column},{lat_column}",
+                  "cell_size": float(cell_size)}
+        expected = {key: str(value) for key, value in source.items()}
+        if os.path.exists(index_path):
+            index = GridIndex.load(index_path)
+            if index.source == expected:
+                print(f"📂 Loaded spatial index {index_path} ({len(index):,} points)")
+                self.index = index
+                return index
+
+        lon_parts, lat_parts, feature_parts, id_parts = [], [], [], []
+        rows = skipped = 0
+        for chunk in self.read_chunks(path):
+            ids = chunk[id_column].astype(str).to_numpy() if id_column else np.arange(rows, rows + len(chunk)).astype(str)
+            if geom_column:
+                # Missing or unparseable geometries have no vertices and are not indexed
+                x, y, offsets = parse_wkt_coordinates(chunk[geom_column])
+                features = np.repeat(np.arange(rows, rows + len(chunk)), np.diff(offsets))
+                skipped += int((np.diff(offsets) == 0).sum())
+            else:
+                x, y = _coordinates(chunk, lat_column, lon_column)
+                features = np.arange(rows, rows + len(chunk))
+                skipped += int((np.isnan(x) | np.isnan(y)).sum())
+            lon_parts.append(x)
+            lat_parts.append(y)
+            feature_parts.append(features)
+            id_parts.append(ids)
+            rows += len(chunk)
+        index = GridIndex.from_lon_lat(np.concatenate(lon_parts), np.concatenate(lat_parts),
+                                       np.concatenate(feature_parts), np.concatenate(id_parts),
+                                       cell_size, source)
+        index.save(index_path)
+        index.source = expected
+        print(f"🗂️  Built spatial index {index_path} ({rows:,} features, {len(index):,} points, "
+              f"{len(index.cells):,} cells of {cell_size:g} m)")
+        if skipped:
+            print(f"⚠️  Skipped {skipped:,} features without valid coordinates")
+        self.index = index
+        return index
+
+    def transform(self, chunk):
+        lon, lat = _coordinates(chunk, self.lat_column, self.lon_column)
+        if self.mode == "nearest":
+            features, meters = self.index.nearest(lon, lat, self.distance)
+            chunk[f"{self.prefix}id"] = pd.array(np.where(features >= 0, self.index.ids[features], None),
+                                                dtype="string")
+            chunk[f"{self.prefix}distance_m"] = meters
+            return chunk
+        query, features, meters = self.index.query_pairs(lon, lat, self.distance)
+        if self.mode == "count":
+            chunk[f"{self.prefix}count"] = np.bincount(query, minlength=len(chunk))
+            return chunk
+        joined = chunk.iloc[query].reset_index(drop=True)
+        joined[f"{self.prefix}id"] = self.index.ids[features]
+        joined[f"{self.prefix}distance_m"] = meters
+        return joined
+
+    def add_arguments(self, parser):
+        parser.add_argument("--right", required=True,
+                            help="Dataset to join with (CSV or Parquet); it is indexed in memory")
+        parser.add_argument("--right-id", help="Identifier column of the right dataset (default: row number)")
+        parser.add_argument("--right-geom",
+                            help="WKT geometry column of the right dataset (default: --right-lat/--right-lon)")
+        parser.add_argument("--right-lat", default="latitude", help="Latitude column of the right dataset")
+        parser.add_argument("--right-lon", default="longitude", help="Longitude column of the right dataset")
+        parser.add_argument("--lat", default="latitude", help="Latitude column of the input")
+        parser.add_argument("--lon", default="longitude", help="Longitude column of the input")
+        parser.add_argument("--mode", choices=MODES, default="nearest", help="Join mode (default: nearest)")
+        parser.add_argument("--distance", type=float, default=DEFAULT_DISTANCE,
+                            help=f"Maximum distance in meters (default: {DEFAULT_DISTANCE:g})")
+        parser.add_argument("--cell-size", type=float,
+                            help="Index cell size in meters (default: --distance)")
+        parser.add_argument("--index", help="Index file (default: <right>.sidx.npz)")
+        parser.add_argument("--prefix", default="right_", help="Prefix of the added columns")
+
+    def configure(self, args):
+        self.mode = args.mode
+        self.distance = args.distance
+        self.lat_column = args.lat
+        self.lon_column = args.lon
+        self.prefix = args.prefix
+        self.build_index(args.right, args.right_id, args.right_lat, args.right_lon, args.right_geom,
+                         args.cell_size, args.index)
+
+
+def main():
+    processor = SpatialJoinProcessor()
+    processor.run()
+
+if __name__ == "__main__":
+    main()
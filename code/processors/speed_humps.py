@@ -3,34 +3,60 @@
 Speed Humps Post-Processor
 
 This script reads the raw speed humps dataset and adds `latitude` and `longitude` columns
-extracted from the `the_geom` WKT field. Saves the result to a new CSV file.
+extracted from the `the_geom` WKT field. Saves the result to a new CSV or Parquet file.
+The input is processed in chunks, so memory use does not depend on the file size.
 
 Usage:
     python processor_speed_humps.py -i ../downloaders/data/speed_humps.csv -o ../downloaders/data/speed_humps_with_latlon.csv
+    python processor_speed_humps.py -i ../downloaders/data/speed_humps.parquet -o ../downloaders/data/speed_humps_with_latlon.parquet --format parquet
 """
 
-import pandas as pd
 import re
-import argparse
+from nyc_base_processor import NYCDataProcessor
+from wkt_geometry import geometry_columns
 
 def extract_lat_lon(geom):
-    """Extract (longitude, latitude) from WKT POINT or MULTIPOLYGON string"""
+    """Extract (longitude, latitude) from a single WKT string.
+
+    Scalar reference version; use `wkt_geometry.geometry_columns` on whole columns.
+    """
     if isinstance(geom, str):
         match = re.search(r"\(\((-?\d+\.\d+) (-?\d+\.\d+)", geom)
         if match:
             return float(match.group(1)), float(match.group(2))
     return None, None
 
-def main(input_path, output_path):
-    df = pd.read_csv(input_path)
-    df[['longitude', 'latitude']] = df['the_geom'].apply(lambda x: pd.Series(extract_lat_lon(x)))
-    df.to_csv(output_path, index=False)
-    print(f"✅ Saved processed dataset with lat/lon to: {output_path}")
+class SpeedHumpsProcessor(NYCDataProcessor):
+    DATASET_NAME = "DOT Speed Humps"
+    # Text and ID columns are often empty for a whole chunk; keep them as text in
+    # every chunk so Parquet output has one schema. Both the Socrata names and the
+    # shapefile-style names of data_profiles/speed_humps.json are listed.
+    COLUMN_TYPES = {column: "string" for column in (
+        "the_geom", "segmentid", "onstreet", "fromstreet", "tostreet", "boro", "date_installed",
+        "OBJECTID", "on_street", "from_stree", "to_street", "date_insta")}
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process Speed Humps CSV to extract lat/lon.")
-    parser.add_argument("-i", "--input", required=True, help="Path to the input CSV file.")
-    parser.add_argument("-o", "--output", required=True, help="Path to the output CSV file.")
-    args = parser.parse_args()
+    def __init__(self, centroid=False, bbox=False):
+        self.centroid = centroid
+        self.bbox = bbox
+
+    def transform(self, chunk):
+        coords = geometry_columns(chunk['the_geom'], centroid=self.centroid, bbox=self.bbox)
+        chunk[coords.columns] = coords
+        return chunk
+
+    def add_arguments(self, parser):
+        parser.add_argument("--centroid", action="store_true",
+                            help="Also add centroid_lon/centroid_lat (mean of each geometry's vertices).")
+        parser.add_argument("--bbox", action="store_true",
+                            help="Also add min_lon/min_lat/max_lon/max_lat bounding box columns.")
 
-    main(args.input, args.output)
\ No newline at end of file
+    def configure(self, args):
+        self.centroid = args.centroid
+        self.bbox = args.bbox
+
+def main():
+    processor = SpeedHumpsProcessor()
+    processor.run()
+
+if __name__ == "__main__":
+    main()
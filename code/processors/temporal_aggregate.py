@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Temporal Aggregation Processor
+
+Puts datasets on a shared time axis: the rows of a file are counted (and
+optional value columns summed) per time bucket of an hour, a day or a week,
+optionally per grid cell (the same cells as `rasterize.py`) and per
+category columns. The result is a compact pre-aggregated table with one row
+per bucket and group, e.g. 311 requests, collisions and traffic volume
+counts per day and 500 m cell, which `align_aggregates` joins on the
+bucket (and cell) columns.
+
+Timestamps are parsed in bulk for the whole chunk, from one column
+(`--time`, default: `temporal.time_column` of `--metadata`) or from date
+part columns such as `Yr M D HH MM` in the traffic volume counts
+(`--time-parts`). Buckets start on whole hours, midnight or Monday midnight,
+so every dataset gets the same bucket boundaries.
+
+Each chunk (or partition with `--workers`) is reduced to a partial
+aggregate of counts, sums, minimums and maximums. Partial aggregates merge
+by summing and taking the minimum and maximum per group, in any order, so
+partitions are aggregated in parallel and combined at the end; memory
+depends on the number of groups, not on the size of the file.
+
+Usage:
+    python temporal_aggregate.py -i NYC_311.csv -o 311_daily.parquet --format parquet --metadata ../../metadata/NYC_311.yaml --resolution day --group-by complaint_type
+    python temporal_aggregate.py -i collisions.csv -o collisions_hourly_cells.csv --time crash_date --resolution hour --cell-size 500 --value number_of_persons_injured
+    python temporal_aggregate.py -i traffic_volume_counts.csv -o traffic_weekly.csv --time-parts Yr M D HH MM --resolution week --value Vol --group-by Boro --workers 4
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from nyc_base_processor import DEFAULT_CHUNK_SIZE, COMPRESSED_EXTENSIONS, ChunkWriter, NYCDataProcessor
+from rasterize import NYC_BOUNDS, RasterGrid
+from stage_metrics import span
+
+RESOLUTIONS = ("hour", "day", "week")
+BUCKET_COLUMN = "bucket"
+MERGE_EVERY = 16               # Partial aggregates kept before they are merged
+# Date part columns for --time-parts, in the order pandas expects them
+TIME_PARTS = ("year", "month", "day", "hour", "minute", "second")
+TIME_ZONE = "America/New_York"
+
+
+def parse_times(chunk: pd.DataFrame, time_column: Optional[str] = None, time_parts: Optional[list] = None,
+                time_format: Optional[str] = None) -> pd.Series:
+    """Parse the timestamps of a chunk in bulk; unparseable values give NaT.
+
+    Time zone aware timestamps are converted to New York time and made naive
+    like Socrata's floating timestamps, so all datasets share one time axis.
+    """
+    if time_parts:
+        parts = {name: pd.to_numeric(chunk[column], errors="coerce")
+                 for name, column in zip(TIME_PARTS, time_parts)}
+        times = pd.to_datetime(pd.DataFrame(parts, index=chunk.index), errors="coerce")
+    else:
+        times = pd.to_datetime(chunk[time_column], format=time_format or "ISO8601", errors="coerce")
+    if getattr(times.dt, "tz", None) is not None:
+        times = times.dt.tz_convert(TIME_ZONE).dt.tz_localize(None)
+    return times
+
+
+def bucket_times(times: pd.Series, resolution: str) -> pd.Series:
+    """Start of the hour, day or week (from Monday) of each timestamp"""
+    if resolution == "hour":
+        return times.dt.floor("h")
+    days = times.dt.floor("D")
+    if resolution == "week":
+        return days - pd.to_timedelta(days.dt.dayofweek, unit="D")
+    return days
+
+
+def partial_aggregate(frame: pd.DataFrame, keys: list, values: list) -> pd.DataFrame:
+    """Counts, and sums/non-null counts/minimums/maximums of ``values``, per group of ``keys``"""
+    aggregations = {"count": (keys[0], "size")}
+    for value in values:
+        aggregations.update({f"{value}_sum": (value, "sum"), f"{value}_count": (value, "count"),
+                             f"{value}_min": (value, "min"), f"{value}_max": (value, "max")})
+    return frame.groupby(keys, sort=False, observed=True).agg(**aggregations).reset_index()
+
+
+def merge_partials(partials: list, keys: list, values: list) -> pd.DataFrame:
+    """Combine partial aggregates of any partitions into one"""
+    non_empty = [partial for partial in partials if not partial.empty]
+    if not non_empty:
+        return partials[0] if partials else partial_aggregate(pd.DataFrame(columns=keys + values), keys, values)
+    partials = non_empty
+    if len(partials) == 1:
+        return partials[0]
+    combined = pd.concat(partials, ignore_index=True)
+    aggregations = {"count": "sum"}
+    for value in values:
+        aggregations.update({f"{value}_sum": "sum", f"{value}_count": "sum",
+                             f"{value}_min": "min", f"{value}_max": "max"})
+    return combined.groupby(keys, sort=False, observed=True).agg(aggregations).reset_index()
+
+
+def finalize(partial: pd.DataFrame, keys: list, values: list) -> pd.DataFrame:
+    """Add ``<value>_mean`` columns and sort by the group keys"""
+    result = partial.copy()
+    for value in values:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[f"{value}_mean"] = result[f"{value}_sum"] / result[f"{value}_count"].replace(0, np.nan)
+    return result.sort_values(keys, kind="stable", ignore_index=True)
+
+
+def align_aggregates(tables: dict, on: Optional[list] = None) -> pd.DataFrame:
+    """Outer-join aggregated tables (name -> DataFrame or path) on their shared keys.
+
+    The other columns get the table name as a prefix, e.g. ``311_count`` and
+    ``collisions_count``; groups missing from a table get NaN.
+    """
+    frames = {name: pd.read_parquet(table) if isinstance(table, str) and table.endswith(".parquet")
+              else pd.read_csv(table, parse_dates=[BUCKET_COLUMN]) if isinstance(table, str) else table
+              for name, table in tables.items()}
+    on = on or [BUCKET_COLUMN] + [column for column in ("cell_row", "cell_col")
+                                  if all(column in frame for frame in frames.values())]
+    aligned = None
+    for name, frame in frames.items():
+        frame = frame.rename(columns={column: f"{name}_{column}" for column in frame.columns if column not in on})
+        aligned = frame if aligned is None else aligned.merge(frame, on=on, how="outer")
+    return aligned.sort_values(on, ignore_index=True)
+
+
+class TemporalAggregateProcessor(NYCDataProcessor):
+    DATASET_NAME = "temporal aggregation"
+
+    def __init__(self, time_column: Optional[str] = None, time_parts: Optional[list] = None,
+                 time_format: Optional[str] = None, resolution: str = "day",
+                 grid: Optional[RasterGrid] = None, group_by: Optional[list] = None,
+                 values: Optional[list] = None, lat_column: str = "latitude", lon_column: str = "longitude"):
+        self.time_column = time_column
+        self.time_parts = time_parts
+        self.time_format = time_format
+        self.resolution = resolution
+        self.grid = grid
+        self.group_by = group_by or []
+        self.values = values or []
+        self.lat_column = lat_column
+        self.lon_column = lon_column
+
+    @property
+    def keys(self) -> list:
+        return [BUCKET_COLUMN] + (["cell_row", "cell_col"] if self.grid else []) + self.group_by
+
+    def transform(self, chunk):
+        """Reduce a chunk to its partial aggregate"""
+        frame = pd.DataFrame({BUCKET_COLUMN: bucket_times(
+            parse_times(chunk, self.time_column, self.time_parts, self.time_format), self.resolution)},
+            index=chunk.index)
+        if self.grid:
+            lon = pd.to_numeric(chunk[self.lon_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            lat = pd.to_numeric(chunk[self.lat_column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            rows, cols = self.grid.cell_coordinates(lon, lat)
+            with np.errstate(invalid="ignore"):
+                inside = (rows >= 0) & (rows < self.grid.rows) & (cols >= 0) & (cols < self.grid.cols)
+            frame["cell_row"] = np.floor(np.where(inside, rows, np.nan))
+            frame["cell_col"] = np.floor(np.where(inside, cols, np.nan))
+        for column in self.group_by:
+            frame[column] = chunk[column].astype("string").fillna("")
+        for value in self.values:
+            frame[value] = pd.to_numeric(chunk[value], errors="coerce")
+        frame = frame.dropna(subset=[key for key in self.keys if key not in self.group_by])
+        if self.grid:
+            frame = frame.astype({"cell_row": "int64", "cell_col": "int64"})
+        return partial_aggregate(frame, self.keys, self.values)
+
+    def process(self, input_path: str, output_path: str, file_format: str = "csv",
+                chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1) -> int:
+        """Aggregate ``input_path`` into the table ``output_path``; return the input row count"""
+        if workers > 1 and input_path.endswith(COMPRESSED_EXTENSIONS):
+            print(f"⚠️  {input_path} is compressed and cannot be partitioned; using 1 worker")
+            workers = 1
+        print(f"⏱️  Aggregating {input_path} per {self.resolution} by {', '.join(self.keys)}")
+        started = time.monotonic()
+        partials, rows = [], 0
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                partitions = list(self.plan_partitions(input_path, chunk_size))
+                results = pool.map(_aggregate_partition, [self] * len(partitions),
+                                   [input_path] * len(partitions), partitions)
+                for part_rows, partial in results:
+                    rows = self._add(partials, rows + part_rows, partial)
+        else:
+            for chunk in self.read_chunks(input_path, chunk_size):
+                rows = self._add(partials, rows + len(chunk), self.transform(chunk))
+        result = finalize(merge_partials(partials, self.keys, self.values), self.keys, self.values)
+        with span("process.write", dataset=self.DATASET_NAME, rows=len(result)):
+            writer = ChunkWriter(output_path, file_format)
+            try:
+                writer.write(result)
+            finally:
+                writer.close()
+        print(f"✅ Saved {len(result):,} aggregated rows to: {output_path} "
+              f"({rows:,} rows in {time.monotonic() - started:,.1f}s)")
+        return rows
+
+    def _add(self, partials: list, rows: int, partial: pd.DataFrame) -> int:
+        """Keep ``partial``, merging the kept ones every ``MERGE_EVERY``; return ``rows``"""
+        partials.append(partial)
+        if len(partials) >= MERGE_EVERY:
+            partials[:] = [merge_partials(partials, self.keys, self.values)]
+        print(f"🧮 Aggregated {rows:,} rows")
+        return rows
+
+    def add_arguments(self, parser):
+        parser.add_argument("--metadata", help="Metadata YAML whose temporal.time_column is the default --time")
+        parser.add_argument("--time", help="Timestamp column")
+        parser.add_argument("--time-parts", nargs="+", metavar="COLUMN",
+                            help="Year, month, day[, hour, minute, second] columns (e.g. Yr M D HH MM)")
+        parser.add_argument("--time-format", help="strftime format of --time (default: ISO 8601)")
+        parser.add_argument("--resolution", choices=RESOLUTIONS, default="day",
+                            help="Time bucket size (default: day)")
+        parser.add_argument("--cell-size", type=float,
+                            help="Also group by grid cells of this size in meters (same grid as rasterize.py)")
+        parser.add_argument("--bounds", type=float, nargs=4, default=NYC_BOUNDS,
+                            metavar=("WEST", "SOUTH", "EAST", "NORTH"), help="Grid extent (default: NYC)")
+        parser.add_argument("--lat", default="latitude", help="Latitude column (with --cell-size)")
+        parser.add_argument("--lon", default="longitude", help="Longitude column (with --cell-size)")
+        parser.add_argument("--group-by", nargs="+", default=[], metavar="COLUMN", help="Category columns")
+        parser.add_argument("--value", nargs="+", default=[], metavar="COLUMN",
+                            help="Numeric columns to sum/min/max/mean per group")
+
+    def configure(self, args):
+        time_column = args.time
+        if not time_column and not args.time_parts and args.metadata:
+            import yaml
+            with open(args.metadata, encoding="utf-8") as f:
+                time_column = ((yaml.safe_load(f) or {}).get("temporal") or {}).get("time_column")
+        if not time_column and not args.time_parts:
+            raise SystemExit("❌ No time column: use --time, --time-parts or a --metadata file with temporal.time_column")
+        if args.time_parts and not 3 <= len(args.time_parts) <= len(TIME_PARTS):
+            raise SystemExit("❌ --time-parts needs year, month and day columns (and optionally hour, minute, second)")
+        self.time_column = time_column
+        self.time_parts = args.time_parts
+        self.time_format = args.time_format
+        self.resolution = args.resolution
+        self.grid = RasterGrid(tuple(args.bounds), args.cell_size) if args.cell_size else None
+        self.group_by = args.group_by
+        self.values = args.value
+        self.lat_column = args.lat
+        self.lon_column = args.lon
+
+
+def _aggregate_partition(processor: TemporalAggregateProcessor, input_path: str, partition) -> tuple:
+    """Worker entry point: read and aggregate one partition"""
+    chunk = processor.read_partition(input_path, partition)
+    return len(chunk), processor.transform(chunk)
+
+
+def main():
+    processor = TemporalAggregateProcessor()
+    processor.run()
+
+if __name__ == "__main__":
+    main()
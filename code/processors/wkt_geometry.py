@@ -0,0 +1,146 @@
+"""
+Vectorized WKT Geometry Helpers
+
+Bulk versions of `extract_lat_lon` for pandas Series of WKT strings
+(POINT, LINESTRING, MULTILINESTRING, POLYGON, MULTIPOLYGON, ...).
+
+Instead of one regex call and one `pd.Series` per row, every coordinate in the
+column is parsed into flat NumPy arrays in a single pass, with an offsets
+array marking where each geometry starts. Per-geometry values (first vertex,
+vertex centroid, bounding box) are then computed with NumPy reductions.
+
+Usage:
+    from wkt_geometry import geometry_columns
+    df = df.join(geometry_columns(df['the_geom'], centroid=True, bbox=True))
+"""
+
+import re
+import string
+
+import numpy as np
+import pandas as pd
+
+# Characters that are not part of a number (geometry keywords, parentheses,
+# commas) are replaced by spaces. "e"/"E" are kept for exponents, so keyword
+# letters leave single "E" tokens behind, which are dropped.
+_NON_NUMERIC = str.maketrans({char: " " for char in string.ascii_letters + "(),;=\t\r\n" if char not in "eE"})
+# Slower tokenizer for columns the fast path cannot parse: a number or the
+# "|" row separator, skipping anything else
+_TOKEN = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|\|")
+# An EWKT "SRID=...;" prefix at the start of a row
+_SRID_PREFIX = re.compile(r"(^|\|)\s*SRID=\d+;", re.IGNORECASE)
+# The Z, M or ZM tag of a geometry, e.g. "POINT Z (" or "LINESTRINGM("
+_DIMENSION_TAG = re.compile(r"^\s*(?:SRID=\d+;)?\s*[A-Za-z]+?\s*(ZM|Z|M)?\s*\(", re.IGNORECASE)
+_DIMENSIONS = {"Z": 3, "M": 3, "ZM": 4}
+
+
+def _coordinate_dimensions(strings: list, text: str) -> np.ndarray:
+    """Number of values per vertex of each row: 2, or 3/4 for Z, M and ZM geometries"""
+    upper = text.upper()
+    if not any(tag in upper for tag in ("Z(", "Z (", "M(", "M (")):
+        return np.full(len(strings), 2, dtype=np.int64)
+    tags = pd.Series(strings, dtype=object).str.extract(_DIMENSION_TAG, expand=False)
+    return tags.str.upper().map(_DIMENSIONS).fillna(2).to_numpy(dtype=np.int64)
+
+
+def _join_rows(strings: list) -> str:
+    """One string with a "|" after each row and the EWKT SRID prefixes removed"""
+    text = " | ".join(strings) + " |"
+    if "SRID" in text.upper():
+        text = _SRID_PREFIX.sub(r"\1", text)
+    return text
+
+
+def _parse_tokens(tokens: list, rows: int) -> tuple:
+    """Values and number of values per row of a token list with one "|" after each row"""
+    is_separator = np.fromiter((token == "|" for token in tokens), dtype=bool, count=len(tokens))
+    if is_separator.sum() != rows:
+        raise ValueError("A geometry contains the '|' separator")
+    # Number of coordinate values before each row's separator
+    ends = np.flatnonzero(is_separator) - np.arange(rows)
+    values = np.fromiter(map(float, (token for token in tokens if token != "|")),
+                         dtype="float64", count=len(tokens) - rows)
+    return values, np.diff(ends, prepend=0)
+
+
+def parse_wkt_coordinates(geoms: pd.Series) -> tuple:
+    """Parse every vertex of a Series of WKT (or EWKT) strings into NumPy arrays.
+
+    Returns ``(x, y, offsets)`` where the vertices of geometry ``i`` are
+    ``x[offsets[i]:offsets[i + 1]]`` and ``y[offsets[i]:offsets[i + 1]]``.
+    Only x/y are kept from Z, M and ZM geometries. Missing and unparseable
+    geometries (e.g. a number of values that does not fit the dimension) have
+    no vertices.
+
+    The whole column is joined into one string with a ``|`` separator after
+    each row, cleaned with a single ``str.translate`` and split once; no
+    regex or pandas object is created per row. Columns with tokens that are
+    not numbers fall back to one regex pass over the joined string.
+    """
+    if geoms.empty:
+        empty = np.empty(0, dtype="float64")
+        return empty, empty, np.zeros(1, dtype=np.int64)
+    strings = geoms.where(geoms.notna(), "").astype(str).tolist()
+    text = _join_rows(strings)
+    tokens = [token for token in text.translate(_NON_NUMERIC).split() if token not in ("E", "e")]
+    try:
+        values, counts = _parse_tokens(tokens, len(geoms))
+    except ValueError:
+        text = _join_rows([value.replace("|", " ") for value in strings])
+        values, counts = _parse_tokens(_TOKEN.findall(text), len(geoms))
+    dims = _coordinate_dimensions(strings, text)
+    valid = counts % dims == 0
+    if not valid.all() or (dims > 2).any():
+        # Drop the values of unparseable rows and the z/m values of the others
+        rows = np.repeat(np.arange(len(geoms)), counts)
+        position = np.arange(len(values)) - np.repeat(np.cumsum(counts) - counts, counts)
+        values = values[valid[rows] & (position % dims[rows] < 2)]
+        counts = np.where(valid, counts // dims * 2, 0)
+    offsets = np.zeros(len(geoms) + 1, dtype=np.int64)
+    np.cumsum(counts // 2, out=offsets[1:])
+    return values[0::2], values[1::2], offsets
+
+
+def first_vertex(geoms: pd.Series) -> pd.DataFrame:
+    """Vectorized `extract_lat_lon`: the first (longitude, latitude) of each geometry.
+
+    Missing or unparseable geometries give NaN.
+    """
+    return geometry_columns(geoms)
+
+
+def geometry_columns(geoms: pd.Series, centroid: bool = False, bbox: bool = False) -> pd.DataFrame:
+    """Compute float coordinate columns for a Series of WKT geometries.
+
+    Always returns ``longitude``/``latitude`` (the first vertex, as in
+    `extract_lat_lon`). With ``centroid``, adds ``centroid_lon``/``centroid_lat``
+    (the mean of the vertices); with ``bbox``, adds ``min_lon``, ``min_lat``,
+    ``max_lon`` and ``max_lat``. Geometries without vertices give NaN.
+    """
+    x, y, offsets = parse_wkt_coordinates(geoms)
+    counts = np.diff(offsets)
+    has_vertices = counts > 0
+    starts = offsets[:-1][has_vertices]
+
+    def reduce(ufunc, values):
+        out = np.full(len(counts), np.nan)
+        if len(starts):
+            out[has_vertices] = ufunc.reduceat(values, starts)
+        return out
+
+    def first(values):
+        out = np.full(len(counts), np.nan)
+        out[has_vertices] = values[starts]
+        return out
+
+    result = pd.DataFrame({"longitude": first(x), "latitude": first(y)}, index=geoms.index)
+    if centroid:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["centroid_lon"] = reduce(np.add, x) / counts
+            result["centroid_lat"] = reduce(np.add, y) / counts
+    if bbox:
+        result["min_lon"] = reduce(np.minimum, x)
+        result["min_lat"] = reduce(np.minimum, y)
+        result["max_lon"] = reduce(np.maximum, x)
+        result["max_lat"] = reduce(np.maximum, y)
+    return result
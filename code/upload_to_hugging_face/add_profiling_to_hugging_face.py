@@ -1,43 +1,72 @@
 import argparse
 import json
-import pandas as pd
 from huggingface_hub import HfApi, login, hf_hub_download
-import datamart_profiler  # Import datamart-profiler
+from profile_cache import PROFILE_SAMPLE_BYTES, get_or_create_profile, load_cached_profile
+from sampled_profiler import DEFAULT_SAMPLE_ROWS
 
 # Parse command-line arguments
 parser = argparse.ArgumentParser(description="Generate and add profiling JSON to an existing Hugging Face dataset repository")
 parser.add_argument("--token", required=True, help="Hugging Face token")
 parser.add_argument("--repo_id", required=True, help="Hugging Face repository ID (e.g., 'oscur/pluto')")
 parser.add_argument("--csv_filename", required=True, help="Name of the CSV file in the repository")
+parser.add_argument("--profile_sample_bytes", type=int, default=None,
+                    help="Only profile this many bytes of the CSV, e.g. "
+                         f"{PROFILE_SAMPLE_BYTES} to reuse the profile cached by upload_csv_hugging_face.py "
+                         "(default: the full file)")
+parser.add_argument("--profiler", choices=["datamart", "sampled"], default="datamart",
+                    help="Profile with datamart-profiler, or with the reservoir-sampled parallel profiler for very large CSVs (default: datamart)")
+parser.add_argument("--sample_rows", type=int, default=DEFAULT_SAMPLE_ROWS,
+                    help=f"Rows sampled by the sampled profiler, 0 for all rows (default: {DEFAULT_SAMPLE_ROWS})")
+parser.add_argument("--workers", type=int, default=None,
+                    help="Processes used by the sampled profiler (default: one per CPU)")
 args = parser.parse_args()
 
 # Use the arguments
 token_value = args.token
 repo_id = args.repo_id
 csv_filename = args.csv_filename
+profile_options = dict(load_max_size=args.profile_sample_bytes, include_sample=True, plots=True,
+                       engine=args.profiler, sample_rows=args.sample_rows or None)
 
 # Login to Hugging Face
 login(token=token_value)
 api = HfApi()
 
-# Download the CSV file from the Hugging Face repository
+# Files stored with Git LFS expose the SHA-256 of their content, which keys
+# the local profile cache: a CSV profiled before is neither downloaded nor
+# profiled again
+profile = None
+remote_sha256 = None
 try:
-    csv_path = hf_hub_download(repo_id=repo_id, filename=csv_filename, repo_type="dataset")
-    print(f"CSV file '{csv_filename}' has been downloaded from the repository.")
-except Exception as e_download:
-    print(f"An error occurred while downloading the CSV file: {e_download}")
-    exit(1)
+    file_info = api.get_paths_info(repo_id, [csv_filename], repo_type="dataset")[0]
+    if file_info.lfs is not None:
+        remote_sha256 = file_info.lfs.sha256
+        profile = load_cached_profile(remote_sha256, **profile_options)
+except Exception as e_info:
+    print(f"Could not read the file metadata from the repository: {e_info}")
 
-# Generate the profiling JSON
-try:
-    df_data = pd.read_csv(csv_path)
-    profile = datamart_profiler.process_dataset(csv_path, include_sample=True, plots=True)
-    profile_json = json.dumps(profile, indent=4)
-    profile_filename = "profiling_metadata.json"
-    print(f"Profiling JSON data has been generated.")
-except Exception as e_profile:
-    print(f"An error occurred while generating the profiling JSON: {e_profile}")
-    exit(1)
+if profile is not None:
+    print(f"Reusing the cached profile of '{csv_filename}' (sha256 {remote_sha256[:12]}).")
+else:
+    # Download the CSV file from the Hugging Face repository
+    try:
+        csv_path = hf_hub_download(repo_id=repo_id, filename=csv_filename, repo_type="dataset")
+        print(f"CSV file '{csv_filename}' has been downloaded from the repository.")
+    except Exception as e_download:
+        print(f"An error occurred while downloading the CSV file: {e_download}")
+        exit(1)
+
+    # Generate the profiling JSON
+    try:
+        profile = get_or_create_profile(csv_path, sha256=remote_sha256, workers=args.workers,
+                                        **profile_options)
+        print(f"Profiling JSON data has been generated.")
+    except Exception as e_profile:
+        print(f"An error occurred while generating the profiling JSON: {e_profile}")
+        exit(1)
+
+profile_json = json.dumps(profile, indent=4)
+profile_filename = "profiling_metadata.json"
 
 # Upload the profiling JSON data to the repository
 try:
@@ -61,4 +90,6 @@ except Exception as e_upload:
 # python add_profiling_to_hugging_face.py --token <your_token> --repo_id <your_repo_id> --csv_filename <your_csv_filename>
 # Example usage:                
 # python add_profiling_to_hugging_face.py --token <your_token> --repo_id oscur/taxisvis1M --csv_filename taxisvis1M.csv
+# For very large CSVs, profile a reservoir sample with one process per column:
+# python add_profiling_to_hugging_face.py --token <your_token> --repo_id oscur/taxisvis1M --csv_filename taxisvis1M.csv --profiler sampled --sample_rows 50000
 ###############################################################################
\ No newline at end of file
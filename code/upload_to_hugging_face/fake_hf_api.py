@@ -0,0 +1,174 @@
+"""
+Local Fake of the Hugging Face HfApi
+
+An offline stand-in for `huggingface_hub.HfApi` that keeps repositories in a
+local folder, so the upload scripts can be exercised without a network or a
+token. It implements the subset of the API the scripts use: `create_repo`,
+`create_commit` (with `CommitOperationAdd`/`CommitOperationDelete`),
+`upload_file`, `list_repo_tree`, `get_paths_info`, `file_exists` and
+`hf_hub_download`. Listings return real `RepoFile`/`RepoFolder` objects.
+
+Like the Hub, file contents are stored once by hash: adding a file whose
+content is already stored transfers nothing. Files with an LFS extension (or
+of 10 MB and more) get LFS metadata with their SHA-256; other files only have
+their git blob id. Every commit and the number of bytes transferred are
+recorded in `commits` and `transferred_bytes`.
+
+Usage:
+    from fake_hf_api import FakeHfApi
+    api = FakeHfApi("/tmp/fake_hub")
+    api.create_repo("oscur/test", repo_type="dataset", exist_ok=True)
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+from typing import Optional
+
+from huggingface_hub import CommitOperationAdd, CommitOperationDelete
+from huggingface_hub.hf_api import CommitInfo, RepoFile, RepoFolder
+
+from parquet_shards import git_blob_sha1
+
+LFS_EXTENSIONS = (".parquet", ".arrow", ".zst", ".gz", ".zip", ".bin")
+LFS_MIN_SIZE = 10 * 1024 * 1024
+
+
+def _read(path_or_fileobj) -> bytes:
+    if isinstance(path_or_fileobj, bytes):
+        return path_or_fileobj
+    if isinstance(path_or_fileobj, (str, os.PathLike)):
+        with open(path_or_fileobj, "rb") as f:
+            return f.read()
+    return path_or_fileobj.read()
+
+
+class FakeHfApi:
+    """Keep Hub repositories in ``root`` instead of on huggingface.co"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.commits = []
+        self.transferred_bytes = 0
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def _repo_index_path(self, repo_id: str, repo_type: Optional[str]) -> str:
+        return os.path.join(self.root, f"{repo_type or 'model'}s", repo_id, "index.json")
+
+    def _load_index(self, repo_id: str, repo_type: Optional[str]) -> dict:
+        path = self._repo_index_path(repo_id, repo_type)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Repository '{repo_id}' ({repo_type or 'model'}) not found in the fake Hub")
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self, repo_id: str, repo_type: Optional[str], index: dict) -> None:
+        path = self._repo_index_path(repo_id, repo_type)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+
+    def create_repo(self, repo_id: str, *, repo_type: Optional[str] = None, exist_ok: bool = False, **kwargs) -> str:
+        path = self._repo_index_path(repo_id, repo_type)
+        if os.path.exists(path):
+            if not exist_ok:
+                raise FileExistsError(f"Repository '{repo_id}' already exists")
+        else:
+            self._save_index(repo_id, repo_type, {"files": {}, "commits": 0})
+        return f"fake://{repo_type or 'model'}s/{repo_id}"
+
+    def create_commit(self, repo_id: str, operations, *, commit_message: str,
+                      repo_type: Optional[str] = None, **kwargs) -> CommitInfo:
+        index = self._load_index(repo_id, repo_type)
+        files = index["files"]
+        added, deleted, transferred = [], [], 0
+        for operation in operations:
+            if isinstance(operation, CommitOperationAdd):
+                data = _read(operation.path_or_fileobj)
+                sha256 = hashlib.sha256(data).hexdigest()
+                object_path = os.path.join(self.objects_dir, sha256)
+                if not os.path.exists(object_path):
+                    with open(object_path, "wb") as f:
+                        f.write(data)
+                    transferred += len(data)
+                files[operation.path_in_repo] = {"sha256": sha256, "size": len(data),
+                                                 "blob_id": git_blob_sha1(data)}
+                added.append(operation.path_in_repo)
+            elif isinstance(operation, CommitOperationDelete):
+                prefix = operation.path_in_repo.rstrip("/") + "/"
+                for path in list(files):
+                    if path == operation.path_in_repo or path.startswith(prefix):
+                        del files[path]
+                        deleted.append(path)
+            else:
+                raise TypeError(f"Unsupported commit operation: {operation!r}")
+        index["commits"] += 1
+        oid = hashlib.sha1(f"{repo_id}:{index['commits']}".encode()).hexdigest()
+        self._save_index(repo_id, repo_type, index)
+        self.transferred_bytes += transferred
+        self.commits.append({"repo_id": repo_id, "message": commit_message, "added": added,
+                             "deleted": deleted, "transferred_bytes": transferred})
+        # A Hub-shaped URL, since CommitInfo parses it; nothing is fetched
+        repo_url = f"https://huggingface.co/{'datasets/' if repo_type == 'dataset' else ''}{repo_id}"
+        return CommitInfo(commit_url=f"{repo_url}/commit/{oid}", commit_message=commit_message,
+                          commit_description="", oid=oid)
+
+    def upload_file(self, *, path_or_fileobj, path_in_repo: str, repo_id: str,
+                    repo_type: Optional[str] = None, commit_message: Optional[str] = None, **kwargs) -> CommitInfo:
+        return self.create_commit(repo_id, [CommitOperationAdd(path_in_repo=path_in_repo,
+                                                               path_or_fileobj=path_or_fileobj)],
+                                  commit_message=commit_message or f"Upload {path_in_repo}", repo_type=repo_type)
+
+    def _repo_file(self, path: str, info: dict) -> RepoFile:
+        lfs = None
+        if path.endswith(LFS_EXTENSIONS) or info["size"] >= LFS_MIN_SIZE:
+            lfs = {"size": info["size"], "oid": info["sha256"], "pointerSize": 134}
+        return RepoFile(path=path, size=info["size"], oid=info["blob_id"], lfs=lfs)
+
+    def list_repo_tree(self, repo_id: str, path_in_repo: Optional[str] = None, *, recursive: bool = False,
+                       repo_type: Optional[str] = None, **kwargs) -> list:
+        files = self._load_index(repo_id, repo_type)["files"]
+        prefix = path_in_repo.rstrip("/") + "/" if path_in_repo else ""
+        entries, folders = [], set()
+        for path in sorted(files):
+            if not path.startswith(prefix):
+                continue
+            relative = path[len(prefix):]
+            if recursive or "/" not in relative:
+                entries.append(self._repo_file(path, files[path]))
+            if "/" in relative:
+                parts = relative.split("/")[:-1]
+                for depth in range(1, len(parts) + 1 if recursive else 2):
+                    folders.add(prefix + "/".join(parts[:depth]))
+        if prefix and not entries and not folders:
+            raise FileNotFoundError(f"'{path_in_repo}' not found in '{repo_id}'")
+        return [RepoFolder(path=folder, oid=hashlib.sha1(folder.encode()).hexdigest())
+                for folder in sorted(folders)] + entries
+
+    def get_paths_info(self, repo_id: str, paths, *, repo_type: Optional[str] = None, **kwargs) -> list:
+        files = self._load_index(repo_id, repo_type)["files"]
+        paths = [paths] if isinstance(paths, str) else paths
+        return [self._repo_file(path, files[path]) for path in paths if path in files]
+
+    def file_exists(self, repo_id: str, filename: str, *, repo_type: Optional[str] = None, **kwargs) -> bool:
+        return filename in self._load_index(repo_id, repo_type)["files"]
+
+    def hf_hub_download(self, repo_id: str, filename: str, *, repo_type: Optional[str] = None,
+                        local_dir: Optional[str] = None, **kwargs) -> str:
+        files = self._load_index(repo_id, repo_type)["files"]
+        if filename not in files:
+            raise FileNotFoundError(f"'{filename}' not found in '{repo_id}'")
+        target_dir = local_dir or os.path.join(self.root, "downloads", repo_id)
+        target = os.path.join(target_dir, filename)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(os.path.join(self.objects_dir, files[filename]["sha256"]), target)
+        return target
+
+    def read_file(self, repo_id: str, filename: str, repo_type: Optional[str] = None) -> io.BytesIO:
+        """Return the content of a file (not part of HfApi; for inspecting the fake Hub)"""
+        files = self._load_index(repo_id, repo_type)["files"]
+        with open(os.path.join(self.objects_dir, files[filename]["sha256"]), "rb") as f:
+            return io.BytesIO(f.read())
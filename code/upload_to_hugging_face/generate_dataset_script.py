@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Typed dataset_script.py Generator
+
+Generates a Hugging Face loading script (`dataset_script.py`) whose features
+have real types, taken from the datamart profile of the data like
+`generate_features_from_profile` in `upload_csv_hugging_face.py`. The
+generated loader is an `ArrowBasedBuilder`: it yields Arrow tables of record
+batches read with pyarrow from Parquet files or, in blocks, from CSV files
+(plain, `.csv.gz` or `.csv.zst`),
+and casts them to the declared schema. `load_dataset` then runs at columnar
+speed and consumers get typed columns without casting.
+
+Usage:
+    python generate_dataset_script.py ./traffic_volume_counts_sample_data --data_files sample_traffic.csv
+    python generate_dataset_script.py ./pluto_data --data_files data/train-00000.parquet data/train-00001.parquet --profile profile.json
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+from typing import Optional
+
+# Mapping dictionary
+TYPE_MAPPING = {
+    'https://metadata.datadrivendiscovery.org/types/MissingData': None,     # Handle missing data as None
+    'http://schema.org/Integer': 'int64',
+    'http://schema.org/Float': 'float64',
+    'http://schema.org/Text': 'string',
+    'http://schema.org/Boolean': 'bool',
+    'http://schema.org/DateTime': 'string',
+    'http://schema.org/address': 'string',
+    'http://schema.org/AdministrativeArea': 'string',
+    'http://schema.org/URL': 'string',
+    'https://metadata.datadrivendiscovery.org/types/FileName': 'string',
+    'http://schema.org/identifier': 'string',
+    'http://schema.org/Enumeration': 'string',
+    'http://schema.org/GeoCoordinates': 'string',
+    'http://schema.org/GeoShape': 'string'
+}
+
+SUPPORTED_DTYPES = ('int64', 'float64', 'string', 'bool')
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+PARQUET_BATCH_ROWS = 100000
+
+DATASET_SCRIPT_TEMPLATE = '''\
+import datasets
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+_DESCRIPTION = {description!r}
+
+_FEATURES = datasets.Features({{
+    {features_code}
+}})
+
+_DATA_FILES = {data_files!r}
+
+_CSV_BLOCK_SIZE = {csv_block_size}
+_PARQUET_BATCH_ROWS = {parquet_batch_rows}
+_COMPRESSIONS = {{".gz": "gzip", ".zst": "zstd"}}
+
+
+class {class_name}(datasets.ArrowBasedBuilder):
+    def _info(self):
+        return datasets.DatasetInfo(
+            description=_DESCRIPTION,
+            features=_FEATURES,
+            supervised_keys=None,
+        )
+
+    def _split_generators(self, dl_manager):
+        paths = dl_manager.download(_DATA_FILES)
+        return [
+            datasets.SplitGenerator(name=datasets.Split.TRAIN,
+                                    gen_kwargs={{"names": _DATA_FILES, "paths": paths}})
+        ]
+
+    def _generate_tables(self, names, paths):
+        schema = _FEATURES.arrow_schema
+        for file_index, (name, path) in enumerate(zip(names, paths)):
+            if name.endswith(".parquet"):
+                parquet_file = pq.ParquetFile(path)
+                batches = parquet_file.iter_batches(batch_size=_PARQUET_BATCH_ROWS, columns=schema.names)
+            else:
+                # Downloaded files lose their extension, so take the compression from the name
+                compression = next((codec for ext, codec in _COMPRESSIONS.items() if name.endswith(ext)), None)
+                batches = pacsv.open_csv(
+                    pa.input_stream(path, compression=compression),
+                    read_options=pacsv.ReadOptions(block_size=_CSV_BLOCK_SIZE),
+                    parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                    convert_options=pacsv.ConvertOptions(
+                        column_types={{field.name: field.type for field in schema}},
+                        include_columns=schema.names,
+                        strings_can_be_null=True,
+                    ),
+                )
+            for batch_index, batch in enumerate(batches):
+                table = pa.Table.from_batches([batch]).select(schema.names)
+                yield f"{{file_index}}_{{batch_index}}", table.cast(schema)
+'''
+
+
+def profile_dtypes(profile: dict) -> dict:
+    """Map each profiled column to a Hugging Face dtype (int64, float64, string or bool)"""
+    dtypes = {}
+    for column in profile['columns']:
+        hf_type = TYPE_MAPPING.get(column['structural_type'], 'string')
+        # Integer columns with missing values cannot be loaded as int64
+        if hf_type == 'int64' and column.get('missing_values_ratio', 0) > 0:
+            hf_type = 'float64'
+        dtypes[column['name']] = hf_type if hf_type in SUPPORTED_DTYPES else 'string'
+    return dtypes
+
+
+def csv_dtypes(csv_path: str) -> dict:
+    """All-string dtypes from a CSV header, for when no profile is available"""
+    import pyarrow as pa
+    with pa.input_stream(csv_path, compression="detect") as stream:
+        reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+        return {name: 'string' for name in next(reader, [])}
+
+
+def generate_dataset_script(dtypes: dict, data_files: list,
+                            description: str = "Typed loader script for Hugging Face Datasets.",
+                            class_name: str = "TypedArrowLoader") -> str:
+    """Return the source of an ArrowBasedBuilder loading ``data_files`` with ``dtypes``"""
+    features_code = ",\n    ".join(f'{name!r}: datasets.Value("{dtype}")' for name, dtype in dtypes.items())
+    return DATASET_SCRIPT_TEMPLATE.format(
+        description=description,
+        features_code=features_code,
+        data_files=list(data_files),
+        csv_block_size=CSV_BLOCK_SIZE,
+        parquet_batch_rows=PARQUET_BATCH_ROWS,
+        class_name=class_name,
+    )
+
+
+def write_dataset_script(local_dataset_path: str, data_files: list, profile: Optional[dict] = None,
+                         description: str = "Typed loader script for Hugging Face Datasets.") -> str:
+    """Write ``dataset_script.py`` into ``local_dataset_path``; return its path.
+
+    Column types come from ``profile``; without one, every column is a string
+    (taken from the header of the first CSV data file).
+    """
+    if profile is not None:
+        dtypes = profile_dtypes(profile)
+    else:
+        first_csv = next(name for name in data_files if not name.endswith(".parquet"))
+        dtypes = csv_dtypes(os.path.join(local_dataset_path, first_csv))
+    script_path = os.path.join(local_dataset_path, "dataset_script.py")
+    with open(script_path, "w", encoding="utf-8") as script_file:
+        script_file.write(generate_dataset_script(dtypes, data_files, description))
+    return script_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a typed, Arrow-based dataset_script.py")
+    parser.add_argument("local_dataset_path", help="Folder with the data files; dataset_script.py is written there")
+    parser.add_argument("--data_files", nargs="+", required=True,
+                        help="Data files relative to the folder (.csv or .parquet)")
+    parser.add_argument("--profile", help="Profile JSON to take column types from (default: profile the first CSV)")
+    parser.add_argument("--description", default="Typed loader script for Hugging Face Datasets.",
+                        help="Description of the dataset")
+    args = parser.parse_args()
+
+    profile = None
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = json.load(f)
+    else:
+        csv_files = [name for name in args.data_files if not name.endswith(".parquet")]
+        if csv_files:
+            from profile_cache import PROFILE_SAMPLE_BYTES, get_or_create_profile
+            profile = get_or_create_profile(os.path.join(args.local_dataset_path, csv_files[0]),
+                                            load_max_size=PROFILE_SAMPLE_BYTES, include_sample=True, plots=True)
+    if profile is None:
+        parser.error("--profile is required when all data files are Parquet")
+
+    script_path = write_dataset_script(args.local_dataset_path, args.data_files, profile, args.description)
+    print(f"✅ {script_path} generated.")
+
+
+if __name__ == "__main__":
+    main()
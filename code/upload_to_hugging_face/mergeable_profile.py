@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""
+Mergeable Profiles
+
+Keeps a small, mergeable summary ("sketch") next to a profile JSON so the
+profile can be updated when a dataset grows, instead of being recomputed from
+scratch:
+
+- numeric columns: running moments (count, mean, M2, min, max) merged with
+  Chan et al.'s parallel formula,
+- distinct counts: HyperLogLog registers, merged with an element-wise max,
+- histograms and quantiles: counts on a power-of-two bin grid shared by all
+  sketches, so two histograms merge exactly by coarsening the finer one,
+- categorical and text columns: value and word counts, trimmed to the most
+  frequent entries.
+
+A sketch of appended rows is built in O(delta) and merged into the stored
+sketch, then the profile's `nb_rows`, `mean`, `stddev`, `num_distinct_values`,
+`missing_values_ratio`, `coverage`, plots and temporal coverage are rendered
+again from the merged sketch. Partitions of a file can be sketched on a
+process pool and combined the same way.
+
+The sketch is stored as `<profile>.sketch.json`. Column types come from the
+profile (from datamart-profiler or `sampled_profiler.py`); they are not
+re-inferred. Profiles created before the sketch existed can be bootstrapped
+from their moments and plots, but their distinct counts then stay a lower
+bound until `init` is run on the full file.
+
+Usage:
+    python mergeable_profile.py init ../../data/NYC_311.csv --profile ../../data_profiles/NYC_311.json
+    python mergeable_profile.py append new_rows.csv --profile ../../data_profiles/NYC_311.json
+    python mergeable_profile.py init big.csv --profile profile.json --workers 4
+"""
+
+import argparse
+import base64
+import csv
+import io
+import json
+import math
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from sampled_profiler import (CHUNK_SIZE, HISTOGRAM_BINS, TOP_VALUES, TYPES, kmeans_ranges, open_csv,
+                              parse_datetimes)
+
+HLL_PRECISION = 12
+HISTOGRAM_MAX_BINS = 512
+MAX_TRACKED_VALUES = 1000
+
+
+class RunningMoments:
+    """Count, mean, sum of squared deviations, min and max of a stream of numbers"""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=math.inf, maximum=-math.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values):
+            self.merge(RunningMoments(len(values), float(values.mean()),
+                                      float(((values - values.mean()) ** 2).sum()),
+                                      float(values.min()), float(values.max())))
+
+    def merge(self, other: "RunningMoments") -> None:
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def stddev(self) -> float:
+        """Population standard deviation, as numpy's default (and datamart's)"""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": self.minimum if self.count else None, "max": self.maximum if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningMoments":
+        return cls(data["count"], data["mean"], data["m2"],
+                   math.inf if data["min"] is None else data["min"],
+                   -math.inf if data["max"] is None else data["max"])
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with 2**precision one-byte registers"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(2 ** precision, dtype=np.uint8)
+
+    def update(self, values: pd.Series) -> None:
+        if values.empty:
+            return
+        hashes = pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy(dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes << np.uint64(self.precision)
+        # Rank = position of the first set bit of the remaining bits
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = np.minimum(64 - bit_length + 1, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precisions")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and zeros:
+            raw = m * math.log(m / zeros)  # Linear counting for small cardinalities
+        return int(round(raw))
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision,
+                "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        return cls(data["precision"], registers)
+
+
+class MergeableHistogram:
+    """Counts on bins of width 2**exponent aligned on zero.
+
+    Every sketch uses the same grid family, so two histograms merge exactly
+    after coarsening the one with the smaller exponent. The exponent grows
+    whenever more than ``max_bins`` bins are in use.
+    """
+
+    def __init__(self, exponent: Optional[int] = None, bins: Optional[dict] = None,
+                 max_bins: int = HISTOGRAM_MAX_BINS):
+        self.exponent = exponent
+        self.bins = Counter(bins or {})
+        self.max_bins = max_bins
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        if self.exponent is None:
+            spread = float(values.max() - values.min()) or abs(float(values.max())) or 1.0
+            self.exponent = math.ceil(math.log2(spread / self.max_bins))
+        indexes, counts = np.unique(np.floor(values / 2.0 ** self.exponent).astype(np.int64),
+                                    return_counts=True)
+        self.bins.update(dict(zip(indexes.tolist(), counts.tolist())))
+        self._shrink()
+
+    def merge(self, other: "MergeableHistogram") -> None:
+        if other.exponent is None:
+            return
+        if self.exponent is None:
+            self.exponent = other.exponent
+        self._coarsen(max(self.exponent, other.exponent))
+        step = 2 ** (self.exponent - other.exponent)
+        for index, count in other.bins.items():
+            self.bins[index // step] += count
+        self._shrink()
+
+    def _coarsen(self, exponent: int) -> None:
+        if exponent > self.exponent:
+            step = 2 ** (exponent - self.exponent)
+            coarse = Counter()
+            for index, count in self.bins.items():
+                coarse[index // step] += count
+            self.bins, self.exponent = coarse, exponent
+
+    def _shrink(self) -> None:
+        while len(self.bins) > self.max_bins:
+            self._coarsen(self.exponent + 1)
+
+    def edges_and_counts(self) -> tuple:
+        """Sorted bin starts, bin width and counts"""
+        indexes = np.array(sorted(self.bins), dtype=np.float64)
+        counts = np.array([self.bins[int(i)] for i in indexes], dtype=np.int64)
+        return indexes * 2.0 ** self.exponent, 2.0 ** self.exponent, counts
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate quantile (within one bin width)"""
+        if not self.bins:
+            return None
+        starts, width, counts = self.edges_and_counts()
+        position = np.searchsorted(np.cumsum(counts), q * counts.sum())
+        return float(starts[min(position, len(starts) - 1)] + width / 2)
+
+    def histogram(self, minimum: float, maximum: float, n_bins: int = HISTOGRAM_BINS) -> tuple:
+        """Re-bin to ``n_bins`` equal-width bins over [minimum, maximum]; return (edges, counts)"""
+        edges = np.linspace(minimum, maximum, n_bins + 1)
+        counts = np.zeros(n_bins, dtype=np.int64)
+        if self.bins:
+            starts, width, fine_counts = self.edges_and_counts()
+            centers = np.clip(starts + width / 2, minimum, maximum)
+            slots = np.clip(np.searchsorted(edges, centers, side="right") - 1, 0, n_bins - 1)
+            np.add.at(counts, slots, fine_counts)
+        return edges, counts
+
+    def coverage(self) -> list:
+        """Clustered value ranges, computed from the occupied bins"""
+        if not self.bins:
+            return []
+        starts, width, _ = self.edges_and_counts()
+        return kmeans_ranges(starts + width / 2)
+
+    def to_dict(self) -> dict:
+        return {"exponent": self.exponent, "bins": {str(k): v for k, v in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MergeableHistogram":
+        return cls(data["exponent"], {int(k): v for k, v in data["bins"].items()})
+
+
+def _trim(counter: Counter) -> Counter:
+    if len(counter) <= MAX_TRACKED_VALUES:
+        return counter
+    return Counter(dict(counter.most_common(MAX_TRACKED_VALUES)))
+
+
+def column_kind(column: dict) -> str:
+    """Which statistics a profiled column keeps: numeric, temporal, text, categorical or other"""
+    structural = column["structural_type"]
+    semantic = column.get("semantic_types", [])
+    if structural in (TYPES["integer"], TYPES["float"]):
+        return "numeric"
+    if structural != TYPES["text"]:
+        return "other"
+    if TYPES["datetime"] in semantic:
+        return "temporal"
+    if TYPES["text"] in semantic:
+        return "text"
+    return "categorical"
+
+
+class ColumnSketch:
+    """Mergeable statistics of one column"""
+
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+        self.rows = 0
+        self.missing = 0
+        self.distinct_floor = 0
+        self.hll = HyperLogLog()
+        self.moments = RunningMoments()
+        self.histogram = MergeableHistogram()
+        self.values = Counter()
+        self.finest = None
+
+    def update(self, values: pd.Series) -> None:
+        present = values[values.str.strip() != ""]
+        self.rows += len(values)
+        self.missing += len(values) - len(present)
+        self.hll.update(present)
+        if self.kind == "numeric":
+            numbers = pd.to_numeric(present, errors="coerce").dropna().to_numpy(dtype=np.float64)
+            self.moments.update(numbers)
+            self.histogram.update(numbers)
+        elif self.kind == "temporal":
+            dates = parse_datetimes(present).dropna()
+            seconds = dates.astype("datetime64[s]").astype("int64").to_numpy(dtype=np.float64)
+            self.moments.update(seconds)
+            self.histogram.update(seconds)
+            self._update_resolution(dates)
+        elif self.kind == "categorical":
+            self.values = _trim(self.values + Counter(present.value_counts().to_dict()))
+        elif self.kind == "text":
+            words = present.str.lower().str.findall(r"\w+").explode().dropna()
+            self.values = _trim(self.values + Counter(words.value_counts().to_dict()))
+
+    def _update_resolution(self, dates: pd.Series) -> None:
+        units = ["second", "minute", "hour", "day", "month", "year"]
+        if dates.empty:
+            return
+        for unit, component in zip(units, (dates.dt.second, dates.dt.minute, dates.dt.hour)):
+            if (component != 0).any():
+                break
+        else:
+            unit = "day" if (dates.dt.day != 1).any() else ("month" if (dates.dt.month != 1).any() else "year")
+        if self.finest is None or units.index(unit) < units.index(self.finest):
+            self.finest = unit
+
+    def merge(self, other: "ColumnSketch") -> None:
+        self.rows += other.rows
+        self.missing += other.missing
+        self.distinct_floor = max(self.distinct_floor, other.distinct_floor)
+        self.hll.merge(other.hll)
+        self.moments.merge(other.moments)
+        self.histogram.merge(other.histogram)
+        self.values = _trim(self.values + other.values)
+        if other.finest is not None:
+            units = ["second", "minute", "hour", "day", "month", "year"]
+            if self.finest is None or units.index(other.finest) < units.index(self.finest):
+                self.finest = other.finest
+
+    @property
+    def num_distinct_values(self) -> int:
+        return max(self.hll.estimate(), self.distinct_floor)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "kind": self.kind, "rows": self.rows, "missing": self.missing,
+                "distinct_floor": self.distinct_floor, "hll": self.hll.to_dict(),
+                "moments": self.moments.to_dict(), "histogram": self.histogram.to_dict(),
+                "values": dict(self.values), "temporal_resolution": self.finest}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ColumnSketch":
+        sketch = cls(data["name"], data["kind"])
+        sketch.rows = data["rows"]
+        sketch.missing = data["missing"]
+        sketch.distinct_floor = data["distinct_floor"]
+        sketch.hll = HyperLogLog.from_dict(data["hll"])
+        sketch.moments = RunningMoments.from_dict(data["moments"])
+        sketch.histogram = MergeableHistogram.from_dict(data["histogram"])
+        sketch.values = Counter(data["values"])
+        sketch.finest = data["temporal_resolution"]
+        return sketch
+
+    @classmethod
+    def from_profile_column(cls, column: dict, nb_rows: int, profiled_rows: int) -> "ColumnSketch":
+        """Bootstrap a sketch from a profile column that has no stored sketch.
+
+        Moments come from ``mean``/``stddev``, the histogram and value counts
+        from the plot. Counts measured on the ``profiled_rows`` sample are
+        scaled to ``nb_rows`` so appended rows get their proper weight. The
+        distinct count is kept as a lower bound.
+        """
+        scale = nb_rows / profiled_rows if profiled_rows else 1.0
+        sketch = cls(column["name"], column_kind(column))
+        sketch.rows = nb_rows
+        sketch.missing = int(round(column.get("missing_values_ratio", 0.0) * nb_rows))
+        sketch.distinct_floor = column.get("num_distinct_values", 0)
+        present = nb_rows - sketch.missing
+        if "mean" in column and present:
+            ranges = [c["range"] for c in column.get("coverage", [])]
+            sketch.moments = RunningMoments(present, column["mean"], column.get("stddev", 0.0) ** 2 * present,
+                                            min((r["gte"] for r in ranges), default=column["mean"]),
+                                            max((r["lte"] for r in ranges), default=column["mean"]))
+        plot = column.get("plot") or {}
+        data = plot.get("data", [])
+        if plot.get("type") in ("histogram_numerical", "histogram_temporal") and data:
+            if plot["type"] == "histogram_numerical":
+                starts = np.array([b["bin_start"] for b in data])
+                ends = np.array([b["bin_end"] for b in data])
+            else:
+                starts = pd.to_datetime([b["date_start"] for b in data]).astype("datetime64[s]").astype("int64").to_numpy(dtype=np.float64)
+                ends = pd.to_datetime([b["date_end"] for b in data]).astype("datetime64[s]").astype("int64").to_numpy(dtype=np.float64)
+                if not sketch.moments.count:
+                    sketch.moments = RunningMoments(0, 0.0, 0.0, float(starts.min()), float(ends.max()))
+            sketch.histogram.update(np.concatenate([starts, ends]))
+            sketch.histogram.bins = Counter()
+            centers = np.floor((starts + ends) / 2 / 2.0 ** sketch.histogram.exponent).astype(np.int64)
+            for index, bin_data in zip(centers.tolist(), data):
+                sketch.histogram.bins[index] += int(round(bin_data["count"] * scale))
+        elif plot.get("type") in ("histogram_categorical", "histogram_text"):
+            sketch.values = Counter({b["bin"]: int(round(b["count"] * scale)) for b in data})
+        return sketch
+
+
+class DatasetSketch:
+    """Mergeable statistics of a whole profiled dataset"""
+
+    def __init__(self, columns: list, size: int = 0, nb_rows: int = 0, profiled_rows: int = 0):
+        self.columns = columns
+        self.size = size
+        self.nb_rows = nb_rows
+        self.profiled_rows = profiled_rows
+
+    @classmethod
+    def empty_for(cls, profile: dict) -> "DatasetSketch":
+        return cls([ColumnSketch(c["name"], column_kind(c)) for c in profile["columns"]])
+
+    @classmethod
+    def from_profile(cls, profile: dict) -> "DatasetSketch":
+        rows = profile.get("nb_profiled_rows", profile["nb_rows"])
+        columns = [ColumnSketch.from_profile_column(c, profile["nb_rows"], rows) for c in profile["columns"]]
+        return cls(columns, profile.get("size", 0), profile["nb_rows"], rows)
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.nb_rows += len(chunk)
+        self.profiled_rows += len(chunk)
+        for column in self.columns:
+            column.update(chunk[column.name])
+
+    def merge(self, other: "DatasetSketch") -> None:
+        for column, other_column in zip(self.columns, other.columns):
+            column.merge(other_column)
+        self.size += other.size
+        self.nb_rows += other.nb_rows
+        self.profiled_rows += other.profiled_rows
+
+    def apply_to_profile(self, profile: dict) -> dict:
+        """Render the merged statistics into a datamart-shaped profile (updated in place)"""
+        profile["size"] = self.size
+        profile["nb_rows"] = self.nb_rows
+        profile["average_row_size"] = self.size / self.nb_rows if self.nb_rows else 0.0
+        profile["nb_profiled_rows"] = self.profiled_rows
+        temporal = {entry["column_names"][0]: entry for entry in profile.get("temporal_coverage", [])}
+        for column, sketch in zip(profile["columns"], self.columns):
+            present = sketch.rows - sketch.missing
+            if sketch.missing:
+                column["missing_values_ratio"] = sketch.missing / sketch.rows
+            else:
+                column.pop("missing_values_ratio", None)
+            if "num_distinct_values" in column:
+                column["num_distinct_values"] = min(sketch.num_distinct_values, present)
+            plot = column.get("plot")
+            if sketch.kind == "numeric" and sketch.moments.count:
+                column["mean"] = sketch.moments.mean
+                column["stddev"] = sketch.moments.stddev
+                column["coverage"] = [{"range": {"gte": lo, "lte": hi}} for lo, hi in sketch.histogram.coverage()]
+                if plot is not None:
+                    edges, counts = sketch.histogram.histogram(sketch.moments.minimum, sketch.moments.maximum)
+                    plot["data"] = [{"count": int(c), "bin_start": float(edges[i]), "bin_end": float(edges[i + 1])}
+                                    for i, c in enumerate(counts)]
+            elif sketch.kind == "temporal" and sketch.histogram.bins:
+                if plot is not None:
+                    edges, counts = sketch.histogram.histogram(sketch.moments.minimum, sketch.moments.maximum)
+                    iso = pd.to_datetime(edges, unit="s").strftime("%Y-%m-%dT%H:%M:%S")
+                    plot["data"] = [{"count": int(c), "date_start": iso[i], "date_end": iso[i + 1]}
+                                    for i, c in enumerate(counts)]
+                if sketch.name in temporal:
+                    temporal[sketch.name]["ranges"] = [{"range": {"gte": lo, "lte": hi}}
+                                                       for lo, hi in sketch.histogram.coverage()]
+                    if sketch.finest:
+                        temporal[sketch.name]["temporal_resolution"] = sketch.finest
+            elif sketch.kind == "categorical" and plot is not None and sketch.values:
+                plot["data"] = [{"bin": value, "count": count}
+                                for value, count in sorted(sketch.values.most_common(TOP_VALUES))]
+            elif sketch.kind == "text" and plot is not None and sketch.values:
+                plot["data"] = [{"bin": word, "count": count} for word, count in sketch.values.most_common(TOP_VALUES)]
+        return profile
+
+    def to_dict(self) -> dict:
+        return {"size": self.size, "nb_rows": self.nb_rows, "profiled_rows": self.profiled_rows,
+                "columns": [c.to_dict() for c in self.columns]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DatasetSketch":
+        return cls([ColumnSketch.from_dict(c) for c in data["columns"]], data["size"], data["nb_rows"],
+                   data["profiled_rows"])
+
+
+def sketch_path_for(profile_path: str) -> str:
+    return os.path.splitext(profile_path)[0] + ".sketch.json"
+
+
+def _sketch_chunk(args: tuple) -> DatasetSketch:
+    chunk, kinds = args
+    sketch = DatasetSketch([ColumnSketch(name, kind) for name, kind in kinds])
+    sketch.update(chunk)
+    return sketch
+
+
+def check_header(csv_path: str, profile: dict) -> None:
+    """Raise ValueError unless the CSV has exactly the profile's columns"""
+    with open_csv(csv_path) as source:
+        header = next(csv.reader(io.TextIOWrapper(source, encoding="utf-8", newline="")), [])
+    expected = [c["name"] for c in profile["columns"]]
+    missing = [name for name in expected if name not in header]
+    extra = [name for name in header if name not in expected]
+    if missing or extra:
+        raise ValueError(f"{csv_path} does not have the profile's columns "
+                         f"(missing: {', '.join(missing) or 'none'}; extra: {', '.join(extra) or 'none'})")
+
+
+def sketch_csv(csv_path: str, profile: dict, workers: int = 1, chunk_size: int = CHUNK_SIZE) -> DatasetSketch:
+    """Sketch every row of a CSV; chunks are sketched on ``workers`` processes and merged.
+
+    At most ``2 * workers`` chunks are read ahead of the merge, so memory
+    stays bounded by the chunk size.
+    """
+    check_header(csv_path, profile)
+    kinds = [(c["name"], column_kind(c)) for c in profile["columns"]]
+    total = DatasetSketch.empty_for(profile)
+    with open_csv(csv_path) as source:
+        chunks = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                running = set()
+                for chunk in chunks:
+                    if len(running) >= 2 * workers:
+                        finished, running = wait(running, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            total.merge(future.result())
+                    running.add(pool.submit(_sketch_chunk, (chunk, kinds)))
+                for future in running:
+                    total.merge(future.result())
+        else:
+            for chunk in chunks:
+                total.merge(_sketch_chunk((chunk, kinds)))
+    total.size = os.path.getsize(csv_path)
+    return total
+
+
+def load_sketch(profile: dict, profile_path: str) -> DatasetSketch:
+    """Load the sketch stored next to a profile, or bootstrap one from the profile"""
+    path = sketch_path_for(profile_path)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return DatasetSketch.from_dict(json.load(f))
+    print(f"⚠️  No sketch found at '{path}'; bootstrapping from the profile "
+          f"(distinct counts become lower bounds).")
+    return DatasetSketch.from_profile(profile)
+
+
+def save(profile: dict, sketch: DatasetSketch, profile_path: str) -> None:
+    for path, data in ((profile_path, profile), (sketch_path_for(profile_path), sketch.to_dict())):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, path)
+
+
+def append_to_profile(profile_path: str, delta_csv: str, workers: int = 1) -> dict:
+    """Merge the rows of ``delta_csv`` into the profile at ``profile_path`` in O(delta)"""
+    with open(profile_path, encoding="utf-8") as f:
+        profile = json.load(f)
+    sketch = load_sketch(profile, profile_path)
+    delta = sketch_csv(delta_csv, profile, workers)
+    sketch.merge(delta)
+    save(sketch.apply_to_profile(profile), sketch, profile_path)
+    return profile
+
+
+def init_profile(profile_path: str, csv_path: str, workers: int = 1) -> dict:
+    """Sketch the full CSV once and render the profile from it"""
+    with open(profile_path, encoding="utf-8") as f:
+        profile = json.load(f)
+    sketch = sketch_csv(csv_path, profile, workers)
+    save(sketch.apply_to_profile(profile), sketch, profile_path)
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain a profile incrementally with mergeable sketches")
+    parser.add_argument("command", choices=["init", "append"],
+                        help="init: sketch the full CSV; append: merge the rows of a CSV of new rows")
+    parser.add_argument("csv_path", help="Full CSV (init) or CSV of appended rows with the same header (append)")
+    parser.add_argument("--profile", required=True, help="Profile JSON to update (its sketch is stored next to it)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to sketch chunks (default: 1)")
+    args = parser.parse_args()
+
+    update = init_profile if args.command == "init" else append_to_profile
+    try:
+        profile = update(args.profile, args.csv_path, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"✅ Profile '{args.profile}' updated: {profile['nb_rows']:,} rows "
+          f"({profile['nb_profiled_rows']:,} summarized)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Sharded Parquet Upload
+
+Converts a CSV into size-bounded, compressed Parquet shards
+(`data/train-00000.parquet`, `data/train-00001.parquet`, ...) and uploads
+them to a Hugging Face dataset repository in one commit, together with a
+`shards.json` manifest holding the row count and SHA-256 of each shard.
+
+Shards are deterministic: every row group holds exactly `row_group_rows` rows
+and a shard is closed after the row group that takes it past
+`max_shard_bytes`, so the same rows always produce the same bytes. Before
+committing, the SHA-256 of each shard is compared with the one the Hub
+reports for the file at the same path, and unchanged shards are skipped.
+When rows are appended to a dataset, only the last shard (and any new ones)
+is transferred.
+
+Usage:
+    python parquet_shards.py data.csv --repo_id oscur/pluto
+    python parquet_shards.py data.csv --repo_id oscur/pluto --fake_hub /tmp/fake_hub   # offline
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from profile_cache import file_sha256
+from stage_metrics import span
+
+DEFAULT_MAX_SHARD_BYTES = 200 * 1024 * 1024
+ROW_GROUP_ROWS = 100000
+SHARD_PREFIX = "data/train"
+MANIFEST_NAME = "shards.json"
+READ_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def _csv_header(csv_path: str) -> list:
+    with pa.input_stream(csv_path, compression="detect") as stream:
+        return next(csv.reader(io.TextIOWrapper(stream, encoding="utf-8", newline="")), [])
+
+
+def write_parquet_shards(csv_path: str, output_dir: str, schema: Optional[pa.Schema] = None,
+                         max_shard_bytes: int = DEFAULT_MAX_SHARD_BYTES,
+                         row_group_rows: int = ROW_GROUP_ROWS, compression: str = "zstd",
+                         prefix: str = SHARD_PREFIX) -> list:
+    """Write ``csv_path`` (plain, ``.gz`` or ``.zst``) as Parquet shards in ``output_dir``.
+
+    Columns get the types of ``schema`` (e.g. ``Features.arrow_schema``),
+    or strings when no schema is given. Returns one dict per shard with
+    ``path_in_repo``, ``local_path``, ``num_rows``, ``size`` and ``sha256``.
+    Raises ``pyarrow.ArrowInvalid`` if a value does not fit its column type.
+    The conversion is recorded as an ``upload.shards`` span.
+    """
+    with span("upload.shards") as current:
+        shards = _write_parquet_shards(csv_path, output_dir, schema, max_shard_bytes,
+                                       row_group_rows, compression, prefix)
+        current.add(rows=sum(s["num_rows"] for s in shards), bytes=sum(s["size"] for s in shards),
+                    files=len(shards))
+    return shards
+
+
+def _write_parquet_shards(csv_path: str, output_dir: str, schema: Optional[pa.Schema],
+                          max_shard_bytes: int, row_group_rows: int, compression: str,
+                          prefix: str) -> list:
+    if schema is None:
+        schema = pa.schema([(name, pa.string()) for name in _csv_header(csv_path)])
+    reader = pacsv.open_csv(
+        csv_path,
+        read_options=pacsv.ReadOptions(block_size=READ_BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(column_types={f.name: f.type for f in schema},
+                                             strings_can_be_null=True),
+    )
+
+    shards = []
+    state = {"writer": None, "sink": None, "rows": 0}
+
+    def close_shard():
+        state["writer"].close()
+        state["sink"].close()
+        local_path = shards[-1]["local_path"]
+        shards[-1].update(num_rows=state["rows"], size=os.path.getsize(local_path),
+                          sha256=file_sha256(local_path))
+        state.update(writer=None, sink=None, rows=0)
+
+    def write_group(table: pa.Table):
+        if state["writer"] is None:
+            path_in_repo = f"{prefix}-{len(shards):05d}.parquet"
+            local_path = os.path.join(output_dir, path_in_repo)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            shards.append({"path_in_repo": path_in_repo, "local_path": local_path})
+            state["sink"] = pa.OSFile(local_path, "wb")
+            state["writer"] = pq.ParquetWriter(state["sink"], schema, compression=compression)
+        state["writer"].write_table(table.select(schema.names).cast(schema), row_group_size=row_group_rows)
+        state["rows"] += table.num_rows
+        if state["sink"].tell() >= max_shard_bytes:
+            close_shard()
+
+    # Re-batch the reader's blocks into row groups of exactly row_group_rows rows
+    pending, pending_rows = [], 0
+    for batch in reader:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= row_group_rows:
+            table = pa.Table.from_batches(pending)
+            write_group(table.slice(0, row_group_rows))
+            rest = table.slice(row_group_rows)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows or not shards:
+        write_group(pa.Table.from_batches(pending, schema=reader.schema) if pending
+                    else schema.empty_table())
+    if state["writer"] is not None:
+        close_shard()
+    return shards
+
+
+def git_blob_sha1(data: bytes) -> str:
+    """The git object id of a blob, which the Hub reports for non-LFS files"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def remote_hashes(api, repo_id: str, path_in_repo: Optional[str] = None) -> dict:
+    """Map each file of the repo (under ``path_in_repo``) to its (sha256 or None, git blob id)"""
+    try:
+        entries = api.list_repo_tree(repo_id, path_in_repo=path_in_repo, recursive=True, repo_type="dataset")
+        return {entry.path: (entry.lfs.sha256 if entry.lfs else None, entry.blob_id)
+                for entry in entries if hasattr(entry, "blob_id")}
+    except Exception as e:
+        print(f"Could not list the files of '{repo_id}' ({e}); uploading every shard.")
+        return {}
+
+
+def upload_shards(api, repo_id: str, shards: list, extra_files: Optional[dict] = None,
+                  commit_message: str = "Upload Parquet shards") -> dict:
+    """Upload changed shards, the manifest and ``extra_files`` in one commit.
+
+    ``extra_files`` maps paths in the repo to bytes (e.g. the profile JSON).
+    Shards whose hash matches the remote file are skipped, and stale shards
+    with the same prefix are deleted. Returns a summary of the commit.
+    """
+    from huggingface_hub import CommitOperationAdd, CommitOperationDelete
+
+    remote = remote_hashes(api, repo_id)
+    manifest = [{key: shard[key] for key in ("path_in_repo", "num_rows", "size", "sha256")} for shard in shards]
+    files = dict(extra_files or {})
+    files[MANIFEST_NAME] = json.dumps({"shards": manifest,
+                                       "num_rows": sum(s["num_rows"] for s in shards)}, indent=2).encode("utf-8")
+
+    operations, skipped = [], []
+    for shard in shards:
+        if remote.get(shard["path_in_repo"], (None, None))[0] == shard["sha256"]:
+            skipped.append(shard["path_in_repo"])
+        else:
+            operations.append(CommitOperationAdd(path_in_repo=shard["path_in_repo"],
+                                                 path_or_fileobj=shard["local_path"]))
+    for path_in_repo, data in files.items():
+        sha256, blob_id = remote.get(path_in_repo, (None, None))
+        if sha256 == hashlib.sha256(data).hexdigest() or blob_id == git_blob_sha1(data):
+            skipped.append(path_in_repo)
+        else:
+            operations.append(CommitOperationAdd(path_in_repo=path_in_repo, path_or_fileobj=data))
+
+    shard_prefix = os.path.dirname(shards[0]["path_in_repo"]) + "/" if shards else None
+    current = {shard["path_in_repo"] for shard in shards}
+    stale = [path for path in remote
+             if shard_prefix and path.startswith(shard_prefix) and path.endswith(".parquet") and path not in current]
+    operations.extend(CommitOperationDelete(path_in_repo=path) for path in stale)
+
+    uploaded = [op.path_in_repo for op in operations if isinstance(op, CommitOperationAdd)]
+    if operations:
+        sizes = {shard["path_in_repo"]: shard["size"] for shard in shards}
+        sizes.update((path, len(data)) for path, data in files.items())
+        with span("upload.commit", repo_id=repo_id, files=len(uploaded),
+                  bytes=sum(sizes[path] for path in uploaded)):
+            api.create_commit(repo_id, operations, commit_message=commit_message, repo_type="dataset")
+        print(f"✅ Committed {len(uploaded)} file(s) and {len(stale)} deletion(s) to '{repo_id}'; "
+              f"{len(skipped)} unchanged file(s) skipped.")
+    else:
+        print(f"✅ '{repo_id}' is up to date; {len(skipped)} unchanged file(s) skipped.")
+    return {"uploaded": uploaded, "skipped": skipped, "deleted": stale}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload a CSV to the Hugging Face Hub as deduplicated Parquet shards")
+    parser.add_argument("csv_filename", help="Path to the CSV file")
+    parser.add_argument("--repo_id", required=True, help="Hugging Face dataset repository ID (e.g., 'oscur/pluto')")
+    parser.add_argument("--token", help="Hugging Face token (default: the logged-in token)")
+    parser.add_argument("--max_shard_bytes", type=int, default=DEFAULT_MAX_SHARD_BYTES,
+                        help=f"Size at which a shard is closed (default: {DEFAULT_MAX_SHARD_BYTES})")
+    parser.add_argument("--row_group_rows", type=int, default=ROW_GROUP_ROWS,
+                        help=f"Rows per Parquet row group (default: {ROW_GROUP_ROWS})")
+    parser.add_argument("--fake_hub", help="Use a local fake Hub in this folder instead of huggingface.co")
+    args = parser.parse_args()
+
+    if args.fake_hub:
+        from fake_hf_api import FakeHfApi
+        api = FakeHfApi(args.fake_hub)
+    else:
+        from huggingface_hub import HfApi
+        api = HfApi(token=args.token)
+    api.create_repo(args.repo_id, repo_type="dataset", exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shards = write_parquet_shards(args.csv_filename, tmp, max_shard_bytes=args.max_shard_bytes,
+                                      row_group_rows=args.row_group_rows)
+        print(f"📦 Wrote {len(shards)} shard(s) with {sum(s['num_rows'] for s in shards):,} rows.")
+        upload_shards(api, args.repo_id, shards)
+    if args.fake_hub:
+        print(f"📊 Transferred {api.transferred_bytes:,} bytes to the fake Hub.")
+
+
+if __name__ == "__main__":
+    main()
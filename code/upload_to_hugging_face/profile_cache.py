@@ -0,0 +1,120 @@
+"""
+Local cache of datamart-profiler profiles keyed by CSV content hash.
+
+Profiles are stored as JSON files in `profile_cache/` at the project root
+(next to `data_profiles/`), named after the SHA-256 of the CSV file and the
+profiling options. Every script that profiles a CSV looks it up here first,
+so an unchanged file is never profiled twice, even when it was downloaded
+again from the Hugging Face Hub under a different path.
+
+Usage:
+    from profile_cache import get_or_create_profile
+    profile = get_or_create_profile("data.csv", include_sample=True, plots=True)
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "..", "common"))
+
+from stage_metrics import span  # noqa: E402
+
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, "../../"))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, "profile_cache")
+
+# Bytes of the CSV that datamart-profiler samples; shared by the upload
+# scripts so they request (and cache) the same profile
+PROFILE_SAMPLE_BYTES = 5000000
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the hex SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(cache_dir: str, sha256: str, load_max_size: Optional[int],
+                include_sample: bool, plots: bool, engine: str = "datamart",
+                sample_rows: Optional[int] = None) -> str:
+    if engine == "sampled":
+        size = f"sampled{sample_rows or 'all'}"
+    else:
+        size = load_max_size if load_max_size is not None else "default"
+    return os.path.join(cache_dir, f"{sha256}_{size}_{int(include_sample)}{int(plots)}.json")
+
+
+def load_cached_profile(sha256: str, load_max_size: Optional[int] = None,
+                        include_sample: bool = False, plots: bool = False,
+                        cache_dir: str = DEFAULT_CACHE_DIR, engine: str = "datamart",
+                        sample_rows: Optional[int] = None) -> Optional[dict]:
+    """Return a cached profile for the content hash, or None.
+
+    A profile computed with ``include_sample``/``plots`` also satisfies a
+    request without them, since it contains everything the smaller profile has.
+    """
+    for sample in sorted({include_sample, True}):
+        for with_plots in sorted({plots, True}):
+            path = _cache_path(cache_dir, sha256, load_max_size, sample, with_plots, engine, sample_rows)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    return json.load(f)
+    return None
+
+
+def save_profile(profile: dict, sha256: str, load_max_size: Optional[int] = None,
+                 include_sample: bool = False, plots: bool = False,
+                 cache_dir: str = DEFAULT_CACHE_DIR, engine: str = "datamart",
+                 sample_rows: Optional[int] = None) -> str:
+    """Store a profile in the cache; return its path"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(cache_dir, sha256, load_max_size, include_sample, plots, engine, sample_rows)
+    # A temporary name per writer: concurrent runs may save the same profile
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=4)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_or_create_profile(csv_path: str, sha256: Optional[str] = None,
+                          load_max_size: Optional[int] = None, include_sample: bool = False,
+                          plots: bool = False, cache_dir: str = DEFAULT_CACHE_DIR,
+                          engine: str = "datamart", sample_rows: Optional[int] = None,
+                          workers: Optional[int] = None) -> dict:
+    """Return the profile of ``csv_path``, computing it only on a cache miss.
+
+    ``engine="datamart"`` runs datamart-profiler on up to ``load_max_size``
+    bytes; ``engine="sampled"`` runs `sampled_profiler.profile_csv` on a
+    reservoir sample of ``sample_rows`` rows with ``workers`` processes.
+    Hashing and profiling are recorded as ``profile.hash`` and ``profile`` spans.
+    """
+    if sha256 is None:
+        with span("profile.hash", bytes=os.path.getsize(csv_path)):
+            sha256 = file_sha256(csv_path)
+    profile = load_cached_profile(sha256, load_max_size, include_sample, plots, cache_dir,
+                                  engine, sample_rows)
+    if profile is not None:
+        print(f"Using cached profile for '{os.path.basename(csv_path)}' (sha256 {sha256[:12]}).")
+        return profile
+
+    with span("profile", engine=engine, bytes=os.path.getsize(csv_path)):
+        if engine == "sampled":
+            from sampled_profiler import profile_csv
+            profile = profile_csv(csv_path, sample_rows=sample_rows, workers=workers,
+                                  include_sample=include_sample, plots=plots)
+        else:
+            import datamart_profiler  # Import datamart-profiler only when a profile must be computed
+            profile = datamart_profiler.process_dataset(csv_path, load_max_size=load_max_size,
+                                                        include_sample=include_sample, plots=plots)
+    path = save_profile(profile, sha256, load_max_size, include_sample, plots, cache_dir,
+                        engine, sample_rows)
+    print(f"Profile cached at '{path}'.")
+    return profile
@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+Sampled and Parallel CSV Profiler
+
+A lightweight alternative to `datamart_profiler.process_dataset` for very
+large CSV files. The file is streamed once in chunks to count its rows and
+keep a uniform reservoir sample of a configurable number of rows, so memory
+use depends on the sample size and not on the file size. Each column of the
+sample is then profiled independently on a process pool.
+
+The output has the same shape as the datamart-profiler JSON files in
+`data_profiles/` (structural and semantic types, missing/unclean ratios,
+distinct counts, mean/stddev/coverage, histograms, temporal and spatial
+coverage, attribute keywords and an optional CSV sample), so it can be
+uploaded as `profiling_metadata.json` in its place. Type detection uses
+simple heuristics modelled on datamart-profiler and may differ from it on
+ambiguous columns.
+
+`accuracy_report` compares a sampled profile with an exact one (all rows, or
+an existing datamart profile) to show how far the sampled statistics are from
+the exact ones.
+
+Usage:
+    python sampled_profiler.py taxisvis1M.csv -o profile.json --sample-rows 20000 --workers 4
+    python sampled_profiler.py taxisvis1M.csv --accuracy-report
+    python sampled_profiler.py ../../data/speed_humps.csv --compare-with ../../data_profiles/speed_humps.json
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import time
+import warnings
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SAMPLE_ROWS = 20000
+CHUNK_SIZE = 100000
+# Share of non-missing values that must parse for a type to be assigned
+TYPE_THRESHOLD = 0.98
+HISTOGRAM_BINS = 10
+TOP_VALUES = 5
+COVERAGE_RANGES = 3
+SAMPLE_CSV_ROWS = 20
+MAX_GEOHASHES = 100
+MAX_GEOHASH_PRECISION = 16
+# Text columns averaging at least this many words are free text, not categories
+FREE_TEXT_WORDS = 4
+
+SCHEMA = "http://schema.org/"
+TYPES = {
+    "integer": SCHEMA + "Integer",
+    "float": SCHEMA + "Float",
+    "text": SCHEMA + "Text",
+    "geo": SCHEMA + "GeoCoordinates",
+    "datetime": SCHEMA + "DateTime",
+    "enumeration": SCHEMA + "Enumeration",
+    "boolean": SCHEMA + "Boolean",
+    "identifier": SCHEMA + "identifier",
+    "latitude": SCHEMA + "latitude",
+    "longitude": SCHEMA + "longitude",
+}
+
+_INTEGER = r"^[+-]?\d+$"
+_DATE_LIKE = r"\d{1,4}[-/]\d{1,2}[-/]\d{1,4}"
+_LAT_LONG_PAIR = r"^\(?\s*([+-]?\d+(?:\.\d+)?)\s*,\s*([+-]?\d+(?:\.\d+)?)\s*\)?$"
+_WKT_POINT = r"^POINT\s*\(\s*([+-]?\d+(?:\.\d+)?)\s+([+-]?\d+(?:\.\d+)?)\s*\)$"
+
+
+def open_csv(csv_path: str):
+    """Open a CSV for pandas, decompressing ``.gz``/``.zst`` files while reading"""
+    import pyarrow as pa
+    return pa.input_stream(csv_path, compression="detect")
+
+
+def reservoir_sample(csv_path: str, sample_rows: Optional[int] = DEFAULT_SAMPLE_ROWS,
+                     seed: int = 0, chunk_size: int = CHUNK_SIZE) -> tuple:
+    """Stream a CSV and keep a uniform random sample of its rows (Algorithm R).
+
+    Returns ``(sample, nb_rows)``. All values are read as strings with empty
+    strings for missing values. With ``sample_rows=None`` every row is kept.
+    """
+    rng = np.random.default_rng(seed)
+    reservoir = None
+    kept = []
+    nb_rows = 0
+    with open_csv(csv_path) as source:
+        for chunk in pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size):
+            if not sample_rows:
+                kept.append(chunk)
+            elif reservoir is None or len(reservoir) < sample_rows:
+                # Fill the reservoir first, then sample the rest of the chunk
+                take = sample_rows - (0 if reservoir is None else len(reservoir))
+                head = chunk.iloc[:take]
+                reservoir = head if reservoir is None else pd.concat([reservoir, head])
+                _replace_in_reservoir(reservoir, chunk.iloc[take:], nb_rows + take, rng)
+            else:
+                _replace_in_reservoir(reservoir, chunk, nb_rows, rng)
+            nb_rows += len(chunk)
+
+    if sample_rows and reservoir is not None:
+        sample = reservoir
+    elif kept:
+        sample = pd.concat(kept)
+    else:
+        with open_csv(csv_path) as source:
+            sample = pd.read_csv(source, dtype=str, nrows=0)
+    return sample.reset_index(drop=True), nb_rows
+
+
+def _replace_in_reservoir(reservoir: pd.DataFrame, rows: pd.DataFrame, seen: int, rng) -> None:
+    """Vectorized Algorithm R step: row ``seen + i`` replaces a random slot with probability k/(seen+i+1)"""
+    if rows.empty:
+        return
+    slots = (rng.random(len(rows)) * (seen + 1 + np.arange(len(rows)))).astype(np.int64)
+    hits = np.flatnonzero(slots < len(reservoir))
+    if not len(hits):
+        return
+    # When a slot is replaced several times in the chunk only the last replacement survives
+    last = len(hits) - 1 - np.unique(slots[hits][::-1], return_index=True)[1]
+    reservoir.iloc[slots[hits][last]] = rows.iloc[hits[last]].to_numpy()
+
+
+def kmeans_ranges(values: np.ndarray, k: int = COVERAGE_RANGES, iterations: int = 20) -> list:
+    """Cluster 1-D values with Lloyd's algorithm; return sorted (min, max) of each cluster"""
+    values = np.sort(values)
+    if not len(values):
+        return []
+    centers = np.quantile(values, (np.arange(k) + 0.5) / k)
+    for _ in range(iterations):
+        labels = np.abs(values[:, None] - centers[None, :]).argmin(axis=1)
+        new_centers = np.array([values[labels == i].mean() if (labels == i).any() else centers[i]
+                                for i in range(k)])
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+    return sorted((float(values[labels == i].min()), float(values[labels == i].max()))
+                  for i in range(k) if (labels == i).any())
+
+
+def _kmeans_envelopes(lon: np.ndarray, lat: np.ndarray, k: int = COVERAGE_RANGES,
+                      iterations: int = 20) -> list:
+    """Cluster points in 2-D; return datamart-style envelope ranges"""
+    points = np.column_stack([lon, lat])
+    order = np.argsort(lon)
+    centers = points[order[((np.arange(k) + 0.5) * len(points) / k).astype(int)]]
+    for _ in range(iterations):
+        labels = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        new_centers = np.array([points[labels == i].mean(axis=0) if (labels == i).any() else centers[i]
+                                for i in range(k)])
+        if np.allclose(new_centers, centers):
+            break
+        centers = new_centers
+    ranges = []
+    for i in range(k):
+        cluster = points[labels == i]
+        if len(cluster):
+            ranges.append({"range": {"type": "envelope", "coordinates": [
+                [float(cluster[:, 0].min()), float(cluster[:, 1].max())],
+                [float(cluster[:, 0].max()), float(cluster[:, 1].min())],
+            ]}})
+    return ranges
+
+
+def _geohashes4(lon: np.ndarray, lat: np.ndarray) -> list:
+    """Count points per base-4 quadtree cell, as datamart's ``geohashes4``.
+
+    The precision is lowered until there are at most ``MAX_GEOHASHES`` cells.
+    """
+    # Each level appends one base-4 digit: 2 if east of the cell middle, +1 if north
+    codes = np.zeros(len(lon), dtype=np.int64)
+    lon_lo, lon_hi = np.full(len(lon), -180.0), np.full(len(lon), 180.0)
+    lat_lo, lat_hi = np.full(len(lat), -90.0), np.full(len(lat), 90.0)
+    for _ in range(MAX_GEOHASH_PRECISION):
+        lon_mid, lat_mid = (lon_lo + lon_hi) / 2, (lat_lo + lat_hi) / 2
+        east, north = lon >= lon_mid, lat >= lat_mid
+        codes = codes * 4 + east * 2 + north
+        lon_lo, lon_hi = np.where(east, lon_mid, lon_lo), np.where(east, lon_hi, lon_mid)
+        lat_lo, lat_hi = np.where(north, lat_mid, lat_lo), np.where(north, lat_hi, lat_mid)
+    for precision in range(MAX_GEOHASH_PRECISION, 0, -1):
+        cells, counts = np.unique(codes >> (2 * (MAX_GEOHASH_PRECISION - precision)), return_counts=True)
+        if len(cells) <= MAX_GEOHASHES:
+            return [{"hash": np.base_repr(int(cell), 4).zfill(precision), "number": int(n)}
+                    for cell, n in zip(cells, counts)]
+    return []
+
+
+def _temporal_resolution(dates: pd.Series) -> str:
+    """Finest non-zero datetime component, as datamart's ``temporal_resolution``"""
+    for unit, values in (("second", dates.dt.second), ("minute", dates.dt.minute),
+                         ("hour", dates.dt.hour)):
+        if (values != 0).any():
+            return unit
+    if (dates.dt.day != 1).any():
+        return "day"
+    return "month" if (dates.dt.month != 1).any() else "year"
+
+
+def parse_datetimes(values: pd.Series) -> pd.Series:
+    """Parse strings to datetimes, trying the inferred format before mixed formats"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        parsed = pd.to_datetime(values, errors="coerce")
+        if parsed.notna().mean() < TYPE_THRESHOLD:
+            parsed = pd.to_datetime(values, errors="coerce", format="mixed")
+    if getattr(parsed.dt, "tz", None) is not None:
+        parsed = parsed.dt.tz_convert(None)
+    return parsed
+
+
+def _numeric_plot(numbers: np.ndarray) -> dict:
+    counts, edges = np.histogram(numbers, bins=HISTOGRAM_BINS)
+    return {"type": "histogram_numerical", "data": [
+        {"count": int(c), "bin_start": float(edges[i]), "bin_end": float(edges[i + 1])}
+        for i, c in enumerate(counts)]}
+
+
+def _temporal_plot(seconds: np.ndarray) -> dict:
+    counts, edges = np.histogram(seconds, bins=HISTOGRAM_BINS)
+    iso = pd.to_datetime(edges, unit="s").strftime("%Y-%m-%dT%H:%M:%S")
+    return {"type": "histogram_temporal", "data": [
+        {"count": int(c), "date_start": iso[i], "date_end": iso[i + 1]}
+        for i, c in enumerate(counts)]}
+
+
+def profile_column(name: str, values: pd.Series, plots: bool = False) -> tuple:
+    """Profile one column of string values.
+
+    Returns ``(column, extra)`` where ``column`` is the datamart-shaped column
+    profile and ``extra`` holds parsed values needed for the dataset-level
+    temporal and spatial coverage.
+    """
+    column = {"name": name, "structural_type": TYPES["text"], "semantic_types": []}
+    extra = {}
+    stripped = values.str.strip()
+    present = stripped[stripped != ""]
+    missing_ratio = 1 - len(present) / len(values) if len(values) else 0.0
+    n_present = max(len(present), 1)
+    lower_name = name.lower()
+
+    numbers = pd.to_numeric(present, errors="coerce")
+    numeric_ratio = numbers.notna().sum() / n_present
+    # Point formats are only tested on columns that are not numeric
+    point_pattern = None
+    if len(present) and numeric_ratio < TYPE_THRESHOLD:
+        for pattern, flags in ((_LAT_LONG_PAIR, 0), (_WKT_POINT, re.IGNORECASE)):
+            if present.str.match(pattern, flags=flags).mean() >= TYPE_THRESHOLD:
+                point_pattern = (pattern, flags)
+                break
+
+    if len(present) and numeric_ratio >= TYPE_THRESHOLD:
+        is_integer = present.str.match(_INTEGER)
+        valid = numbers[numbers.notna()].to_numpy(dtype="float64")
+        if is_integer.mean() >= TYPE_THRESHOLD:
+            column["structural_type"] = TYPES["integer"]
+            column["unclean_values_ratio"] = float(1 - is_integer.mean())
+            valid = numbers[is_integer].to_numpy(dtype="float64")
+            if set(np.unique(valid)) <= {0.0, 1.0}:
+                column["semantic_types"].append(TYPES["boolean"])
+            elif lower_name == "id" or lower_name.endswith(("_id", " id")):
+                column["semantic_types"].append(TYPES["identifier"])
+        else:
+            column["structural_type"] = TYPES["float"]
+            column["unclean_values_ratio"] = float(1 - numeric_ratio)
+            if "lat" in lower_name and np.all(np.abs(valid) <= 90):
+                column["semantic_types"].append(TYPES["latitude"])
+            elif ("lon" in lower_name or "lng" in lower_name) and np.all(np.abs(valid) <= 180):
+                column["semantic_types"].append(TYPES["longitude"])
+        if missing_ratio > 0:
+            column["missing_values_ratio"] = missing_ratio
+        if column["structural_type"] == TYPES["integer"]:
+            column["num_distinct_values"] = int(present.nunique())
+        column["mean"] = float(valid.mean())
+        column["stddev"] = float(valid.std())
+        column["coverage"] = [{"range": {"gte": lo, "lte": hi}} for lo, hi in kmeans_ranges(valid)]
+        if plots:
+            column["plot"] = _numeric_plot(valid)
+        extra["numbers"] = valid
+    elif point_pattern is not None:
+        is_pair = point_pattern[0] == _LAT_LONG_PAIR
+        points = present.str.extract(point_pattern[0], flags=point_pattern[1]).astype(float).dropna()
+        column["structural_type"] = TYPES["geo"]
+        column["point_format"] = "lat,long" if is_pair else "long,lat"
+        column["unclean_values_ratio"] = float(1 - len(points) / n_present)
+        if missing_ratio > 0:
+            column["missing_values_ratio"] = missing_ratio
+        lat, lon = (points[0], points[1]) if is_pair else (points[1], points[0])
+        extra["points"] = (lon.to_numpy(), lat.to_numpy())
+    else:
+        if missing_ratio > 0:
+            column["missing_values_ratio"] = missing_ratio
+        distinct = present.value_counts()
+        words = present.str.split().str.len()
+        dates = None
+        if len(present) and present.str.contains(_DATE_LIKE).mean() >= TYPE_THRESHOLD:
+            dates = parse_datetimes(present)
+            if dates.notna().mean() < TYPE_THRESHOLD:
+                dates = None
+        if dates is not None:
+            column["semantic_types"].append(TYPES["datetime"])
+            column["num_distinct_values"] = int(len(distinct))
+            seconds = dates.dropna().astype("datetime64[s]").astype("int64").to_numpy(dtype="float64")
+            extra["dates"] = (dates.dropna(), seconds)
+            if plots:
+                column["plot"] = _temporal_plot(seconds)
+        elif len(present) and words.mean() >= FREE_TEXT_WORDS:
+            column["semantic_types"].append(TYPES["text"])
+            if plots:
+                tokens = Counter(re.findall(r"\w+", " ".join(present.str.lower())))
+                column["plot"] = {"type": "histogram_text", "data": [
+                    {"bin": word, "count": count} for word, count in tokens.most_common(TOP_VALUES)]}
+        else:
+            if len(present) and len(distinct) <= max(2, 0.1 * len(present)):
+                column["semantic_types"].append(TYPES["enumeration"])
+            column["num_distinct_values"] = int(len(distinct))
+            if plots and len(present):
+                top = sorted(distinct.head(TOP_VALUES).items())
+                column["plot"] = {"type": "histogram_categorical", "data": [
+                    {"bin": value, "count": int(count)} for value, count in top]}
+    return column, extra
+
+
+def _profile_column_task(args: tuple) -> tuple:
+    return profile_column(*args)
+
+
+def _attribute_keywords(names: list) -> list:
+    keywords = []
+    for name in names:
+        keywords.append(name)
+        tokens = [token for token in re.split(r"[^0-9A-Za-z]+", name) if token]
+        if len(tokens) > 1:
+            keywords.extend(tokens)
+    return keywords
+
+
+def profile_csv(csv_path: str, sample_rows: Optional[int] = DEFAULT_SAMPLE_ROWS,
+                workers: Optional[int] = None, include_sample: bool = False, plots: bool = False,
+                seed: int = 0) -> dict:
+    """Profile a CSV from a reservoir sample of ``sample_rows`` rows.
+
+    ``sample_rows=None`` profiles every row (the exact profile). Columns are
+    profiled on ``workers`` processes (default: one per CPU; 1 profiles
+    in-process).
+    """
+    sample, nb_rows = reservoir_sample(csv_path, sample_rows, seed=seed)
+    size = os.path.getsize(csv_path)
+    names = list(sample.columns)
+    tasks = [(name, sample[name], plots) for name in names]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_profile_column_task, tasks))
+    else:
+        results = [_profile_column_task(task) for task in tasks]
+
+    columns = [column for column, _ in results]
+    profile = {
+        "size": size,
+        "nb_rows": nb_rows,
+        "average_row_size": size / nb_rows if nb_rows else 0.0,
+        "nb_profiled_rows": len(sample),
+        "nb_columns": len(names),
+        "columns": columns,
+    }
+
+    temporal_coverage = []
+    for index, (column, extra) in enumerate(results):
+        if "dates" in extra and len(extra["dates"][1]):
+            dates, seconds = extra["dates"]
+            temporal_coverage.append({
+                "type": "datetime",
+                "column_names": [column["name"]],
+                "column_indexes": [index],
+                "column_types": [TYPES["datetime"]],
+                "ranges": [{"range": {"gte": lo, "lte": hi}} for lo, hi in kmeans_ranges(seconds)],
+                "temporal_resolution": _temporal_resolution(dates),
+            })
+
+    spatial_coverage = []
+    lat_index = next((i for i, c in enumerate(columns) if TYPES["latitude"] in c["semantic_types"]), None)
+    lon_index = next((i for i, c in enumerate(columns) if TYPES["longitude"] in c["semantic_types"]), None)
+    candidates = []
+    if lat_index is not None and lon_index is not None:
+        pair = sample[[names[lon_index], names[lat_index]]].apply(pd.to_numeric, errors="coerce").dropna()
+        candidates.append(("latlong", [lat_index, lon_index], pair.iloc[:, 0].to_numpy(), pair.iloc[:, 1].to_numpy()))
+    for index, (column, extra) in enumerate(results):
+        if "points" in extra:
+            kind = "point_latlong" if column["point_format"] == "lat,long" else "point"
+            candidates.append((kind, [index], *extra["points"]))
+    for kind, indexes, lon, lat in candidates:
+        inside = (np.abs(lon) <= 180) & (np.abs(lat) <= 90)
+        lon, lat = lon[inside], lat[inside]
+        if not len(lon):
+            continue
+        spatial_coverage.append({
+            "type": kind,
+            "column_names": [names[i] for i in indexes],
+            "column_indexes": indexes,
+            "geohashes4": _geohashes4(lon, lat),
+            "ranges": _kmeans_envelopes(lon, lat),
+            "number": int(len(lon)),
+        })
+
+    spatial_indexes = {i for entry in spatial_coverage for i in entry["column_indexes"]}
+    categorical = [c for c in columns if {TYPES["enumeration"], TYPES["boolean"]} & set(c["semantic_types"])]
+    numerical = [i for i, c in enumerate(columns)
+                 if c["structural_type"] in (TYPES["integer"], TYPES["float"]) and i not in spatial_indexes
+                 and not {TYPES["boolean"], TYPES["identifier"]} & set(c["semantic_types"])]
+    types = []
+    if spatial_coverage:
+        profile["nb_spatial_columns"] = len(spatial_indexes)
+        types.append("spatial")
+    if temporal_coverage:
+        profile["nb_temporal_columns"] = len(temporal_coverage)
+        types.append("temporal")
+    if categorical:
+        profile["nb_categorical_columns"] = len(categorical)
+        types.append("categorical")
+    if numerical:
+        profile["nb_numerical_columns"] = len(numerical)
+        types.append("numerical")
+    profile["types"] = sorted(types)
+    if spatial_coverage:
+        profile["spatial_coverage"] = spatial_coverage
+    if temporal_coverage:
+        profile["temporal_coverage"] = temporal_coverage
+    profile["attribute_keywords"] = _attribute_keywords(names)
+    if include_sample:
+        buffer = io.StringIO()
+        sample.head(SAMPLE_CSV_ROWS).to_csv(buffer, index=False, lineterminator="\r\n")
+        profile["sample"] = buffer.getvalue()
+    return profile
+
+
+def _relative_error(estimate, exact) -> Optional[float]:
+    if estimate is None or exact is None:
+        return None
+    if exact == 0:
+        return abs(estimate)
+    return abs(estimate - exact) / abs(exact)
+
+
+def accuracy_report(sampled: dict, exact: dict) -> list:
+    """Compare a sampled profile with an exact one, column by column.
+
+    Returns one dict per column with the sampled and exact structural types,
+    the relative error of ``mean`` and ``stddev``, the absolute error of the
+    missing-values ratio and the share of distinct values seen in the sample.
+    """
+    exact_columns = {column["name"]: column for column in exact["columns"]}
+    report = []
+    for column in sampled["columns"]:
+        reference = exact_columns.get(column["name"])
+        if reference is None:
+            continue
+        distinct = column.get("num_distinct_values")
+        exact_distinct = reference.get("num_distinct_values")
+        report.append({
+            "name": column["name"],
+            "structural_type": column["structural_type"].rsplit("/", 1)[-1],
+            "exact_structural_type": reference["structural_type"].rsplit("/", 1)[-1],
+            "mean_error": _relative_error(column.get("mean"), reference.get("mean")),
+            "stddev_error": _relative_error(column.get("stddev"), reference.get("stddev")),
+            "missing_error": abs(column.get("missing_values_ratio", 0.0)
+                                 - reference.get("missing_values_ratio", 0.0)),
+            "distinct_seen": distinct / exact_distinct if distinct and exact_distinct else None,
+        })
+    return report
+
+
+def print_accuracy_report(report: list, sampled: dict, exact: dict) -> None:
+    def fmt(value, percent=True):
+        if value is None:
+            return "-"
+        return f"{value:.2%}" if percent else f"{value:.2f}"
+
+    print(f"📊 Sampled {sampled['nb_profiled_rows']:,} of {exact['nb_profiled_rows']:,} rows")
+    print(f"{'column':<32} {'type (exact)':<28} {'mean err':>9} {'std err':>9} {'missing err':>12} {'distinct seen':>14}")
+    for row in report:
+        types = row["structural_type"]
+        if row["exact_structural_type"] != types:
+            types = f"{types} ({row['exact_structural_type']})"
+        print(f"{row['name'][:32]:<32} {types:<28} {fmt(row['mean_error']):>9} {fmt(row['stddev_error']):>9} "
+              f"{fmt(row['missing_error']):>12} {fmt(row['distinct_seen']):>14}")
+    mismatches = sum(row["structural_type"] != row["exact_structural_type"] for row in report)
+    print(f"{'✅' if not mismatches else '⚠️ '} {len(report) - mismatches}/{len(report)} structural types match")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a large CSV from a reservoir sample, one process per column")
+    parser.add_argument("csv_path", help="Path to the CSV file")
+    parser.add_argument("-o", "--output", help="Write the profile JSON to this path")
+    parser.add_argument("--sample-rows", type=int, default=DEFAULT_SAMPLE_ROWS,
+                        help=f"Rows kept in the reservoir sample, 0 for all rows (default: {DEFAULT_SAMPLE_ROWS})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes used to profile columns (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the reservoir sample (default: 0)")
+    parser.add_argument("--include-sample", action="store_true", help="Add a CSV sample to the profile")
+    parser.add_argument("--plots", action="store_true", help="Add histograms to the profile")
+    parser.add_argument("--accuracy-report", action="store_true",
+                        help="Also profile every row and report the error of the sampled statistics")
+    parser.add_argument("--compare-with", help="Report the error against an existing profile JSON (e.g. from datamart-profiler)")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    profile = profile_csv(args.csv_path, sample_rows=args.sample_rows or None, workers=args.workers,
+                          include_sample=args.include_sample, plots=args.plots, seed=args.seed)
+    print(f"✅ Profiled {profile['nb_profiled_rows']:,} of {profile['nb_rows']:,} rows "
+          f"({profile['nb_columns']} columns) in {time.monotonic() - started:.1f}s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=4)
+        print(f"💾 Profile saved to '{args.output}'")
+
+    exact = None
+    if args.compare_with:
+        with open(args.compare_with, encoding="utf-8") as f:
+            exact = json.load(f)
+    elif args.accuracy_report:
+        started = time.monotonic()
+        exact = profile_csv(args.csv_path, sample_rows=None, workers=args.workers)
+        print(f"✅ Exact profile of {exact['nb_rows']:,} rows in {time.monotonic() - started:.1f}s")
+    if exact is not None:
+        print_accuracy_report(accuracy_report(profile, exact), profile, exact)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,68 @@
-import csv
 import datasets
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
-class GenericCSVLoader(datasets.GeneratorBasedBuilder):
+_DESCRIPTION = 'This dataset contains a sample for traffic volume counts captured automatically.'
+
+_FEATURES = datasets.Features({
+    'RequestID': datasets.Value("int64"),
+    'Boro': datasets.Value("string"),
+    'Yr': datasets.Value("int64"),
+    'M': datasets.Value("int64"),
+    'D': datasets.Value("int64"),
+    'HH': datasets.Value("int64"),
+    'MM': datasets.Value("int64"),
+    'Vol': datasets.Value("int64"),
+    'SegmentID': datasets.Value("int64"),
+    'WktGeom': datasets.Value("string"),
+    'street': datasets.Value("string"),
+    'fromSt': datasets.Value("string"),
+    'toSt': datasets.Value("string"),
+    'Direction': datasets.Value("string")
+})
+
+_DATA_FILES = ['sample_traffic.csv']
+
+_CSV_BLOCK_SIZE = 16777216
+_PARQUET_BATCH_ROWS = 100000
+_COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+
+class TypedArrowLoader(datasets.ArrowBasedBuilder):
     def _info(self):
         return datasets.DatasetInfo(
-            description="Generic CSV loader script for Hugging Face Datasets.",
-            features=datasets.Features({
-                "RequestID": datasets.Value("string"),
-                "Boro": datasets.Value("string"),
-                "Yr": datasets.Value("string"),
-                "M": datasets.Value("string"),
-                "D": datasets.Value("string"),
-                "HH": datasets.Value("string"),
-                "MM": datasets.Value("string"),
-                "Vol": datasets.Value("string"),
-                "SegmentID": datasets.Value("string"),
-                "WktGeom": datasets.Value("string"),
-                "street": datasets.Value("string"),
-                "fromSt": datasets.Value("string"),
-                "toSt": datasets.Value("string"),
-                "Direction": datasets.Value("string")
-            }),
+            description=_DESCRIPTION,
+            features=_FEATURES,
             supervised_keys=None,
         )
 
     def _split_generators(self, dl_manager):
-        data_path = dl_manager.download_and_extract("sample_traffic.csv")
+        paths = dl_manager.download(_DATA_FILES)
         return [
-            datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={"filepath": data_path})
+            datasets.SplitGenerator(name=datasets.Split.TRAIN,
+                                    gen_kwargs={"names": _DATA_FILES, "paths": paths})
         ]
 
-    def _generate_examples(self, filepath):
-        with open(filepath, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader):
-                yield i, row
+    def _generate_tables(self, names, paths):
+        schema = _FEATURES.arrow_schema
+        for file_index, (name, path) in enumerate(zip(names, paths)):
+            if name.endswith(".parquet"):
+                parquet_file = pq.ParquetFile(path)
+                batches = parquet_file.iter_batches(batch_size=_PARQUET_BATCH_ROWS, columns=schema.names)
+            else:
+                # Downloaded files lose their extension, so take the compression from the name
+                compression = next((codec for ext, codec in _COMPRESSIONS.items() if name.endswith(ext)), None)
+                batches = pacsv.open_csv(
+                    pa.input_stream(path, compression=compression),
+                    read_options=pacsv.ReadOptions(block_size=_CSV_BLOCK_SIZE),
+                    parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                    convert_options=pacsv.ConvertOptions(
+                        column_types={field.name: field.type for field in schema},
+                        include_columns=schema.names,
+                        strings_can_be_null=True,
+                    ),
+                )
+            for batch_index, batch in enumerate(batches):
+                table = pa.Table.from_batches([batch]).select(schema.names)
+                yield f"{file_index}_{batch_index}", table.cast(schema)
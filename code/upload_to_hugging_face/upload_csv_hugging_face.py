@@ -1,29 +1,13 @@
 import argparse
+import json
 from datasets import load_dataset, Dataset, Features, Value
-import pandas as pd
 import os
-import csv
-import datasets
-from huggingface_hub import HfApi, create_repo, login
-import datamart_profiler  # Import datamart-profiler
-
-# Mapping dictionary
-TYPE_MAPPING = {
-    'https://metadata.datadrivendiscovery.org/types/MissingData': None,     # Handle missing data as None
-    'http://schema.org/Integer': 'int64',
-    'http://schema.org/Float': 'float64',
-    'http://schema.org/Text': 'string',
-    'http://schema.org/Boolean': 'bool',
-    'http://schema.org/DateTime': 'string',
-    'http://schema.org/address': 'string',
-    'http://schema.org/AdministrativeArea': 'string',
-    'http://schema.org/URL': 'string',
-    'https://metadata.datadrivendiscovery.org/types/FileName': 'string',
-    'http://schema.org/identifier': 'string',
-    'http://schema.org/Enumeration': 'string',
-    'http://schema.org/GeoCoordinates': 'string',
-    'http://schema.org/GeoShape': 'string'
-}
+import tempfile
+import pyarrow as pa
+from huggingface_hub import HfApi, login
+from profile_cache import PROFILE_SAMPLE_BYTES, get_or_create_profile
+from parquet_shards import DEFAULT_MAX_SHARD_BYTES, upload_shards, write_parquet_shards
+from generate_dataset_script import profile_dtypes
 
 from datasets import Features, Value, ClassLabel, Sequence
 
@@ -37,52 +21,29 @@ def generate_features_from_profile(profile):
     Returns:
         datasets.Features: Hugging Face features schema.
     """
-    columns = profile['columns']
-    features = {}
-
-    for column in columns:
-        column_name = column['name']
-        structural_type = column['structural_type']
-
-        hf_type = TYPE_MAPPING.get(structural_type, 'string')
-
-        # if hf_type == 'ClassLabel':
-        #     # Try to get categories from profile's 'categories' or 'distinct_values'
-        #     # Fallback to empty list if unavailable
-        #     categories = column.get('categories')
-        #     if categories is None:
-        #         # Sometimes distinct_values is available
-        #         categories = column.get('distinct_values', [])
-        #     if categories and isinstance(categories, list):
-        #         features[column_name] = ClassLabel(names=[str(cat) for cat in categories])
-        #     else:
-        #         # Default fallback if no categories info is available
-        #         features[column_name] = ClassLabel(names=[])
-        
-        # elif hf_type == 'dict':
-        #     # For GeoCoordinates or GeoShape, assume dict with string keys and float values (lat/lon)
-        #     # Customize as needed. Here we define a nested feature schema for geo points:
-        #     features[column_name] = Features({
-        #         "latitude": Value("float64"),
-        #         "longitude": Value("float64")
-        #     })
-        
-        if hf_type in ['int64', 'float64', 'string', 'bool']:
-            features[column_name] = Value(hf_type)
-        
-        else:
-            # fallback for any unknown type
-            features[column_name] = Value("string")
-    
-    return Features(features)
+    # Column types follow TYPE_MAPPING in generate_dataset_script.py, which
+    # also types the generated dataset_script.py loaders
+    return Features({column_name: Value(hf_type) for column_name, hf_type in profile_dtypes(profile).items()})
 
 # Parse command-line arguments
 parser = argparse.ArgumentParser(description="Upload CSV to Hugging Face Hub")
-parser.add_argument("--token", required=True, help="Hugging Face token")
+parser.add_argument("--token", help="Hugging Face token (required unless --fake_hub is used)")
 parser.add_argument("--organization", required=True, help="Hugging Face organization name")
 parser.add_argument("--repo_name", required=True, help="Repository name")
 parser.add_argument("--csv_filename", required=True, help="Path to the CSV file")
+parser.add_argument("--profile_sample_bytes", type=int, default=PROFILE_SAMPLE_BYTES,
+                    help=f"Bytes of the CSV sampled to infer column types (default: {PROFILE_SAMPLE_BYTES})")
+parser.add_argument("--upload_format", choices=["csv", "parquet"], default="csv",
+                    help="csv: upload the raw CSV and push the dataset; parquet: upload typed Parquet shards "
+                         "in one commit, skipping unchanged shards (default: csv)")
+parser.add_argument("--max_shard_bytes", type=int, default=DEFAULT_MAX_SHARD_BYTES,
+                    help=f"Size at which a Parquet shard is closed (default: {DEFAULT_MAX_SHARD_BYTES})")
+parser.add_argument("--fake_hub", help="Upload to a local fake Hub in this folder (parquet format only)")
 args = parser.parse_args()
+if args.fake_hub and args.upload_format != "parquet":
+    parser.error("--fake_hub requires --upload_format parquet")
+if not args.token and not args.fake_hub:
+    parser.error("--token is required")
 
 # Use the arguments
 token_value = args.token
@@ -91,80 +52,94 @@ repo_name = args.repo_name
 csv_filename = args.csv_filename
 repo_id = f"{organization}/{repo_name}"
 
-# Login to Hugging Face
-login(token=token_value)
-api = HfApi()
+# Login to Hugging Face (or use the offline fake Hub)
+if args.fake_hub:
+    from fake_hf_api import FakeHfApi
+    api = FakeHfApi(args.fake_hub)
+else:
+    login(token=token_value)
+    api = HfApi()
 
 # Create the repository only if it doesn't already exist
 try:
-    create_repo(repo_id, repo_type="dataset", exist_ok=True)
+    api.create_repo(repo_id, repo_type="dataset", exist_ok=True)
     print(f"Repository '{repo_id}' is ready.")
 except Exception as e:
     print(f"An error occurred while creating the repository: {e}")
 
+# Profile a bounded sample of the CSV once: the same profile provides the
+# column types for loading and the uploaded profiling_metadata.json. It is
+# computed with samples and plots and kept in the local profile cache, so
+# add_profiling_to_hugging_face.py --profile_sample_bytes reuses it.
+profile = None
+features = None
 try:
-    # Attempt to load the dataset directly from the CSV file
-    dataset = Dataset.from_csv(csv_filename)
-except Exception as e1:
-    # If the first attempt fails, print the error and try to load it using pandas
-    print(f"First attempt Failed to create dataset from CSV file: {e1}")
-    try:
-        # Second attempt to create the dataset using pandas
-        df_data = pd.read_csv(csv_filename)
-        dataset = Dataset.from_pandas(df_data)
-    except Exception as e2:
-        print(f"Second attempt to create dataset from pandas DataFrame failed: {e2}")
+    profile = get_or_create_profile(csv_filename, load_max_size=args.profile_sample_bytes,
+                                    include_sample=True, plots=True)
+    features = generate_features_from_profile(profile)
+    print(f"Profiled {profile.get('nb_profiled_rows', 0)} sampled rows to infer {len(features)} column types.")
+except Exception as e:
+    print(f"Profiling the CSV file failed, column types will be inferred while loading: {e}")
+
+if args.upload_format == "parquet":
+    # Write typed, size-bounded Parquet shards and commit them together with
+    # the profile; shards whose hash is already on the Hub are not sent again
+    profile_files = {}
+    if profile is not None:
+        profile_files["profiling_metadata.json"] = json.dumps(profile, indent=4).encode("utf-8")
+    with tempfile.TemporaryDirectory() as shard_dir:
+        schema = features.arrow_schema if features is not None else None
         try:
-            # Third Attempt: Use datamart-profiler to infer column types
-            # df_data = pd.read_csv(csv_filename)
-            # df_data = pd.read_csv(csv_filename, dtype=str)  # Force all columns to string type
-            df_data = pd.read_csv(csv_filename)
-            profile = datamart_profiler.process_dataset(csv_filename)
-            features = generate_features_from_profile(profile)
-            dataset = Dataset.from_pandas(df_data, features=features)
-        except Exception as e3:
-            print(f"Third attempt: Failed to create dataset from CSV file with datamart-profiler: {e3}")
-            try:
-                # Fourth Attempt: Use csv.DictReader to infer fieldnames and generate features
-                csv_path = os.path.join(os.path.dirname(csv_filename), os.path.basename(csv_filename))
-                with open(csv_path, newline="", encoding="utf-8") as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    fieldnames = reader.fieldnames
-                features = datasets.Features({
-                    **{col: datasets.Value("string") for col in fieldnames}
-                })
-                dataset = Dataset.from_csv(csv_filename, features=features)
-            except Exception as e4:
-                print(f"Fourth attempt: Failed to create dataset from CSV file using csv.DictReader: {e4}")
+            shards = write_parquet_shards(csv_filename, shard_dir, schema=schema,
+                                          max_shard_bytes=args.max_shard_bytes)
+        except pa.ArrowInvalid as e:
+            if schema is None:
                 raise
+            # A value outside the sample did not fit its inferred type
+            print(f"Writing with the profiled column types failed ({e}); writing all columns as strings.")
+            shards = write_parquet_shards(csv_filename, shard_dir, max_shard_bytes=args.max_shard_bytes)
+        print(f"Wrote {len(shards)} Parquet shard(s) with {sum(s['num_rows'] for s in shards)} rows.")
+        upload_shards(api, repo_id, shards, extra_files=profile_files,
+                      commit_message=f"Upload {os.path.basename(csv_filename)} as Parquet shards")
+else:
+    # Load the CSV file once with the profiled column types
+    try:
+        dataset = Dataset.from_csv(csv_filename, features=features)
+    except Exception as e:
+        if features is None:
+            raise
+        # A value outside the sample did not fit its inferred type
+        print(f"Loading with the profiled column types failed ({e}); loading all columns as strings.")
+        features = Features({column: Value("string") for column in features})
+        dataset = Dataset.from_csv(csv_filename, features=features)
 
-# Push the CSV file directly to the repository
-try:
-    api.upload_file(
-        path_or_fileobj=csv_filename,
-        path_in_repo=os.path.basename(csv_filename),
-        repo_id=repo_id,
-        repo_type="dataset"
-    )
-    print(f"CSV file '{csv_filename}' has been pushed to the repository.")
-except Exception as e:
-    print(f"An error occurred while pushing the CSV file: {e}")
+    # Push the CSV file directly to the repository
+    try:
+        api.upload_file(
+            path_or_fileobj=csv_filename,
+            path_in_repo=os.path.basename(csv_filename),
+            repo_id=repo_id,
+            repo_type="dataset"
+        )
+        print(f"CSV file '{csv_filename}' has been pushed to the repository.")
+    except Exception as e:
+        print(f"An error occurred while pushing the CSV file: {e}")
 
-# Upload the profiling JSON data to the repository
-try:
-    import json
-    profile = datamart_profiler.process_dataset(csv_filename)
-    profile_json = json.dumps(profile, indent=4)
-    profile_filename = "profiling_metadata.json"
-    api.upload_file(
-        path_or_fileobj=profile_json.encode("utf-8"),  # Convert JSON string to bytes
-        path_in_repo=profile_filename,
-        repo_id=repo_id,
-        repo_type="dataset"
-    )
-    print(f"Profiling JSON data has been uploaded to the repository as '{profile_filename}'.")
-except Exception as e_upload:
-    print(f"An error occurred while uploading the profiling JSON data: {e_upload}")
+    # Upload the profiling JSON data to the repository
+    try:
+        if profile is None:
+            raise ValueError("no profile was generated for the CSV file")
+        profile_json = json.dumps(profile, indent=4)
+        profile_filename = "profiling_metadata.json"
+        api.upload_file(
+            path_or_fileobj=profile_json.encode("utf-8"),  # Convert JSON string to bytes
+            path_in_repo=profile_filename,
+            repo_id=repo_id,
+            repo_type="dataset"
+        )
+        print(f"Profiling JSON data has been uploaded to the repository as '{profile_filename}'.")
+    except Exception as e_upload:
+        print(f"An error occurred while uploading the profiling JSON data: {e_upload}")
 
-# Push the dataset to the repository
-dataset.push_to_hub(repo_id)
\ No newline at end of file
+    # Push the dataset to the repository
+    dataset.push_to_hub(repo_id)
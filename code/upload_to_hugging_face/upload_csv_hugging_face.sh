@@ -5,9 +5,11 @@ TOKEN=$1
 ORGANIZATION=$2
 REPO_NAME=$3
 CSV_FILENAME=$4
+# Any further options (e.g. --upload_format parquet) are passed to the Python script
+EXTRA_OPTIONS=("${@:5}")
 
 # Ensure required Python packages are installed
 pip install --quiet datasets huggingface_hub
 
 # Run the Python script with the parameters
-python upload_csv_hugging_face.py --token "$TOKEN" --organization "$ORGANIZATION" --repo_name "$REPO_NAME" --csv_filename "$CSV_FILENAME"
+python upload_csv_hugging_face.py --token "$TOKEN" --organization "$ORGANIZATION" --repo_name "$REPO_NAME" --csv_filename "$CSV_FILENAME" "${EXTRA_OPTIONS[@]}"
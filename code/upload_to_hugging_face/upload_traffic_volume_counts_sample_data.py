@@ -14,8 +14,9 @@ Instructions:
 """
 
 import os
-import csv
 from huggingface_hub import HfApi
+from generate_dataset_script import write_dataset_script
+from profile_cache import PROFILE_SAMPLE_BYTES, get_or_create_profile
 
 # === Load Hugging Face token ===
 # api = HfApi(token=os.getenv("HF_TOKEN"))  # Make sure HF_TOKEN is exported
@@ -36,46 +37,16 @@ if not os.path.exists(readme_path):
         readme.write(f"# {dataset_title}\n\n")
         readme.write(dataset_description + "\n")
 
-# === Auto-generate dataset_script.py ===
+# === Auto-generate a typed dataset_script.py ===
+# Column types come from the (cached) datamart profile of the CSV; the loader
+# reads Arrow record batches instead of one csv.DictReader dict per row
 csv_path = os.path.join(local_dataset_path, csv_filename)
-with open(csv_path, newline="", encoding="utf-8") as csvfile:
-    reader = csv.DictReader(csvfile)
-    fieldnames = reader.fieldnames
-
-features_code = ",\n                ".join([
-    f'"{col}": datasets.Value("string")' for col in fieldnames
-])
-
-dataset_script_content = f'''\
-import csv
-import datasets
-
-class GenericCSVLoader(datasets.GeneratorBasedBuilder):
-    def _info(self):
-        return datasets.DatasetInfo(
-            description="Generic CSV loader script for Hugging Face Datasets.",
-            features=datasets.Features({{
-                {features_code}
-            }}),
-            supervised_keys=None,
-        )
-
-    def _split_generators(self, dl_manager):
-        data_path = dl_manager.download_and_extract("{csv_filename}")
-        return [
-            datasets.SplitGenerator(name=datasets.Split.TRAIN, gen_kwargs={{"filepath": data_path}})
-        ]
-
-    def _generate_examples(self, filepath):
-        with open(filepath, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader):
-                yield i, row
-'''
-
-script_path = os.path.join(local_dataset_path, "dataset_script.py")
-with open(script_path, "w", encoding="utf-8") as script_file:
-    script_file.write(dataset_script_content)
+try:
+    profile = get_or_create_profile(csv_path, load_max_size=PROFILE_SAMPLE_BYTES, include_sample=True, plots=True)
+except Exception as e:
+    print(f"Profiling the CSV file failed, all columns will be strings: {e}")
+    profile = None
+write_dataset_script(local_dataset_path, [csv_filename], profile=profile, description=dataset_description)
 
 print("✅ dataset_script.py generated.")
 